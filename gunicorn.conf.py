@@ -0,0 +1,27 @@
+"""
+Gunicorn settings (picked up automatically from the repository root).
+
+The app (wsgi.application) is built once in the master and workers are forked from it, so
+code and read-only data are shared copy-on-write between workers and each
+worker boots without re-importing pandas/reportlab/SQLAlchemy models.
+app.create_app registers an at-fork hook that discards the inherited
+database connections; the reminder scheduler thread is started per worker
+here because threads do not survive the fork.
+"""
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+
+if preload_app:
+    # El hilo del scheduler se arranca en cada worker (post_fork), no en el master
+    os.environ.setdefault('REMINDER_SCHEDULER_AUTOSTART', '0')
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from wsgi import application as app
+    from api.scheduler import start_reminder_scheduler
+    start_reminder_scheduler(app)
@@ -0,0 +1,37 @@
+"""Add branch_id to branch-scoped tables
+
+Revision ID: add_branch_scope_columns
+Revises: add_service_order_month_table
+Create Date: 2025-10-08 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_branch_scope_columns'
+down_revision = 'add_service_order_month_table'
+branch_labels = None
+depends_on = None
+
+SCOPED_TABLES = ['ticket', 'calendar_event', 'journal_entry', 'service_order']
+
+
+def upgrade():
+    for table in SCOPED_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(
+                sa.Column('branch_id', sa.Integer(), nullable=True))
+            batch_op.create_index(
+                f'ix_{table}_branch_id', ['branch_id'], unique=False)
+            batch_op.create_foreign_key(
+                f'fk_{table}_branch_id', 'branches', ['branch_id'], ['id'])
+
+
+def downgrade():
+    for table in SCOPED_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_branch_id', type_='foreignkey')
+            batch_op.drop_index(f'ix_{table}_branch_id')
+            batch_op.drop_column('branch_id')
@@ -0,0 +1,31 @@
+"""Add exchange rate table for finance aggregation
+
+Revision ID: add_exchange_rate_table
+Revises: add_reminder_notified_due_date
+Create Date: 2025-10-06 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_exchange_rate_table'
+down_revision = 'add_reminder_notified_due_date'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('exchange_rate',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('currency', sa.String(length=10), nullable=False),
+                    sa.Column('rate', sa.Float(), nullable=False),
+                    sa.Column('updated_at', sa.DateTime(), nullable=True),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('currency')
+                    )
+
+
+def downgrade():
+    op.drop_table('exchange_rate')
@@ -0,0 +1,30 @@
+"""Add notified_due_date to payment reminders
+
+Revision ID: add_reminder_notified_due_date
+Revises: add_username_field
+Create Date: 2025-10-05 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_reminder_notified_due_date'
+down_revision = 'add_username_field'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payment_reminder', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column('notified_due_date', sa.DateTime(), nullable=True))
+        batch_op.create_index(
+            'ix_payment_reminder_status_due_date', ['status', 'due_date'])
+
+
+def downgrade():
+    with op.batch_alter_table('payment_reminder', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_reminder_status_due_date')
+        batch_op.drop_column('notified_due_date')
@@ -0,0 +1,62 @@
+"""Add full-text search indexes
+
+Revision ID: add_search_indexes
+Revises: add_branch_scope_columns
+Create Date: 2025-10-10 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_search_indexes'
+down_revision = 'add_branch_scope_columns'
+branch_labels = None
+depends_on = None
+
+# tabla -> columnas indexadas (ver api.search.SEARCH_TARGETS)
+SEARCH_TABLES = {
+    'ticket': ('title', 'description'),
+    'journal_entry': ('title', 'content', 'tags'),
+    'service_order': ('title', 'description', 'client_name'),
+}
+
+
+def _document(columns):
+    parts = " || ' ' || ".join(f"coalesce({col}, '')" for col in columns)
+    return f"to_tsvector('simple', {parts})"
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, columns in SEARCH_TABLES.items():
+        if dialect == 'postgresql':
+            op.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_search "
+                       f"ON {table} USING gin (({_document(columns)}))")
+        elif dialect == 'sqlite':
+            cols = ', '.join(columns)
+            new_cols = ', '.join(f"new.{col}" for col in columns)
+            old_cols = ', '.join(f"old.{col}" for col in columns)
+            fts = f"{table}_fts"
+            op.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+                       f"content='{table}', content_rowid='id', "
+                       f"tokenize='unicode61 remove_diacritics 2')")
+            op.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN "
+                       f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END")
+            op.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN "
+                       f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END")
+            op.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+                       f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+                       f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END")
+            op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in SEARCH_TABLES:
+        if dialect == 'postgresql':
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_search")
+        elif dialect == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {table}_fts")
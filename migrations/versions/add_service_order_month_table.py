@@ -0,0 +1,81 @@
+"""Normalize service order monthly status into service_order_month
+
+Revision ID: add_service_order_month_table
+Revises: add_exchange_rate_table
+Create Date: 2025-10-07 00:00:00.000000
+
+"""
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_service_order_month_table'
+down_revision = 'add_exchange_rate_table'
+branch_labels = None
+depends_on = None
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def upgrade():
+    month_table = op.create_table('service_order_month',
+                                  sa.Column('id', sa.Integer(), nullable=False),
+                                  sa.Column('order_id', sa.Integer(), nullable=False),
+                                  sa.Column('month', sa.String(length=7), nullable=False),
+                                  sa.Column('completed', sa.Boolean(), nullable=False),
+                                  sa.Column('completed_date', sa.DateTime(), nullable=True),
+                                  sa.Column('updated_by', sa.Integer(), nullable=True),
+                                  sa.Column('updated_at', sa.DateTime(), nullable=True),
+                                  sa.ForeignKeyConstraint(
+                                      ['order_id'], ['service_order.id'], ondelete='CASCADE'),
+                                  sa.ForeignKeyConstraint(['updated_by'], ['user.id'], ),
+                                  sa.PrimaryKeyConstraint('id'),
+                                  sa.UniqueConstraint(
+                                      'order_id', 'month', name='uq_service_order_month_order_month')
+                                  )
+    op.create_index('ix_service_order_month_month_completed',
+                    'service_order_month', ['month', 'completed'])
+
+    # Backfill desde el JSON monthly_status
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT id, monthly_status FROM service_order WHERE monthly_status IS NOT NULL")).fetchall()
+    now = datetime.utcnow()
+    records = []
+    for order_id, monthly_status in rows:
+        if isinstance(monthly_status, str):
+            try:
+                monthly_status = json.loads(monthly_status)
+            except ValueError:
+                continue
+        if not isinstance(monthly_status, dict):
+            continue
+        for month, status in monthly_status.items():
+            status = status if isinstance(status, dict) else {}
+            records.append({
+                'order_id': order_id,
+                'month': str(month)[:7],
+                'completed': bool(status.get('completed', False)),
+                'completed_date': _parse_date(status.get('completed_date')),
+                'updated_by': status.get('updated_by'),
+                'updated_at': now
+            })
+    if records:
+        op.bulk_insert(month_table, records)
+
+
+def downgrade():
+    op.drop_index('ix_service_order_month_month_completed',
+                  table_name='service_order_month')
+    op.drop_table('service_order_month')
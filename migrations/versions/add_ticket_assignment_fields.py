@@ -0,0 +1,33 @@
+"""Add ticket category and technician skills for auto-assignment
+
+Revision ID: add_ticket_assignment_fields
+Revises: add_ticket_event_log
+Create Date: 2025-10-14 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_ticket_assignment_fields'
+down_revision = 'add_ticket_event_log'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column('category', sa.String(length=50), nullable=True))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('skills', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('skills')
+
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        batch_op.drop_column('category')
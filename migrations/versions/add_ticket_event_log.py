@@ -0,0 +1,53 @@
+"""Add append-only ticket event log
+
+Revision ID: add_ticket_event_log
+Revises: add_ticket_sla
+Create Date: 2025-10-13 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_ticket_event_log'
+down_revision = 'add_ticket_sla'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ticket_event',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('ticket_id', sa.Integer(), nullable=False),
+                    sa.Column('event_type', sa.String(length=20), nullable=False),
+                    sa.Column('from_status', sa.String(length=50), nullable=True),
+                    sa.Column('to_status', sa.String(length=50), nullable=False),
+                    sa.Column('priority', sa.String(length=50), nullable=True),
+                    sa.Column('assigned_to', sa.Integer(), nullable=True),
+                    sa.Column('changed_by', sa.Integer(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    with op.batch_alter_table('ticket_event', schema=None) as batch_op:
+        batch_op.create_index('ix_ticket_event_ticket_id_created_at',
+                              ['ticket_id', 'created_at'], unique=False)
+
+    # Historial aproximado de los tickets existentes: creación como 'open'
+    # y, si ya no están abiertos, un cambio al estado actual en updated_at
+    op.execute("INSERT INTO ticket_event (ticket_id, event_type, from_status, to_status, "
+               "priority, assigned_to, created_at) "
+               "SELECT id, 'created', NULL, 'open', priority, assigned_to, "
+               "coalesce(created_at, updated_at, CURRENT_TIMESTAMP) FROM ticket")
+    op.execute("INSERT INTO ticket_event (ticket_id, event_type, from_status, to_status, "
+               "priority, assigned_to, created_at) "
+               "SELECT id, 'status', 'open', status, priority, assigned_to, "
+               "coalesce(updated_at, created_at, CURRENT_TIMESTAMP) FROM ticket "
+               "WHERE status IS NOT NULL AND status <> 'open'")
+
+
+def downgrade():
+    with op.batch_alter_table('ticket_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_ticket_event_ticket_id_created_at')
+
+    op.drop_table('ticket_event')
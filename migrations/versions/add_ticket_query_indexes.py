@@ -0,0 +1,34 @@
+"""Add indexes for ticket list filters and sorting
+
+Revision ID: add_ticket_query_indexes
+Revises: add_search_indexes
+Create Date: 2025-10-11 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_ticket_query_indexes'
+down_revision = 'add_search_indexes'
+branch_labels = None
+depends_on = None
+
+TICKET_INDEXES = {
+    'ix_ticket_status_created_at': ['status', 'created_at'],
+    'ix_ticket_assigned_to_status': ['assigned_to', 'status'],
+    'ix_ticket_created_at': ['created_at'],
+    'ix_ticket_requester_email': ['requester_email'],
+}
+
+
+def upgrade():
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        for name, columns in TICKET_INDEXES.items():
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        for name in TICKET_INDEXES:
+            batch_op.drop_index(name)
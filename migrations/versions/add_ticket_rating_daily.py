@@ -0,0 +1,49 @@
+"""Add daily ticket rating aggregate
+
+Revision ID: add_ticket_rating_daily
+Revises: add_ticket_assignment_fields
+Create Date: 2025-10-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_ticket_rating_daily'
+down_revision = 'add_ticket_assignment_fields'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ticket_rating_daily',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('assigned_to', sa.Integer(), nullable=False),
+                    sa.Column('branch_id', sa.Integer(), nullable=False),
+                    sa.Column('ratings', sa.Integer(), nullable=False),
+                    sa.Column('rating_sum', sa.Integer(), nullable=False),
+                    sa.Column('stars_1', sa.Integer(), nullable=False),
+                    sa.Column('stars_2', sa.Integer(), nullable=False),
+                    sa.Column('stars_3', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('day', 'assigned_to', 'branch_id',
+                                        name='uq_ticket_rating_daily_key')
+                    )
+
+    # Cargar el agregado con las calificaciones existentes
+    day = "date(rated_at)" if op.get_bind().dialect.name == 'sqlite' else "CAST(rated_at AS DATE)"
+    op.execute(
+        "INSERT INTO ticket_rating_daily (day, assigned_to, branch_id, ratings, rating_sum, "
+        "stars_1, stars_2, stars_3) "
+        f"SELECT {day}, coalesce(assigned_to, 0), coalesce(branch_id, 0), count(*), sum(rating), "
+        "sum(CASE WHEN rating = 1 THEN 1 ELSE 0 END), "
+        "sum(CASE WHEN rating = 2 THEN 1 ELSE 0 END), "
+        "sum(CASE WHEN rating = 3 THEN 1 ELSE 0 END) "
+        "FROM ticket WHERE rating IN (1, 2, 3) AND rated_at IS NOT NULL "
+        f"GROUP BY {day}, coalesce(assigned_to, 0), coalesce(branch_id, 0)")
+
+
+def downgrade():
+    op.drop_table('ticket_rating_daily')
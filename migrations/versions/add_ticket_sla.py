@@ -0,0 +1,56 @@
+"""Add ticket SLA deadlines and sla_policy table
+
+Revision ID: add_ticket_sla
+Revises: add_ticket_query_indexes
+Create Date: 2025-10-12 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_ticket_sla'
+down_revision = 'add_ticket_query_indexes'
+branch_labels = None
+depends_on = None
+
+DEADLINE_COLUMNS = ['response_due_at', 'resolution_due_at',
+                    'first_response_at', 'resolved_at', 'sla_next_check_at']
+BREACH_COLUMNS = ['sla_response_breached', 'sla_resolution_breached']
+
+
+def upgrade():
+    op.create_table('sla_policy',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('priority', sa.String(length=50), nullable=False),
+                    sa.Column('branch_id', sa.Integer(), nullable=True),
+                    sa.Column('response_minutes', sa.Integer(), nullable=False),
+                    sa.Column('resolution_minutes', sa.Integer(), nullable=False),
+                    sa.Column('is_active', sa.Boolean(), nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=True),
+                    sa.Column('updated_at', sa.DateTime(), nullable=True),
+                    sa.ForeignKeyConstraint(['branch_id'], ['branches.id'], ),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('priority', 'branch_id',
+                                        name='uq_sla_policy_priority_branch')
+                    )
+
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        for name in DEADLINE_COLUMNS:
+            batch_op.add_column(sa.Column(name, sa.DateTime(), nullable=True))
+        for name in BREACH_COLUMNS:
+            batch_op.add_column(sa.Column(name, sa.Boolean(), nullable=False,
+                                          server_default=sa.false()))
+        batch_op.create_index('ix_ticket_sla_next_check_at',
+                              ['sla_next_check_at'], unique=False)
+    # Los tickets existentes reciben sus plazos con `flask sla-backfill`
+
+
+def downgrade():
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        batch_op.drop_index('ix_ticket_sla_next_check_at')
+        for name in BREACH_COLUMNS + DEADLINE_COLUMNS:
+            batch_op.drop_column(name)
+
+    op.drop_table('sla_policy')
@@ -0,0 +1,249 @@
+"""
+Technician workload and ticket auto-assignment.
+
+The load of every assignee (open tickets, weighted by priority) is kept in
+memory. It is rebuilt from one grouped query on first use, and again every
+ASSIGNMENT_REBUILD_SECONDS so changes made by other workers are picked up.
+In between, every committed ticket insert, status/priority/assignee change
+and delete adjusts it incrementally from session hooks, so choosing an
+assignee never touches the database.
+
+Strategies (ASSIGNMENT_STRATEGY, or per request):
+
+- round_robin: next technician of the pool in turn
+- least_loaded: lowest weighted load in the pool
+- skill: least loaded among the technicians whose User.skills include the
+  ticket category (the whole pool when nobody has it)
+- none: leave the ticket unassigned (default; auto-assignment is opt-in)
+
+The pool is the technicians of the ticket's branch, or all of them when the
+ticket has no branch or its branch has none. Technicians are active users
+with a role in ASSIGNMENT_ROLES.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from api.models import db, Ticket, User
+
+ASSIGNMENT_STRATEGY = os.getenv('ASSIGNMENT_STRATEGY', 'none')
+ASSIGNMENT_ROLES = tuple(role.strip() for role in os.getenv(
+    'ASSIGNMENT_ROLES', 'admin').split(',') if role.strip())
+ASSIGNMENT_REBUILD_SECONDS = int(os.getenv('ASSIGNMENT_REBUILD_SECONDS', '300'))
+
+STRATEGIES = ('round_robin', 'least_loaded', 'skill', 'none')
+PRIORITY_WEIGHTS = {'low': 1, 'medium': 2, 'high': 3, 'urgent': 5}
+DONE_STATUSES = ('resolved', 'closed')
+
+_PENDING_KEY = 'workload_deltas'
+
+
+def _weight(priority):
+    return PRIORITY_WEIGHTS.get(priority or 'medium', PRIORITY_WEIGHTS['medium'])
+
+
+class Workload:
+    """In-memory {user_id: weighted load} plus the technician pools"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded_at = None
+        self.load = defaultdict(int)
+        self.open_tickets = defaultdict(int)
+        self.technicians = {}
+        self._pools = {}
+        self._cursors = defaultdict(int)
+
+    def rebuild(self):
+        technicians = {
+            user_id: {"name": name, "branch_id": branch_id,
+                      "skills": frozenset(skills or ())}
+            for user_id, name, branch_id, skills in db.session.execute(
+                select(User.id, User.full_name, User.branch_id, User.skills)
+                .where(User.role.in_(ASSIGNMENT_ROLES),
+                       User.is_active.is_(True),
+                       User.is_suspended.is_(False))
+                .order_by(User.id))
+        }
+        load = defaultdict(int)
+        open_tickets = defaultdict(int)
+        rows = db.session.execute(
+            select(Ticket.assigned_to, Ticket.priority, func.count(Ticket.id))
+            .where(Ticket.assigned_to.isnot(None),
+                   Ticket.status.notin_(DONE_STATUSES))
+            .group_by(Ticket.assigned_to, Ticket.priority)
+            .execution_options(skip_branch_scope=True)
+        ).all()
+        for user_id, priority, count in rows:
+            load[user_id] += _weight(priority) * count
+            open_tickets[user_id] += count
+
+        # Pool None = todos los técnicos
+        pools = defaultdict(list)
+        for user_id, info in technicians.items():
+            pools[None].append(user_id)
+            if info["branch_id"] is not None:
+                pools[info["branch_id"]].append(user_id)
+
+        with self._lock:
+            self.technicians = technicians
+            self.load = load
+            self.open_tickets = open_tickets
+            self._pools = dict(pools)
+            self.loaded_at = time.monotonic()
+
+    def ensure_fresh(self):
+        loaded_at = self.loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > ASSIGNMENT_REBUILD_SECONDS:
+            self.rebuild()
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded_at = None
+
+    def apply(self, deltas):
+        """deltas: [(user_id, weight, count)] from committed transactions"""
+        with self._lock:
+            for user_id, weight, count in deltas:
+                self.load[user_id] += weight
+                self.open_tickets[user_id] += count
+
+    def choose(self, strategy, branch_id=None, category=None):
+        self.ensure_fresh()
+        with self._lock:
+            pool = self._pools.get(branch_id) or self._pools.get(None)
+            if not pool:
+                return None
+            if strategy == 'round_robin':
+                cursor = self._cursors[branch_id]
+                self._cursors[branch_id] = cursor + 1
+                return pool[cursor % len(pool)]
+            if strategy == 'skill' and category:
+                pool = [user_id for user_id in pool
+                        if category in self.technicians[user_id]["skills"]] or pool
+            return min(pool, key=lambda user_id: (
+                self.load[user_id], self.open_tickets[user_id], user_id))
+
+    def snapshot(self):
+        self.ensure_fresh()
+        with self._lock:
+            result = []
+            for user_id in set(self.technicians) | {u for u, n in self.open_tickets.items() if n}:
+                info = self.technicians.get(user_id)
+                result.append({
+                    "user_id": user_id,
+                    "name": info["name"] if info else None,
+                    "branch_id": info["branch_id"] if info else None,
+                    "skills": sorted(info["skills"]) if info else [],
+                    "technician": info is not None,
+                    "open_tickets": self.open_tickets[user_id],
+                    "weighted_load": self.load[user_id],
+                })
+        return sorted(result, key=lambda row: (-row["weighted_load"], row["user_id"]))
+
+
+workload = Workload()
+
+
+def invalidate_workload():
+    """Reload technicians and loads on next use (users created/updated)"""
+    workload.invalidate()
+
+
+def auto_assign(ticket, strategy=None):
+    """Set ticket.assigned_to when it has none; returns the chosen user id"""
+    strategy = strategy or ASSIGNMENT_STRATEGY
+    if ticket.assigned_to is not None or strategy == 'none':
+        return ticket.assigned_to
+    from api.tenancy import current_branch_id
+    branch_id = ticket.branch_id or current_branch_id()
+    ticket.assigned_to = workload.choose(strategy, branch_id, ticket.category)
+    return ticket.assigned_to
+
+
+# --- Actualización incremental ---------------------------------------------------
+
+def _contribution(assigned_to, priority, status):
+    if assigned_to is None or (status or 'open') in DONE_STATUSES:
+        return None
+    return assigned_to, _weight(priority)
+
+
+def _previous(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None
+    return state.attrs[key].value
+
+
+def _append_transition(deltas, before, after):
+    if before == after:
+        return
+    if before:
+        deltas.append((before[0], -before[1], -1))
+    if after:
+        deltas.append((after[0], after[1], 1))
+
+
+def queue_workload_deltas(session, transitions):
+    """Changes made outside the ORM unit of work (bulk UPDATEs):
+    [((assigned_to, priority, status) before, (...) after)], applied on commit"""
+    deltas = session.info.setdefault(_PENDING_KEY, [])
+    for before, after in transitions:
+        _append_transition(deltas, _contribution(*before), _contribution(*after))
+
+
+def _collect_deltas(session, flush_context):
+    deltas = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.new:
+        if isinstance(obj, Ticket):
+            after = _contribution(obj.assigned_to, obj.priority, obj.status)
+            if after:
+                deltas.append((after[0], after[1], 1))
+    for obj in session.dirty:
+        if not isinstance(obj, Ticket):
+            continue
+        state = inspect(obj)
+        before = _contribution(_previous(state, 'assigned_to'),
+                               _previous(state, 'priority'),
+                               _previous(state, 'status'))
+        after = _contribution(obj.assigned_to, obj.priority, obj.status)
+        _append_transition(deltas, before, after)
+    for obj in session.deleted:
+        if isinstance(obj, Ticket):
+            before = _contribution(obj.assigned_to, obj.priority, obj.status)
+            if before:
+                deltas.append((before[0], -before[1], -1))
+
+
+def _apply_deltas(session):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas and workload.loaded_at is not None:
+        workload.apply(deltas)
+
+
+def _discard_deltas(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _track_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+def setup_assignment(app):
+    """Register the workload hooks once per process"""
+    if event.contains(Session, 'after_flush', _collect_deltas):
+        return
+    # active_history: el valor anterior se carga aunque el atributo esté expirado
+    for attribute in (Ticket.status, Ticket.priority, Ticket.assigned_to):
+        event.listen(attribute, 'set', _track_old_value,
+                     active_history=True, retval=True)
+    event.listen(Session, 'after_flush', _collect_deltas)
+    event.listen(Session, 'after_commit', _apply_deltas)
+    event.listen(Session, 'after_rollback', _discard_deltas)
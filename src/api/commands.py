@@ -27,18 +27,83 @@ def setup_commands(app):
     @app.cli.command("insert-test-users") # name of our command
     @click.argument("count") # argument of out command
     def insert_test_users(count):
+        import random
+        from api.seed import seed_users, run_tag
         print("Creating test users")
-        for x in range(1, int(count) + 1):
-            user = User()
-            user.email = "test_user" + str(x) + "@test.com"
-            user.password = "123456"
-            user.is_active = True
-            db.session.add(user)
-            db.session.commit()
-            print("User: ", user.email, " created.")
+        user_ids = seed_users(random.Random(), int(count), run_tag(count))
+        print(f"All test users created ({len(user_ids)}, password 123456)")
 
-        print("All test users created")
+    """
+    Roll recurring payment reminders forward and generate due-date notifications.
+    Safe to run repeatedly (cron, Railway scheduled job): $ flask roll-reminders
+    """
+    @app.cli.command("roll-reminders")
+    def roll_reminders():
+        """Run one payment reminder scheduler cycle."""
+        from api.scheduler import run_reminder_cycle
+        result = run_reminder_cycle()
+        print(f"Reminders rolled forward: {result['rolled_forward']}")
+        print(f"Reminders marked overdue: {result['overdue']}")
+        print(f"Notifications created: {result['notified']}")
+
+    """
+    Flag tickets past their SLA deadlines and notify (also run by the scheduler thread):
+    $ flask sla-scan
+    """
+    @app.cli.command("sla-scan")
+    def sla_scan():
+        """Run one ticket SLA breach scan."""
+        from api.sla import run_sla_scan
+        result = run_sla_scan()
+        print(f"Response breaches: {result['response_breaches']}")
+        print(f"Resolution breaches: {result['resolution_breaches']}")
+        print(f"Notifications created: {result['notified']}")
+
+    @app.cli.command("sla-backfill")
+    def sla_backfill():
+        """Compute SLA deadlines for tickets created before the SLA engine."""
+        from api.sla import backfill_sla
+        print(f"Tickets updated: {backfill_sla()}")
+
+    """
+    Recompute the daily ticket rating aggregates (after bulk loads or imports):
+    $ flask ratings-rebuild
+    """
+    @app.cli.command("ratings-rebuild")
+    def ratings_rebuild():
+        """Rebuild ticket_rating_daily from the rated tickets."""
+        from api.ratings import rebuild_rating_aggregates
+        print(f"Aggregate rows written: {rebuild_rating_aggregates()}")
 
+    """
+    Rebuild the duplicate-detection index from all tickets and save it:
+    $ flask similarity-rebuild
+    """
+    @app.cli.command("similarity-rebuild")
+    def similarity_rebuild():
+        """Rebuild and persist the ticket similarity index."""
+        from api.similarity import similarity_index, SIMILARITY_INDEX_PATH
+        print(f"Tickets indexed: {similarity_index.rebuild()} ({SIMILARITY_INDEX_PATH})")
+
+    """
+    Bulk-load a synthetic dataset for benchmarks and load tests:
+    $ flask insert-test-data                 (100k tickets, 500k journal entries, ...)
+    $ flask insert-test-data --small --seed 7
+    """
     @app.cli.command("insert-test-data")
-    def insert_test_data():
-        pass
\ No newline at end of file
+    @click.option("--small", is_flag=True, help="Load the small dataset instead of the full one.")
+    @click.option("--seed", default=42, show_default=True, help="Random seed (same seed, same data).")
+    @click.option("--tickets", type=int)
+    @click.option("--journal-entries", type=int)
+    @click.option("--events", type=int)
+    @click.option("--users", type=int)
+    @click.option("--branches", type=int)
+    @click.option("--matrices", type=int)
+    def insert_test_data(small, seed, **overrides):
+        """Generate synthetic tickets, journal entries, events, users and matrices."""
+        from api.seed import generate, DEFAULT_SCALE, SMALL_SCALE
+        scale = dict(SMALL_SCALE if small else DEFAULT_SCALE)
+        scale.update({key: value for key, value in overrides.items() if value is not None})
+        counts = generate(scale, seed=seed,
+                          progress=lambda name, value: print(f"{name}: {value} rows"))
+        print(f"Test data created: {counts}")
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Database engine configuration.
+
+Builds SQLALCHEMY_DATABASE_URI and SQLALCHEMY_ENGINE_OPTIONS from environment
+variables with defaults per backend:
+
+PostgreSQL: DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+DB_POOL_PRE_PING and DB_STATEMENT_TIMEOUT_MS (server-side statement_timeout).
+SQLite: WAL journal, DB_SQLITE_BUSY_TIMEOUT_MS and synchronous=NORMAL.
+
+DATABASE_REPLICA_URL adds an optional read-replica bind (see api.replica).
+
+Pool checkouts are timed so wait time and pool exhaustion can be exposed as
+metrics (see pool_metrics).
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from api.replica import REPLICA_BIND, replica_uri
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+class PoolMetrics:
+    """Counters for connection pool checkouts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def snapshot(self, engine=None):
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "timeouts": self.timeouts,
+            }
+        pool = engine.pool if engine is not None else None
+        if isinstance(pool, QueuePool):
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        return data
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    # Loguear bajo sqlalchemy.pool, no bajo el namespace `api` de la aplicación
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.QueuePool'
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record(time.perf_counter() - start)
+        return conn
+
+
+def database_uri():
+    """DATABASE_URL (Railway/Heroku) or a local SQLite file next to src/"""
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        return db_url.replace("postgres://", "postgresql://")
+
+    # Use absolute path for SQLite database compatible with Windows
+    db_path = os.path.join(os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__))), 'database.db')
+    # Convert Windows path to forward slashes for SQLite
+    db_path = db_path.replace('\\', '/')
+    return f"sqlite:///{db_path}"
+
+
+def engine_options(uri):
+    """Engine keyword arguments for the backend in `uri`"""
+    if uri.startswith('sqlite'):
+        if uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri:
+            return {}
+        return {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": _env_int('DB_POOL_SIZE', 5),
+            "max_overflow": _env_int('DB_MAX_OVERFLOW', 10),
+            "pool_timeout": _env_int('DB_POOL_TIMEOUT', 30),
+            "connect_args": {
+                "timeout": _env_int('DB_SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000.0,
+                "check_same_thread": False,
+            },
+        }
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": _env_int('DB_POOL_SIZE', 5),
+        "max_overflow": _env_int('DB_MAX_OVERFLOW', 10),
+        "pool_timeout": _env_int('DB_POOL_TIMEOUT', 30),
+        "pool_recycle": _env_int('DB_POOL_RECYCLE', 1800),
+        "pool_pre_ping": _env_bool('DB_POOL_PRE_PING', True),
+    }
+    if uri.startswith('postgresql'):
+        statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 30000)
+        connect_args = {
+            "connect_timeout": _env_int('DB_CONNECT_TIMEOUT', 10),
+            "application_name": os.getenv('DB_APPLICATION_NAME', 'plataforma-it'),
+        }
+        if statement_timeout > 0:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+        options["connect_args"] = connect_args
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(
+        f"PRAGMA busy_timeout={_env_int('DB_SQLITE_BUSY_TIMEOUT_MS', 5000)}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def configure_database(app):
+    """Fill the Flask-SQLAlchemy config keys; call before db.init_app(app)"""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or database_uri()
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(uri))
+
+    # Réplica de solo lectura opcional (ver api.replica)
+    replica = replica_uri()
+    if replica:
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        binds.setdefault(REPLICA_BIND, {"url": replica, **engine_options(replica)})
+    return uri
+
+
+def setup_engine_events(engine):
+    """Per-connection setup that cannot be expressed as engine options"""
+    if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        if not event.contains(engine, 'connect', _set_sqlite_pragmas):
+            event.listen(engine, 'connect', _set_sqlite_pragmas)
@@ -1,21 +1,251 @@
 """
 Export utilities for generating PDF and Excel reports
+
+Ticket and journal PDFs are rendered in a streaming way so that very large
+reports keep a bounded memory: rows come from the database in batches
+(stream_rows, yield_per), tables are cut into page-sized fragments, the
+flowables are handed to platypus as it consumes them (_StreamedStory) and
+the document is written to a temporary file instead of a BytesIO.
+
+Matrix and journal PDFs are made of independent sections. With
+EXPORT_PDF_WORKERS > 1 (default 1: in the request process) they are laid
+out in a process pool, EXPORT_PDF_SECTIONS_PER_CHUNK sections per task: a
+worker runs platypus on its chunk with a canvas that only records each
+page's drawing operators (_PageCapture), and the request process replays
+those pages in order into the final canvas, adding the page numbers
+("Página X de N", N filled in by a form at the end). The summary is
+computed once for the whole report. Each chunk starts on a new page.
+Sections may only use the standard PDF fonts, which get the same internal
+names in every canvas (_register_fonts).
 """
 import io
+import itertools
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from flask import make_response
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except ImportError:
-    PANDAS_AVAILABLE = False
-    pd = None
+import importlib.util
+
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.pdfbase.pdfdoc import PDFArray, PDFName, PDFStream, PDFZCompress
+from reportlab.pdfbase.pdfmetrics import standardFonts
+from reportlab.pdfgen.canvas import Canvas
+
+from sqlalchemy import case, func
+
+from api.models import Ticket, JournalEntry
+
+# pandas solo se usa en las exportaciones a Excel: se importa al necesitarlo
+PANDAS_AVAILABLE = importlib.util.find_spec('pandas') is not None
+
+
+def _pandas():
+    import pandas
+    return pandas
+
+
+# Filas leídas de la base por lote y filas por fragmento de tabla (~1 página A4)
+EXPORT_PDF_BATCH = int(os.getenv('EXPORT_PDF_BATCH', '1000'))
+EXPORT_PDF_TABLE_ROWS = int(os.getenv('EXPORT_PDF_TABLE_ROWS', '30'))
+# Secciones (matrices, entradas de bitácora) en paralelo: procesos y secciones por tarea.
+# Por defecto 1 (en el proceso de la request): cada worker de gunicorn tendría su
+# propio pool, forkeado desde un proceso con hilos (scheduler, pool de conexiones)
+EXPORT_PDF_WORKERS = int(os.getenv('EXPORT_PDF_WORKERS', '1'))
+EXPORT_PDF_SECTIONS_PER_CHUNK = int(os.getenv('EXPORT_PDF_SECTIONS_PER_CHUNK', '200'))
+
+# Margen inferior de los reportes por secciones: deja lugar al número de página
+SECTION_BOTTOM_MARGIN = 36
+
+TICKET_COLUMNS = [0.5*inch, 2.5*inch, 1*inch, 1*inch, 1.5*inch, 1*inch]
+
+
+def stream_rows(query, *columns):
+    """Yield the given columns of a Query as dicts, fetched in batches of
+    EXPORT_PDF_BATCH (server-side cursor where the driver supports it)"""
+    for row in query.with_entities(*columns).yield_per(EXPORT_PDF_BATCH):
+        yield row._asdict()
+
+
+def ticket_export_source(query):
+    """(rows, summary) for export_tickets_pdf: counts from one grouped query,
+    rows streamed in id order"""
+    counts = dict(query.with_entities(Ticket.status, func.count(Ticket.id))
+                  .group_by(Ticket.status).all())
+    summary = {
+        'total': sum(counts.values()),
+        'open': counts.get('open', 0),
+        'resolved': counts.get('resolved', 0),
+    }
+    rows = stream_rows(query.order_by(Ticket.id),
+                       Ticket.id, Ticket.title, Ticket.status, Ticket.priority,
+                       Ticket.requester_name, Ticket.created_at)
+    return rows, summary
+
+
+def journal_export_source(query):
+    """(rows, summary) for export_journal_pdf from a filtered JournalEntry
+    query; rows streamed newest first"""
+    total, hours, completed, pending = query.with_entities(
+        func.count(JournalEntry.id),
+        func.sum(JournalEntry.hours_worked),
+        func.count(case((JournalEntry.status == 'completed', 1))),
+        func.count(case((JournalEntry.status == 'pending', 1)))).one()
+    summary = {'total': total, 'hours': hours or 0,
+               'completed': completed, 'pending': pending}
+    rows = stream_rows(query.order_by(JournalEntry.entry_date.desc()),
+                       JournalEntry.title, JournalEntry.entry_date, JournalEntry.category,
+                       JournalEntry.status, JournalEntry.priority, JournalEntry.hours_worked,
+                       JournalEntry.location, JournalEntry.content)
+    return rows, summary
+
+
+def _format_date(value, fmt='%d/%m/%Y'):
+    if not value:
+        return 'N/A'
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return value.strftime(fmt)
+    except (TypeError, ValueError):
+        return 'N/A'
+
+
+class _StreamedStory(list):
+    """Flowable list for doc.build() that refills from an iterator as platypus
+    consumes it, so only a few flowables are alive at any time"""
+
+    def __init__(self, flowables, low_water=8):
+        super().__init__()
+        self._source = iter(flowables)
+        self._low_water = low_water
+
+    def __len__(self):
+        # build() consulta len() antes de cada flowable: momento de reponer
+        while super().__len__() < self._low_water:
+            flowable = next(self._source, None)
+            if flowable is None:
+                break
+            self.append(flowable)
+        return super().__len__()
+
+
+class _CompressingCanvas(Canvas):
+    """Canvas that compresses each page stream as soon as the page is done;
+    ReportLab otherwise keeps the drawing operators of every page
+    uncompressed in memory until save()"""
+
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.stream and not page.Contents:
+            contents = PDFStream(content=PDFZCompress.encode(page.stream))
+            contents.dictionary['Filter'] = PDFArray([PDFName(PDFZCompress.pdfname)])
+            page.Contents, page.stream = contents, None
+
+
+def _register_fonts(canvas):
+    """Register the standard fonts in a fixed order so /F1, /F2... mean the
+    same font in the workers' canvases and in the final one"""
+    for name in standardFonts:
+        canvas.setFont(name, 12)
+    canvas.setFont('Helvetica', 12)
+
+
+class _PageCapture(Canvas):
+    """Canvas for the section workers: keeps the drawing operators of each
+    page instead of writing a PDF"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pages = []
+        _register_fonts(self)
+
+    def showPage(self):
+        self.pages.append('\n'.join(self._code))
+        self._startPage()
+
+    def save(self):
+        if self._code:
+            self.showPage()
+
+
+def _layout_chunk(kind, items, header=None):
+    """Pool task: page streams of one chunk of sections (header on the first)"""
+    return export_manager._layout_pages(export_manager._chunk_story(kind, items, header))
+
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def _section_pool():
+    """Process pool shared by the exports of this process (None: run inline)"""
+    global _pool
+    if EXPORT_PDF_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # fork: spawn/forkserver vuelven a importar reportlab y los modelos en
+            # cada proceso; las tareas solo maquetan, sin base de datos
+            method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(EXPORT_PDF_WORKERS,
+                                        mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _chunks(items, header):
+    """(sections, header) per task; the header goes with the first chunk"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= EXPORT_PDF_SECTIONS_PER_CHUNK:
+            yield chunk, header
+            chunk, header = [], None
+    if chunk or header:
+        yield chunk, header
+
+
+def _laid_out_chunks(kind, items, header):
+    """Page streams of each chunk, in order; at most two tasks per worker in
+    flight so the sections are read from the database as the pool advances"""
+    global _pool
+    chunks = _chunks(items, header)
+    head = list(itertools.islice(chunks, 2))
+    chunks = itertools.chain(head, chunks)
+    # Un solo chunk: se maqueta en el proceso, sin pasar por el pool
+    pool = _section_pool() if len(head) > 1 else None
+    if pool is None:
+        for chunk in chunks:
+            yield _layout_chunk(kind, *chunk)
+        return
+
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(_layout_chunk, kind, *chunk))
+            if len(pending) >= 2 * EXPORT_PDF_WORKERS:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    except BrokenProcessPool:
+        # Un proceso murió: el pool ya no sirve, la próxima exportación crea otro
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
 
 
 class ExportManager:
@@ -45,6 +275,41 @@ class ExportManager:
                 alignment=TA_LEFT
             )
         }
+        # Estilos de tabla compartidos por todas las tablas de un mismo tipo
+        self.table_styles = {
+            'summary': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
+                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
+            ]),
+            'listing': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 10),
+                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 1), (-1, -1), 8),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1),
+                 [colors.white, colors.HexColor('#f8fafc')])
+            ]),
+            'details': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
+                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+                ('FONTNAME', (1, 0), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 9),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
+            ]),
+        }
 
     def _serialize_data(self, objects):
         """Convert SQLAlchemy objects to serialized data"""
@@ -57,124 +322,168 @@ class ExportManager:
                 serialized.append(obj.__dict__)
         return serialized
 
-    def export_tickets_pdf(self, tickets_data, filename="tickets_export"):
-        """Export tickets data to PDF format"""
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch
-        from datetime import datetime
-        import io
-
-        # Serialize the data if needed
-        if tickets_data and not isinstance(tickets_data[0], dict):
-            tickets_data = self._serialize_data(tickets_data)
-
-        # Create a file-like buffer to receive PDF data
-        buffer = io.BytesIO()
-
-        # Create the PDF object, using the buffer as its "file"
-        doc = SimpleDocTemplate(
-            buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-
-        # Container for the 'Flowable' objects
-        elements = []
-
-        # Title
-        title = Paragraph("Reporte de Tickets",
-                          self.custom_styles['CustomTitle'])
-        elements.append(title)
-        elements.append(Spacer(1, 20))
-
-        # Date
-        date_str = datetime.now().strftime("%d/%m/%Y %H:%M")
-        date_para = Paragraph(
-            f"Generado el: {date_str}", self.custom_styles['CustomNormal'])
-        elements.append(date_para)
-        elements.append(Spacer(1, 20))
-
-        # Summary
-        total_tickets = len(tickets_data)
-        open_tickets = len(
-            [t for t in tickets_data if t.get('status') == 'open'])
-        resolved_tickets = len(
-            [t for t in tickets_data if t.get('status') == 'resolved'])
+    def _table(self, data, col_widths, style, repeat_rows=0):
+        table = Table(data, colWidths=col_widths, repeatRows=repeat_rows)
+        table.setStyle(self.table_styles[style])
+        return table
+
+    def _new_pdf_file(self):
+        """Temporary file (deleted on close) to build the PDF into"""
+        return tempfile.TemporaryFile(suffix='.pdf')
+
+    def _pdf_doc(self, target, bottom_margin=18):
+        return SimpleDocTemplate(
+            target, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72,
+            bottomMargin=bottom_margin)
+
+    def _report_header(self, title, summary_data, date_str=None):
+        yield Paragraph(title, self.custom_styles['CustomTitle'])
+        yield Spacer(1, 20)
+        date_str = date_str or datetime.now().strftime("%d/%m/%Y %H:%M")
+        yield Paragraph(f"Generado el: {date_str}", self.custom_styles['CustomNormal'])
+        yield Spacer(1, 20)
+        yield self._table(summary_data, [3*inch, 1*inch], 'summary')
+        yield Spacer(1, 30)
+
+    @staticmethod
+    def ticket_summary(tickets_data):
+        """Counts shown at the top of the tickets PDF, from a list of tickets"""
+        return {
+            'total': len(tickets_data),
+            'open': len([t for t in tickets_data if t.get('status') == 'open']),
+            'resolved': len([t for t in tickets_data if t.get('status') == 'resolved']),
+        }
 
-        summary_data = [
-            ['Total de Tickets', str(total_tickets)],
-            ['Tickets Abiertos', str(open_tickets)],
-            ['Tickets Resueltos', str(resolved_tickets)]
+    def _ticket_row(self, ticket):
+        title = ticket.get('title') or ''
+        return [
+            str(ticket.get('id', '')),
+            title[:40] + ('...' if len(title) > 40 else ''),
+            (ticket.get('status') or '').title(),
+            (ticket.get('priority') or '').title(),
+            ticket.get('requester_name') or 'N/A',
+            _format_date(ticket.get('created_at'))
         ]
 
-        summary_table = Table(summary_data, colWidths=[3*inch, 1*inch])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
-        ]))
-
-        elements.append(summary_table)
-        elements.append(Spacer(1, 30))
-
-        # Tickets table
-        if tickets_data:
-            # Table headers
-            table_data = [['ID', 'Título', 'Estado',
-                           'Prioridad', 'Solicitante', 'Fecha']]
-
-            # Table rows
-            for ticket in tickets_data:
-                created_date = 'N/A'
-                if ticket.get('created_at'):
-                    try:
-                        if isinstance(ticket['created_at'], str):
-                            created_date = datetime.fromisoformat(
-                                ticket['created_at'].replace('Z', '+00:00')).strftime('%d/%m/%Y')
-                        else:
-                            created_date = ticket['created_at'].strftime(
-                                '%d/%m/%Y')
-                    except:
-                        created_date = 'N/A'
-
-                row = [
-                    str(ticket.get('id', '')),
-                    ticket.get('title', '')[
-                        :40] + ('...' if len(ticket.get('title', '')) > 40 else ''),
-                    ticket.get('status', '').title(),
-                    ticket.get('priority', '').title(),
-                    ticket.get('requester_name', 'N/A'),
-                    created_date
-                ]
-                table_data.append(row)
-
-            # Create table
-            tickets_table = Table(table_data, colWidths=[
-                                  0.5*inch, 2.5*inch, 1*inch, 1*inch, 1.5*inch, 1*inch])
-            tickets_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1),
-                 [colors.white, colors.HexColor('#f8fafc')])
-            ]))
-
-            elements.append(tickets_table)
-
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
-
-        return buffer
+    def _ticket_tables(self, tickets_data):
+        """Page-sized table fragments (header repeated) instead of one giant Table"""
+        header = ['ID', 'Título', 'Estado', 'Prioridad', 'Solicitante', 'Fecha']
+        rows = [header]
+        for ticket in tickets_data:
+            rows.append(self._ticket_row(ticket))
+            if len(rows) > EXPORT_PDF_TABLE_ROWS:
+                yield self._table(rows, TICKET_COLUMNS, 'listing', repeat_rows=1)
+                rows = [header]
+        if len(rows) > 1:
+            yield self._table(rows, TICKET_COLUMNS, 'listing', repeat_rows=1)
+
+    def export_tickets_pdf(self, tickets_data, filename="tickets_export", summary=None):
+        """Export tickets to PDF.
+
+        tickets_data may be a list (dicts or models) or any iterable of dicts,
+        e.g. stream_rows(); with an iterable pass the counts in `summary`
+        (see ticket_summary). Returns a temporary file positioned at 0."""
+        if isinstance(tickets_data, list):
+            if tickets_data and not isinstance(tickets_data[0], dict):
+                tickets_data = self._serialize_data(tickets_data)
+            summary = summary or self.ticket_summary(tickets_data)
+        elif summary is None:
+            raise ValueError("summary is required when tickets_data is not a list")
+
+        def story():
+            yield from self._report_header("Reporte de Tickets", [
+                ['Total de Tickets', str(summary['total'])],
+                ['Tickets Abiertos', str(summary['open'])],
+                ['Tickets Resueltos', str(summary['resolved'])]
+            ])
+            yield from self._ticket_tables(tickets_data)
+
+        pdf_file = self._new_pdf_file()
+        try:
+            self._pdf_doc(pdf_file).build(_StreamedStory(story()),
+                                          canvasmaker=_CompressingCanvas)
+        except Exception:
+            pdf_file.close()
+            raise
+        pdf_file.seek(0)
+        return pdf_file
+
+    # --- Reportes por secciones (pool de procesos) ---------------------------------
+
+    def _matrix_section(self, matrix):
+        """Flowables of one matrix"""
+        yield Paragraph(f"Matriz: {matrix.get('name', 'Sin nombre')}",
+                        self.custom_styles['CustomHeading'])
+
+        description = matrix.get('description') or 'Sin descripción'
+        info_data = [
+            ['Tipo', (matrix.get('matrix_type') or 'custom').upper()],
+            ['Descripción', description[:100] + ('...' if len(description) > 100 else '')],
+            ['Dimensiones', f"{matrix.get('rows', 0)} x {matrix.get('columns', 0)}"],
+            ['Fecha Creación', _format_date(matrix.get('created_at'))]
+        ]
+        yield self._table(info_data, [1.5*inch, 4*inch], 'details')
+        yield Spacer(1, 15)
+
+    def _chunk_story(self, kind, items, header=None):
+        if header:
+            yield from self._report_header(*header)
+        section = self._matrix_section if kind == 'matrix' else self._journal_section
+        for item in items:
+            yield from section(item)
+
+    def _layout_pages(self, flowables):
+        """Lay out flowables with platypus; returns each page's drawing operators"""
+        canvases = []
+
+        def capture(*args, **kwargs):
+            canvas = _PageCapture(*args, **kwargs)
+            canvases.append(canvas)
+            return canvas
+
+        self._pdf_doc(io.BytesIO(), bottom_margin=SECTION_BOTTOM_MARGIN).build(
+            _StreamedStory(flowables), canvasmaker=capture)
+        return canvases[0].pages
+
+    def _draw_page_number(self, canvas, number):
+        text = f"Página {number} de "
+        x = A4[0] / 2 - canvas.stringWidth(text, 'Helvetica', 8)
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawString(x, 18, text)
+        canvas.translate(x + canvas.stringWidth(text, 'Helvetica', 8), 18)
+        canvas.doForm('total_pages')
+        canvas.restoreState()
+
+    def _render_sections(self, title, summary_data, kind, items):
+        """Build a sectioned report: chunks laid out by the pool, pages
+        replayed here in order with "Página X de N". Returns a temporary file."""
+        header = (title, summary_data, datetime.now().strftime("%d/%m/%Y %H:%M"))
+        pdf_file = self._new_pdf_file()
+        try:
+            canvas = _CompressingCanvas(pdf_file, pagesize=A4)
+            _register_fonts(canvas)
+            number = 0
+            for pages in _laid_out_chunks(kind, items, header):
+                for code in pages:
+                    number += 1
+                    canvas.saveState()
+                    canvas.addLiteral(code)
+                    canvas.restoreState()
+                    self._draw_page_number(canvas, number)
+                    canvas.showPage()
+
+            # Total de páginas: la forma que referencian todos los pies de página
+            canvas.beginForm('total_pages')
+            canvas.setFont('Helvetica', 8)
+            canvas.drawString(0, 0, str(number))
+            canvas.endForm()
+            canvas.save()
+        except Exception:
+            pdf_file.close()
+            raise
+        pdf_file.seek(0)
+        return pdf_file
 
     def export_tickets_excel(self, tickets_data, filename="tickets_export"):
         """Export tickets to Excel"""
@@ -224,6 +533,7 @@ class ExportManager:
             })
 
         # Create DataFrame
+        pd = _pandas()
         df = pd.DataFrame(excel_data)
 
         # Create Excel file in memory
@@ -252,93 +562,24 @@ class ExportManager:
         return buffer
 
     def export_matrices_pdf(self, matrices_data, filename="matrices_export"):
-        """Export matrices data to PDF format"""
+        """Export matrices to PDF (sections laid out in the process pool).
+        Returns a temporary file positioned at 0."""
         # Serialize the data if needed
         if matrices_data and not isinstance(matrices_data[0], dict):
             matrices_data = self._serialize_data(matrices_data)
-        """Export matrices to PDF"""
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72,
-                                topMargin=72, bottomMargin=18)
-
-        elements = []
-
-        # Title
-        title = Paragraph("Reporte de Matrices de Análisis",
-                          self.custom_styles['CustomTitle'])
-        elements.append(title)
-        elements.append(Spacer(1, 20))
-
-        # Date
-        date_str = datetime.now().strftime("%d/%m/%Y %H:%M")
-        date_para = Paragraph(
-            f"Generado el: {date_str}", self.custom_styles['CustomNormal'])
-        elements.append(date_para)
-        elements.append(Spacer(1, 20))
 
         # Summary
-        total_matrices = len(matrices_data)
         matrix_types = {}
         for matrix in matrices_data:
             matrix_type = matrix.get('matrix_type', 'custom')
             matrix_types[matrix_type] = matrix_types.get(matrix_type, 0) + 1
 
-        summary_data = [['Total de Matrices', str(total_matrices)]]
+        summary_data = [['Total de Matrices', str(len(matrices_data))]]
         for matrix_type, count in matrix_types.items():
             summary_data.append([f'Tipo: {matrix_type.upper()}', str(count)])
 
-        summary_table = Table(summary_data, colWidths=[3*inch, 1*inch])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
-        ]))
-
-        elements.append(summary_table)
-        elements.append(Spacer(1, 30))
-
-        # Individual matrices
-        for matrix in matrices_data:
-            # Matrix title
-            matrix_title = Paragraph(
-                f"Matriz: {matrix.get('name', 'Sin nombre')}", self.custom_styles['CustomHeading'])
-            elements.append(matrix_title)
-
-            # Matrix info
-            info_data = [
-                ['Tipo', matrix.get('matrix_type', 'custom').upper()],
-                ['Descripción', matrix.get('description', 'Sin descripción')[
-                    :100] + ('...' if len(matrix.get('description', '')) > 100 else '')],
-                ['Dimensiones',
-                    f"{matrix.get('rows', 0)} x {matrix.get('columns', 0)}"],
-                ['Fecha Creación', datetime.fromisoformat(matrix['created_at'].replace(
-                    'Z', '+00:00')).strftime('%d/%m/%Y') if matrix.get('created_at') else 'N/A']
-            ]
-
-            info_table = Table(info_data, colWidths=[1.5*inch, 4*inch])
-            info_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (1, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
-            ]))
-
-            elements.append(info_table)
-            elements.append(Spacer(1, 15))
-
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
-
-        return buffer
+        return self._render_sections("Reporte de Matrices de Análisis", summary_data,
+                                     'matrix', matrices_data)
 
     def export_matrices_excel(self, matrices_data, filename="matrices_export"):
         """Export matrices data to Excel format"""
@@ -450,6 +691,7 @@ class ExportManager:
                     })
 
                 # Create DataFrame
+                pd = _pandas()
                 df = pd.DataFrame(excel_data)
 
                 # Create Excel file in memory
@@ -480,113 +722,64 @@ class ExportManager:
                 raise Exception(
                     f"Excel export failed and pandas not available: {str(e)}")
 
-    def export_journal_pdf(self, journal_data, filename="journal_export"):
-        """Export journal data to PDF format"""
-        # Serialize the data if needed
-        if journal_data and not isinstance(journal_data[0], dict):
-            journal_data = self._serialize_data(journal_data)
-        """Export journal entries to PDF"""
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72,
-                                topMargin=72, bottomMargin=18)
-
-        elements = []
-
-        # Title
-        title = Paragraph("Reporte de Bitácora",
-                          self.custom_styles['CustomTitle'])
-        elements.append(title)
-        elements.append(Spacer(1, 20))
-
-        # Date
-        date_str = datetime.now().strftime("%d/%m/%Y %H:%M")
-        date_para = Paragraph(
-            f"Generado el: {date_str}", self.custom_styles['CustomNormal'])
-        elements.append(date_para)
-        elements.append(Spacer(1, 20))
-
-        # Summary
-        total_entries = len(journal_data)
-        total_hours = sum(entry.get('hours_worked', 0)
-                          or 0 for entry in journal_data)
-        categories = {}
+    @staticmethod
+    def journal_summary(journal_data):
+        """Totals shown at the top of the journal PDF, from a list of entries"""
         statuses = {}
-
         for entry in journal_data:
-            category = entry.get('category', 'work')
             status = entry.get('status', 'pending')
-            categories[category] = categories.get(category, 0) + 1
             statuses[status] = statuses.get(status, 0) + 1
+        return {
+            'total': len(journal_data),
+            'hours': sum(entry.get('hours_worked', 0) or 0 for entry in journal_data),
+            'completed': statuses.get('completed', 0),
+            'pending': statuses.get('pending', 0),
+        }
 
-        summary_data = [
-            ['Total de Entradas', str(total_entries)],
-            ['Total de Horas', f"{total_hours:.1f}h"],
-            ['Entradas Completadas', str(statuses.get('completed', 0))],
-            ['Entradas Pendientes', str(statuses.get('pending', 0))]
+    def _journal_section(self, entry):
+        """Flowables of one journal entry"""
+        yield Paragraph(f"Entrada: {entry.get('title') or 'Sin título'}",
+                        self.custom_styles['CustomHeading'])
+
+        details_data = [
+            ['Fecha', _format_date(entry.get('entry_date'), '%d/%m/%Y %H:%M')],
+            ['Categoría', (entry.get('category') or 'work').title()],
+            ['Estado', (entry.get('status') or 'pending').title()],
+            ['Prioridad', (entry.get('priority') or 'medium').title()],
+            ['Horas', f"{entry.get('hours_worked', 0) or 0}h"],
+            ['Ubicación', entry.get('location') or 'N/A']
         ]
+        yield self._table(details_data, [1.5*inch, 4*inch], 'details')
+
+        content = entry.get('content') or ''
+        if content:
+            yield Spacer(1, 10)
+            yield Paragraph(
+                f"<b>Contenido:</b><br/>{content[:300]}{'...' if len(content) > 300 else ''}",
+                self.custom_styles['CustomNormal'])
+
+        yield Spacer(1, 20)
+
+    def export_journal_pdf(self, journal_data, filename="journal_export", summary=None):
+        """Export journal entries to PDF.
+
+        Same contract as export_tickets_pdf: a list, or an iterable of dicts
+        plus `summary` (see journal_summary). The entries are laid out in the
+        process pool. Returns a temporary file."""
+        if isinstance(journal_data, list):
+            if journal_data and not isinstance(journal_data[0], dict):
+                journal_data = self._serialize_data(journal_data)
+            summary = summary or self.journal_summary(journal_data)
+        elif summary is None:
+            raise ValueError("summary is required when journal_data is not a list")
 
-        summary_table = Table(summary_data, colWidths=[3*inch, 1*inch])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
-        ]))
-
-        elements.append(summary_table)
-        elements.append(Spacer(1, 30))
-
-        # Journal entries
-        for entry in journal_data:
-            # Entry title
-            entry_title = Paragraph(
-                f"Entrada: {entry.get('title', 'Sin título')}", self.custom_styles['CustomHeading'])
-            elements.append(entry_title)
-
-            # Entry details
-            entry_date = datetime.fromisoformat(entry['entry_date'].replace(
-                'Z', '+00:00')).strftime('%d/%m/%Y %H:%M') if entry.get('entry_date') else 'N/A'
-
-            details_data = [
-                ['Fecha', entry_date],
-                ['Categoría', entry.get('category', 'work').title()],
-                ['Estado', entry.get('status', 'pending').title()],
-                ['Prioridad', entry.get('priority', 'medium').title()],
-                ['Horas', f"{entry.get('hours_worked', 0) or 0}h"],
-                ['Ubicación', entry.get('location', 'N/A')]
-            ]
-
-            details_table = Table(details_data, colWidths=[1.5*inch, 4*inch])
-            details_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8fafc')),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (1, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb'))
-            ]))
-
-            elements.append(details_table)
-
-            # Entry content
-            if entry.get('content'):
-                content_para = Paragraph(
-                    f"<b>Contenido:</b><br/>{entry.get('content', '')[:300]}{'...' if len(entry.get('content', '')) > 300 else ''}", self.custom_styles['CustomNormal'])
-                elements.append(Spacer(1, 10))
-                elements.append(content_para)
-
-            elements.append(Spacer(1, 20))
-
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
-
-        return buffer
+        summary_data = [
+            ['Total de Entradas', str(summary['total'])],
+            ['Total de Horas', f"{summary['hours'] or 0:.1f}h"],
+            ['Entradas Completadas', str(summary['completed'])],
+            ['Entradas Pendientes', str(summary['pending'])]
+        ]
+        return self._render_sections("Reporte de Bitácora", summary_data, 'journal', journal_data)
 
     def export_journal_excel(self, journal_data, filename="journal_export"):
         """Export journal data to Excel format"""
@@ -617,6 +810,7 @@ class ExportManager:
             })
 
         # Create DataFrame
+        pd = _pandas()
         df = pd.DataFrame(excel_data)
 
         # Create Excel file in memory
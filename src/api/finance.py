@@ -0,0 +1,252 @@
+"""
+Finance aggregation for payment reminders and service orders.
+
+Totals are grouped in SQL and only the aggregated rows are converted to the
+requested base currency. Exchange rates come from the local exchange_rate
+table and are cached in memory; every lookup compares the table's last
+updated_at and row count with the cached copy, so an edit made through any
+worker is picked up on the next request.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import func, select
+
+from api.models import db, ExchangeRate, PaymentReminder, ServiceOrder
+from api.utils import month_key
+
+BASE_CURRENCY = os.getenv('FINANCE_BASE_CURRENCY', 'USD')
+RATES_CACHE_TTL = int(os.getenv('EXCHANGE_RATES_CACHE_TTL', '3600'))
+
+# Meses entre ocurrencias para la proyección de pagos
+RECURRENCE_PERIODS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'annually': 12,
+    'yearly': 12,
+}
+
+_rates_lock = threading.Lock()
+_rates_cache = {"rates": None, "stamp": None, "loaded_at": 0.0}
+
+
+def _rates_stamp():
+    """(last updated_at, row count) of exchange_rate: changes with any edit,
+    insert or delete made by any worker"""
+    return tuple(db.session.execute(
+        select(func.max(ExchangeRate.updated_at), func.count(ExchangeRate.id))).one())
+
+
+def get_exchange_rates():
+    """Return {currency: rate_in_base}; reloaded when the table changed (one
+    aggregate query per call) and at least once per TTL"""
+    stamp = _rates_stamp()
+    with _rates_lock:
+        rates = _rates_cache["rates"]
+        if rates is None or stamp != _rates_cache["stamp"] or \
+                time.monotonic() - _rates_cache["loaded_at"] > RATES_CACHE_TTL:
+            rows = db.session.execute(
+                select(ExchangeRate.currency, ExchangeRate.rate)).all()
+            rates = {currency.upper(): rate for currency, rate in rows}
+            rates.setdefault(BASE_CURRENCY, 1.0)
+            _rates_cache["rates"] = rates
+            _rates_cache["stamp"] = stamp
+            _rates_cache["loaded_at"] = time.monotonic()
+        return rates
+
+
+def invalidate_exchange_rates():
+    """Drop the cached rates after the exchange_rate table changes"""
+    with _rates_lock:
+        _rates_cache["rates"] = None
+
+
+def convert(amount, currency, base, rates):
+    """Convert an amount between currencies; None when a rate is missing"""
+    currency = (currency or BASE_CURRENCY).upper()
+    if currency not in rates or base not in rates:
+        return None
+    return amount * rates[currency] / rates[base]
+
+
+def _add_converted(bucket, amount, currency, base, rates, missing):
+    converted = convert(amount or 0.0, currency, base, rates)
+    if converted is None:
+        missing.add((currency or BASE_CURRENCY).upper())
+        return
+    bucket["total"] = round(bucket["total"] + converted, 2)
+
+
+def project_liabilities(base, rates, months=12, now=None, user_id=None):
+    """Project pending reminder amounts over the next `months` months.
+
+    Only (amount, currency, due month, recurrence) columns are read; the
+    occurrence grid (reminders x months) is built with NumPy broadcasting.
+    """
+    now = now or datetime.utcnow()
+    query = select(
+        PaymentReminder.amount,
+        PaymentReminder.currency,
+        PaymentReminder.due_date,
+        PaymentReminder.recurrence
+    ).where(
+        PaymentReminder.status.in_(['pending', 'overdue']),
+        PaymentReminder.amount.isnot(None)
+    )
+    if user_id is not None:
+        query = query.where(PaymentReminder.user_id == user_id)
+    rows = db.session.execute(query).all()
+
+    labels = []
+    year, month = now.year, now.month
+    for _ in range(months):
+        labels.append(f"{year:04d}-{month:02d}")
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+    if not rows:
+        return {"months": labels, "totals": [0.0] * months, "missing_rates": []}
+
+    amounts = np.array([row.amount for row in rows], dtype=float)
+    factors = np.array([
+        rates.get((row.currency or BASE_CURRENCY).upper(), np.nan)
+        for row in rows
+    ], dtype=float) / rates.get(base, np.nan)
+    # Desfase en meses entre hoy y el vencimiento (vencidos cuentan en el mes actual)
+    offsets = np.array([
+        (row.due_date.year - now.year) * 12 + row.due_date.month - now.month
+        for row in rows
+    ], dtype=int)
+    offsets = np.maximum(offsets, 0)
+    periods = np.array([
+        RECURRENCE_PERIODS.get(row.recurrence, 0) for row in rows
+    ], dtype=int)
+
+    grid = np.arange(months)[np.newaxis, :]
+    delta = grid - offsets[:, np.newaxis]
+    recurring = periods[:, np.newaxis] > 0
+    safe_periods = np.where(periods > 0, periods, 1)[:, np.newaxis]
+    occurs = (delta == 0) | (recurring & (delta >= 0) &
+                             (delta % safe_periods == 0))
+
+    missing = sorted({
+        (row.currency or BASE_CURRENCY).upper()
+        for row, factor in zip(rows, factors) if np.isnan(factor)
+    })
+    values = np.where(np.isnan(factors), 0.0, amounts * factors)
+    totals = (occurs * values[:, np.newaxis]).sum(axis=0)
+
+    return {
+        "months": labels,
+        "totals": [round(float(total), 2) for total in totals],
+        "missing_rates": missing
+    }
+
+
+def finance_summary(base=None, months=12, user_id=None, now=None):
+    """Aggregate reminder and service order amounts per currency, month and status"""
+    base = (base or BASE_CURRENCY).upper()
+    rates = get_exchange_rates()
+    dialect = db.engine.dialect.name
+    missing = set()
+
+    reminder_filter = []
+    order_filter = []
+    if user_id is not None:
+        reminder_filter.append(PaymentReminder.user_id == user_id)
+        order_filter.append(db.or_(
+            ServiceOrder.assigned_to == user_id,
+            ServiceOrder.created_by == user_id
+        ))
+
+    # Recordatorios por moneda y estado
+    by_currency = {}
+    by_status = {}
+    rows = db.session.execute(
+        select(
+            PaymentReminder.currency,
+            PaymentReminder.status,
+            func.count(PaymentReminder.id),
+            func.sum(PaymentReminder.amount)
+        ).where(*reminder_filter)
+        .group_by(PaymentReminder.currency, PaymentReminder.status)
+    ).all()
+    for currency, status, count, amount in rows:
+        currency = (currency or BASE_CURRENCY).upper()
+        cur = by_currency.setdefault(
+            currency, {"count": 0, "amount": 0.0, "statuses": {}})
+        cur["count"] += count
+        cur["amount"] = round(cur["amount"] + (amount or 0.0), 2)
+        cur["statuses"][status] = round(
+            cur["statuses"].get(status, 0.0) + (amount or 0.0), 2)
+
+        st = by_status.setdefault(status, {"count": 0, "total": 0.0})
+        st["count"] += count
+        _add_converted(st, amount, currency, base, rates, missing)
+
+    # Recordatorios por mes de vencimiento
+    by_month = {}
+    due_month = month_key(PaymentReminder.due_date, dialect)
+    rows = db.session.execute(
+        select(
+            due_month,
+            PaymentReminder.currency,
+            func.count(PaymentReminder.id),
+            func.sum(PaymentReminder.amount)
+        ).where(*reminder_filter)
+        .group_by(due_month, PaymentReminder.currency)
+        .order_by(due_month)
+    ).all()
+    for month, currency, count, amount in rows:
+        bucket = by_month.setdefault(month, {"count": 0, "total": 0.0})
+        bucket["count"] += count
+        _add_converted(bucket, amount, currency, base, rates, missing)
+
+    # Órdenes de servicio (horas estimadas x tarifa, en moneda base)
+    order_value = func.sum(
+        func.coalesce(ServiceOrder.estimated_hours, 0) *
+        func.coalesce(ServiceOrder.hourly_rate, 0)
+    )
+    order_month = month_key(ServiceOrder.created_at, dialect)
+    orders_by_status = {
+        status: {"count": count, "total": round(
+            convert(value or 0.0, BASE_CURRENCY, base, rates) or 0.0, 2)}
+        for status, count, value in db.session.execute(
+            select(ServiceOrder.status, func.count(ServiceOrder.id), order_value)
+            .where(*order_filter)
+            .group_by(ServiceOrder.status)
+        ).all()
+    }
+    orders_by_month = {
+        month: {"count": count, "total": round(
+            convert(value or 0.0, BASE_CURRENCY, base, rates) or 0.0, 2)}
+        for month, count, value in db.session.execute(
+            select(order_month, func.count(ServiceOrder.id), order_value)
+            .where(*order_filter)
+            .group_by(order_month)
+            .order_by(order_month)
+        ).all()
+    }
+
+    projection = project_liabilities(
+        base, rates, months=months, now=now, user_id=user_id)
+    missing.update(projection.pop("missing_rates"))
+
+    return {
+        "base_currency": base,
+        "payment_reminders": {
+            "by_currency": by_currency,
+            "by_status": by_status,
+            "by_month": by_month,
+        },
+        "service_orders": {
+            "by_status": orders_by_status,
+            "by_month": orders_by_month,
+        },
+        "projection": projection,
+        "missing_rates": sorted(missing),
+    }
@@ -0,0 +1,167 @@
+"""
+Login throttling.
+
+Every login attempt takes a token from a per-username and a per-IP token
+bucket before any password hash is checked, and failed attempts lock the
+username out with exponential backoff. Buckets live in a bounded in-memory
+LRU by default; set LOGIN_GUARD_REDIS_URL to share them between gunicorn
+workers (requires the optional `redis` package).
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+USERNAME_CAPACITY = int(os.getenv('LOGIN_GUARD_USER_CAPACITY', '5'))
+USERNAME_REFILL_PER_MIN = float(os.getenv('LOGIN_GUARD_USER_REFILL_PER_MIN', '5'))
+IP_CAPACITY = int(os.getenv('LOGIN_GUARD_IP_CAPACITY', '20'))
+IP_REFILL_PER_MIN = float(os.getenv('LOGIN_GUARD_IP_REFILL_PER_MIN', '20'))
+BACKOFF_BASE_SECONDS = float(os.getenv('LOGIN_GUARD_BACKOFF_BASE', '1'))
+BACKOFF_MAX_SECONDS = float(os.getenv('LOGIN_GUARD_BACKOFF_MAX', '900'))
+MAX_TRACKED_KEYS = int(os.getenv('LOGIN_GUARD_MAX_KEYS', '10000'))
+TRUST_PROXY = os.getenv('LOGIN_GUARD_TRUST_PROXY', '0') == '1'
+
+
+class MemoryBackend:
+    """Token buckets and failure counters in a bounded LRU (per process)"""
+
+    def __init__(self, max_keys=MAX_TRACKED_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _touch(self, store, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_keys:
+            store.popitem(last=False)
+
+    def take(self, key, capacity, refill_per_sec, now):
+        """Take one token; returns seconds to wait (0 when allowed)"""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_sec)
+            if tokens >= 1:
+                self._touch(self._buckets, key, (tokens - 1, now))
+                return 0
+            self._touch(self._buckets, key, (tokens, now))
+            return (1 - tokens) / refill_per_sec
+
+    def get_failures(self, key):
+        with self._lock:
+            return self._failures.get(key, (0, 0.0))
+
+    def set_failures(self, key, count, locked_until):
+        with self._lock:
+            self._touch(self._failures, key, (count, locked_until))
+
+    def clear_failures(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+class RedisBackend:
+    """Same contract as MemoryBackend, shared by all workers"""
+
+    def __init__(self, url, ttl=3600):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def take(self, key, capacity, refill_per_sec, now):
+        bucket_key = f"login_guard:bucket:{key}"
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(bucket_key)
+                    stored = pipe.hgetall(bucket_key)
+                    tokens = float(stored.get(b'tokens', capacity))
+                    updated = float(stored.get(b'updated', now))
+                    tokens = min(capacity, tokens +
+                                 (now - updated) * refill_per_sec)
+                    allowed = tokens >= 1
+                    pipe.multi()
+                    pipe.hset(bucket_key, mapping={
+                        'tokens': tokens - 1 if allowed else tokens,
+                        'updated': now
+                    })
+                    pipe.expire(bucket_key, self.ttl)
+                    pipe.execute()
+                    return 0 if allowed else (1 - tokens) / refill_per_sec
+                except redis.WatchError:
+                    continue
+
+    def get_failures(self, key):
+        stored = self.client.hgetall(f"login_guard:fail:{key}")
+        if not stored:
+            return (0, 0.0)
+        return (int(stored[b'count']), float(stored[b'locked_until']))
+
+    def set_failures(self, key, count, locked_until):
+        fail_key = f"login_guard:fail:{key}"
+        self.client.hset(fail_key, mapping={
+            'count': count, 'locked_until': locked_until})
+        self.client.expire(fail_key, int(BACKOFF_MAX_SECONDS) + self.ttl)
+
+    def clear_failures(self, key):
+        self.client.delete(f"login_guard:fail:{key}")
+
+
+class LoginGuard:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+
+    @staticmethod
+    def client_ip(request):
+        if TRUST_PROXY and request.access_route:
+            return request.access_route[0]
+        return request.remote_addr or 'unknown'
+
+    def check(self, username, ip, now=None):
+        """Seconds the caller must wait before trying again (0 = go ahead)"""
+        now = now if now is not None else time.time()
+        username = (username or '').lower()
+
+        _, locked_until = self.backend.get_failures(username)
+        if locked_until > now:
+            return locked_until - now
+
+        wait = self.backend.take(
+            f"ip:{ip}", IP_CAPACITY, IP_REFILL_PER_MIN / 60.0, now)
+        if wait:
+            return wait
+        return self.backend.take(
+            f"user:{username}", USERNAME_CAPACITY, USERNAME_REFILL_PER_MIN / 60.0, now)
+
+    def record_failure(self, username, now=None):
+        now = now if now is not None else time.time()
+        username = (username or '').lower()
+        count, _ = self.backend.get_failures(username)
+        count += 1
+        delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (count - 1))
+        self.backend.set_failures(username, count, now + delay)
+
+    def record_success(self, username):
+        self.backend.clear_failures((username or '').lower())
+
+
+def _build_backend():
+    url = os.getenv('LOGIN_GUARD_REDIS_URL')
+    if url and REDIS_AVAILABLE:
+        return RedisBackend(url)
+    return MemoryBackend()
+
+
+login_guard = LoginGuard(_build_backend())
+
+
+def retry_after_header(wait):
+    return str(max(1, math.ceil(wait)))
@@ -1,10 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import String, Boolean, Text, DateTime, Integer, JSON
+from sqlalchemy.orm import declared_attr
 from datetime import datetime
 import json
+import os
 from werkzeug.security import generate_password_hash, check_password_hash
+from api.replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+# Método de hash de contraseñas (formato werkzeug), p. ej. "scrypt:32768:8:1"
+# o "pbkdf2:sha256:600000". Los hashes antiguos se actualizan al iniciar sesión.
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+
+class BranchScopedMixin:
+    """Modelos filtrados automáticamente por la sucursal del usuario (ver api.tenancy)"""
+    @declared_attr
+    def branch_id(cls):
+        return db.Column(db.Integer, db.ForeignKey('branches.id'),
+                         nullable=True, index=True)
 
 
 class Branch(db.Model):
@@ -101,16 +116,24 @@ class User(db.Model):
     phone = db.Column(db.String(20), nullable=True)
     hire_date = db.Column(db.DateTime, nullable=True)
     salary = db.Column(db.Float, nullable=True)
+    # Categorías de ticket que atiende (asignación automática, ver api.assignment)
+    skills = db.Column(db.JSON, nullable=True)
 
     def set_password(self, password):
         """Set password hash from plain text password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(
+            password, method=PASSWORD_HASH_METHOD)
         self.password = self.password_hash  # Mantener sincronizados por compatibilidad
 
     def check_password(self, password):
         """Check if provided password matches hash"""
         return check_password_hash(self.password_hash, password)
 
+    def password_needs_rehash(self):
+        """True when the stored hash uses different parameters than configured"""
+        method = (self.password_hash or '').split('$', 1)[0]
+        return method != PASSWORD_HASH_METHOD
+
     def serialize(self):
         return {
             "id": self.id,
@@ -135,6 +158,7 @@ class User(db.Model):
             "phone": self.phone,
             "hire_date": self.hire_date.isoformat() if self.hire_date else None,
             "salary": self.salary,
+            "skills": self.skills or [],
             "branch": self.branch_obj.serialize() if self.branch_obj else None,
             "role_details": self.role_obj.serialize() if self.role_obj else None,
             # do not serialize the password hash, its a security breach
@@ -171,7 +195,7 @@ class Task(db.Model):
         }
 
 
-class Ticket(db.Model):
+class Ticket(BranchScopedMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -179,6 +203,8 @@ class Ticket(db.Model):
     status = db.Column(db.String(50), default="open")
     # low, medium, high, urgent
     priority = db.Column(db.String(50), default="medium")
+    # Área del problema (redes, impresoras, ...); se cruza con User.skills
+    category = db.Column(db.String(50), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -191,12 +217,30 @@ class Ticket(db.Model):
     rating_comment = db.Column(db.Text, nullable=True)
     rated_at = db.Column(db.DateTime, nullable=True)
     rated_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    # SLA (ver api.sla): plazos calculados al crear y en cada cambio de estado
+    response_due_at = db.Column(db.DateTime, nullable=True)
+    resolution_due_at = db.Column(db.DateTime, nullable=True)
+    first_response_at = db.Column(db.DateTime, nullable=True)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+    sla_response_breached = db.Column(
+        db.Boolean(), nullable=False, default=False)
+    sla_resolution_breached = db.Column(
+        db.Boolean(), nullable=False, default=False)
+    # Próximo plazo pendiente; NULL cuando no queda nada por vigilar
+    sla_next_check_at = db.Column(db.DateTime, nullable=True, index=True)
 
     assignee = db.relationship("User", foreign_keys=[
                                assigned_to], backref="assigned_tickets")
     rater = db.relationship("User", foreign_keys=[
                             rated_by], backref="rated_tickets")
 
+    __table_args__ = (
+        db.Index('ix_ticket_status_created_at', 'status', 'created_at'),
+        db.Index('ix_ticket_assigned_to_status', 'assigned_to', 'status'),
+        db.Index('ix_ticket_created_at', 'created_at'),
+        db.Index('ix_ticket_requester_email', 'requester_email'),
+    )
+
     def serialize(self):
         return {
             "id": self.id,
@@ -204,6 +248,7 @@ class Ticket(db.Model):
             "description": self.description,
             "status": self.status,
             "priority": self.priority,
+            "category": self.category,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "assigned_to": self.assigned_to,
@@ -213,10 +258,108 @@ class Ticket(db.Model):
             "rating_comment": self.rating_comment,
             "rated_at": self.rated_at.isoformat() if self.rated_at else None,
             "rated_by": self.rated_by,
+            "branch_id": self.branch_id,
+            "response_due_at": self.response_due_at.isoformat() if self.response_due_at else None,
+            "resolution_due_at": self.resolution_due_at.isoformat() if self.resolution_due_at else None,
+            "first_response_at": self.first_response_at.isoformat() if self.first_response_at else None,
+            "resolved_at": self.resolved_at.isoformat() if self.resolved_at else None,
+            "sla_response_breached": self.sla_response_breached,
+            "sla_resolution_breached": self.sla_resolution_breached,
         }
 
 
-class CalendarEvent(db.Model):
+class SLAPolicy(db.Model):
+    """Plazos de respuesta/resolución por prioridad (y opcionalmente sucursal)"""
+    __tablename__ = 'sla_policy'
+    id = db.Column(db.Integer, primary_key=True)
+    priority = db.Column(db.String(50), nullable=False)
+    # NULL = política por defecto para todas las sucursales
+    branch_id = db.Column(db.Integer, db.ForeignKey(
+        'branches.id'), nullable=True)
+    response_minutes = db.Column(db.Integer, nullable=False)
+    resolution_minutes = db.Column(db.Integer, nullable=False)
+    is_active = db.Column(db.Boolean(), nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('priority', 'branch_id',
+                            name='uq_sla_policy_priority_branch'),
+    )
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "priority": self.priority,
+            "branch_id": self.branch_id,
+            "response_minutes": self.response_minutes,
+            "resolution_minutes": self.resolution_minutes,
+            "is_active": self.is_active,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class TicketEvent(db.Model):
+    """Historial append-only de un ticket (ver api.ticket_history)"""
+    __tablename__ = 'ticket_event'
+    id = db.Column(db.Integer, primary_key=True)
+    # Sin FK: el historial se conserva aunque se borre el ticket
+    ticket_id = db.Column(db.Integer, nullable=False)
+    # created, status, priority, assignment
+    event_type = db.Column(db.String(20), nullable=False)
+    from_status = db.Column(db.String(50), nullable=True)
+    to_status = db.Column(db.String(50), nullable=False)
+    # Estado del ticket al momento del evento
+    priority = db.Column(db.String(50), nullable=True)
+    assigned_to = db.Column(db.Integer, nullable=True)
+    changed_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    ticket = db.relationship(
+        "Ticket", primaryjoin="foreign(TicketEvent.ticket_id) == Ticket.id")
+
+    __table_args__ = (
+        db.Index('ix_ticket_event_ticket_id_created_at',
+                 'ticket_id', 'created_at'),
+    )
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "ticket_id": self.ticket_id,
+            "event_type": self.event_type,
+            "from_status": self.from_status,
+            "to_status": self.to_status,
+            "priority": self.priority,
+            "assigned_to": self.assigned_to,
+            "changed_by": self.changed_by,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class TicketRatingDaily(db.Model):
+    """Agregado diario de calificaciones por técnico y sucursal (ver api.ratings)"""
+    __tablename__ = 'ticket_rating_daily'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    # 0 = sin técnico / sin sucursal, para que la clave única no tenga NULLs
+    assigned_to = db.Column(db.Integer, nullable=False, default=0)
+    branch_id = db.Column(db.Integer, nullable=False, default=0)
+    ratings = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'assigned_to', 'branch_id',
+                            name='uq_ticket_rating_daily_key'),
+    )
+
+
+class CalendarEvent(BranchScopedMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -265,6 +408,7 @@ class CalendarEvent(db.Model):
             "recurrence_id": self.recurrence_id,
             "is_recurring": self.is_recurring,
             "recurrence_pattern": self.recurrence_pattern,
+            "branch_id": self.branch_id,
         }
 
 
@@ -303,7 +447,7 @@ class Matrix(db.Model):
         }
 
 
-class JournalEntry(db.Model):
+class JournalEntry(BranchScopedMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -345,6 +489,7 @@ class JournalEntry(db.Model):
             "location": self.location,
             "tags": self.tags.split(",") if self.tags else [],
             "attachments": self.attachments if self.attachments else [],
+            "branch_id": self.branch_id,
         }
 
 
@@ -361,6 +506,8 @@ class PaymentReminder(db.Model):
     recurrence = db.Column(db.String(50), default='one_time')
     # Días antes de vencimiento para recordar
     reminder_days = db.Column(db.Integer, default=7)
+    # Vencimiento para el que ya se generó la notificación (evita duplicados)
+    notified_due_date = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -368,6 +515,10 @@ class PaymentReminder(db.Model):
 
     user = db.relationship("User", backref="payment_reminders")
 
+    __table_args__ = (
+        db.Index('ix_payment_reminder_status_due_date', 'status', 'due_date'),
+    )
+
     def serialize(self):
         return {
             "id": self.id,
@@ -385,7 +536,25 @@ class PaymentReminder(db.Model):
         }
 
 
-class ServiceOrder(db.Model):
+class ExchangeRate(db.Model):
+    """Tipos de cambio locales usados para consolidar montos"""
+    id = db.Column(db.Integer, primary_key=True)
+    currency = db.Column(db.String(10), nullable=False, unique=True)
+    # Valor de 1 unidad de `currency` expresado en la moneda base (USD)
+    rate = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "currency": self.currency,
+            "rate": self.rate,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class ServiceOrder(BranchScopedMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -400,7 +569,7 @@ class ServiceOrder(db.Model):
     priority = db.Column(db.String(50), default='medium')
     estimated_hours = db.Column(db.Float, nullable=True)
     hourly_rate = db.Column(db.Float, nullable=True)
-    # JSON para almacenar el estado mensual {month_year: {completed: bool, completed_date: date}}
+    # Legacy: el estado mensual vive en service_order_month (ver ServiceOrderMonth)
     monthly_status = db.Column(db.JSON, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
@@ -414,6 +583,12 @@ class ServiceOrder(db.Model):
                                assigned_to], backref="assigned_service_orders")
     creator = db.relationship("User", foreign_keys=[
                               created_by], backref="created_service_orders")
+    months = db.relationship("ServiceOrderMonth", backref="order", lazy='selectin',
+                             cascade="all, delete-orphan")
+
+    def monthly_status_dict(self):
+        """Estado mensual con el formato del antiguo JSON {month_year: {...}}"""
+        return {month.month: month.serialize_status() for month in self.months}
 
     def serialize(self):
         return {
@@ -428,11 +603,70 @@ class ServiceOrder(db.Model):
             "priority": self.priority,
             "estimated_hours": self.estimated_hours,
             "hourly_rate": self.hourly_rate,
-            "monthly_status": self.monthly_status if self.monthly_status else {},
+            "monthly_status": self.monthly_status_dict(),
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "assigned_to": self.assigned_to,
             "created_by": self.created_by,
+            "branch_id": self.branch_id,
+        }
+
+
+class ServiceOrderMonth(db.Model):
+    """Estado de cumplimiento mensual de una orden de servicio"""
+    __tablename__ = 'service_order_month'
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey(
+        'service_order.id', ondelete='CASCADE'), nullable=False)
+    # formato: "2024-01"
+    month = db.Column(db.String(7), nullable=False)
+    completed = db.Column(db.Boolean(), nullable=False, default=False)
+    completed_date = db.Column(db.DateTime, nullable=True)
+    updated_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('order_id', 'month',
+                            name='uq_service_order_month_order_month'),
+        db.Index('ix_service_order_month_month_completed',
+                 'month', 'completed'),
+    )
+
+    @classmethod
+    def upsert(cls, order_id, month, completed, updated_by):
+        """Insert or update one month atomically (INSERT ... ON CONFLICT)"""
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        now = datetime.utcnow()
+        values = {
+            "completed": completed,
+            "completed_date": now if completed else None,
+            "updated_by": updated_by,
+            "updated_at": now,
+        }
+        stmt = insert(cls).values(order_id=order_id, month=month, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['order_id', 'month'], set_=values)
+        db.session.execute(stmt)
+
+    def serialize_status(self):
+        return {
+            "completed": self.completed,
+            "completed_date": self.completed_date.isoformat() if self.completed_date else None,
+            "updated_by": self.updated_by,
+        }
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "order_id": self.order_id,
+            "month": self.month,
+            **self.serialize_status(),
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
 
 
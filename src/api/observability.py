@@ -0,0 +1,204 @@
+"""
+Request and SQL instrumentation.
+
+Every request records its latency, response size and the number/duration of
+SQL statements it ran (counted through before/after_cursor_execute on each
+engine). Aggregates are exposed in Prometheus text format at /metrics and,
+unless REQUEST_LOG=0, each request is also logged to `api.requests` with
+the measurements as structured fields (see api.logging_config).
+
+Metrics are per process; with several gunicorn workers Prometheus should
+scrape each worker or the numbers be read as a sample. /metrics answers only
+with `Authorization: Bearer $METRICS_TOKEN`; without METRICS_TOKEN it is
+disabled (404).
+"""
+import hmac
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+REQUEST_LOG = os.getenv('REQUEST_LOG', '1') == '1'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+request_logger = logging.getLogger('api.requests')
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            running += count
+            yield bound, running
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {}          # (method, endpoint, status) -> count
+        self.latency = {}           # endpoint -> Histogram (seconds)
+        self.query_count = {}       # endpoint -> Histogram (statements/request)
+        self.sql_seconds = {}       # endpoint -> float
+        self.response_bytes = {}    # endpoint -> int
+
+    def record(self, method, endpoint, status, seconds, queries, sql_seconds, size):
+        with self._lock:
+            key = (method, endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.setdefault(
+                endpoint, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.query_count.setdefault(
+                endpoint, Histogram(QUERY_COUNT_BUCKETS)).observe(queries)
+            self.sql_seconds[endpoint] = self.sql_seconds.get(
+                endpoint, 0.0) + sql_seconds
+            self.response_bytes[endpoint] = self.response_bytes.get(
+                endpoint, 0) + size
+
+    def render(self, extra_gauges=None):
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines += ["# HELP http_requests_total Requests handled.",
+                      "# TYPE http_requests_total counter"]
+            for (method, endpoint, status), count in sorted(self.requests.items()):
+                lines.append(
+                    f'http_requests_total{{method="{method}",endpoint="{endpoint}",status="{status}"}} {count}')
+
+            for name, help_text, histograms in (
+                ("http_request_duration_seconds", "Request latency.", self.latency),
+                ("http_request_sql_queries", "SQL statements per request.", self.query_count),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for endpoint, hist in sorted(histograms.items()):
+                    for bound, count in hist.cumulative():
+                        lines.append(
+                            f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {hist.total}')
+                    lines.append(f'{name}_count{{endpoint="{endpoint}"}} {hist.count}')
+
+            for name, help_text, values in (
+                ("http_request_sql_seconds_total", "Time spent in SQL.", self.sql_seconds),
+                ("http_response_bytes_total", "Response body bytes.", self.response_bytes),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for endpoint, value in sorted(values.items()):
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+
+        for name, value in sorted((extra_gauges or {}).items()):
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_start')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context() and 'request_started' in g:
+        g.sql_queries = g.get('sql_queries', 0) + 1
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute no se dispara si la sentencia falla: desapilar aquí
+    conn = exception_context.connection
+    started = conn.info.get('query_start') if conn is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine):
+    """Count and time every statement run on `engine`"""
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+
+
+def _pool_gauges():
+    from api.db_config import pool_metrics
+    snapshot = pool_metrics.snapshot()
+    return {
+        "db_pool_checkouts_total": snapshot["checkouts"],
+        "db_pool_wait_seconds_total": snapshot["wait_seconds_total"],
+        "db_pool_wait_seconds_max": snapshot["wait_seconds_max"],
+        "db_pool_timeouts_total": snapshot["timeouts"],
+    }
+
+
+def setup_observability(app):
+    """Register the timing hooks and the /metrics endpoint on `app`"""
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('request_started')
+        if started is None or request.endpoint == 'metrics':
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        # Respuestas en streaming/archivo no se cargan en memoria para medirlas
+        size = response.content_length or 0
+        queries = g.get('sql_queries', 0)
+        sql_seconds = g.get('sql_seconds', 0.0)
+        request_metrics.record(request.method, endpoint, response.status_code,
+                               elapsed, queries, sql_seconds, size)
+        if REQUEST_LOG:
+            request_logger.info(
+                "%s %s %s %.1fms sql=%d/%.1fms", request.method, request.path,
+                response.status_code, elapsed * 1000, queries, sql_seconds * 1000,
+                extra={"fields": {
+                    "event": "request",
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": endpoint,
+                    "status": response.status_code,
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "sql_queries": queries,
+                    "sql_ms": round(sql_seconds * 1000, 3),
+                    "response_bytes": size,
+                }})
+        return response
+
+    @app.route('/metrics', methods=['GET'], endpoint='metrics')
+    def metrics():
+        if not METRICS_TOKEN:
+            return Response('not found\n', status=404, mimetype='text/plain')
+        if not hmac.compare_digest(request.headers.get('Authorization', ''),
+                                   f'Bearer {METRICS_TOKEN}'):
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+        return Response(request_metrics.render(_pool_gauges()),
+                        mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,104 @@
+"""
+Permission engine.
+
+Active Role rows are loaded once and each permission set is compiled into a
+frozenset, so authorization checks are a set lookup without touching the
+database. The compiled table is rebuilt after roles are created, updated or
+deleted (and at most every PERMISSIONS_CACHE_TTL seconds, so other workers
+pick up changes too).
+"""
+import os
+import threading
+import time
+
+from api.models import db, Role
+
+PERMISSIONS_CACHE_TTL = int(os.getenv('PERMISSIONS_CACHE_TTL', '300'))
+
+# Permiso comodín: concede cualquier permiso
+ALL_PERMISSIONS = '*'
+
+# Permisos de los roles fijos del sistema (User.role)
+BUILTIN_ROLE_PERMISSIONS = {
+    'super_admin': {ALL_PERMISSIONS},
+    'admin': {'admin.access', 'users.view', 'branches.view', 'roles.view'},
+    'admin_rh': {'admin.access', 'users.view', 'hr.view', 'hr.manage'},
+    'admin_finanzas': {'admin.access', 'finance.view', 'finance.manage'},
+    'usuario': set(),
+}
+
+_lock = threading.Lock()
+_compiled = {"table": None, "loaded_at": 0.0}
+
+
+def compile_permissions(permissions):
+    """Flatten a Role.permissions JSON value into a frozenset of names.
+
+    Accepts a list of names, {"name": true}, {"module": ["action", ...]} or
+    {"module": {"action": true}}; the last two become "module.action".
+    """
+    names = set()
+    if not permissions:
+        return frozenset()
+    if isinstance(permissions, (list, tuple, set)):
+        names.update(str(name) for name in permissions if name)
+        return frozenset(names)
+    if isinstance(permissions, dict):
+        for key, value in permissions.items():
+            if isinstance(value, dict):
+                names.update(f"{key}.{action}" for action,
+                             enabled in value.items() if enabled)
+            elif isinstance(value, (list, tuple)):
+                names.update(f"{key}.{action}" for action in value)
+            elif value:
+                names.add(str(key))
+    return frozenset(names)
+
+
+def _load_table():
+    table = {name: frozenset(perms)
+             for name, perms in BUILTIN_ROLE_PERMISSIONS.items()}
+    rows = db.session.execute(
+        db.select(Role.name, Role.permissions).where(Role.is_active.is_(True))
+    ).all()
+    for name, permissions in rows:
+        table[name] = table.get(name, frozenset()) | compile_permissions(permissions)
+    return table
+
+
+def get_permission_table():
+    """Return {role_name: frozenset(permissions)}, compiling it if needed"""
+    table = _compiled["table"]
+    if table is not None and time.monotonic() - _compiled["loaded_at"] <= PERMISSIONS_CACHE_TTL:
+        return table
+    with _lock:
+        table = _compiled["table"]
+        if table is None or time.monotonic() - _compiled["loaded_at"] > PERMISSIONS_CACHE_TTL:
+            try:
+                table = _load_table()
+            except Exception:
+                # Sin tabla de roles (DB sin migrar o error transitorio): la
+                # sesión queda abortada, y el respaldo no se cachea para
+                # reintentar la carga en la próxima consulta
+                db.session.rollback()
+                return {name: frozenset(perms)
+                        for name, perms in BUILTIN_ROLE_PERMISSIONS.items()}
+            _compiled["table"] = table
+            _compiled["loaded_at"] = time.monotonic()
+        return table
+
+
+def invalidate_permissions():
+    """Force a rebuild of the compiled table on the next check"""
+    with _lock:
+        _compiled["table"] = None
+
+
+def role_permissions(role_name):
+    return get_permission_table().get(role_name, frozenset())
+
+
+def has_permission(role_name, permission):
+    """O(1) check of a permission name for a role"""
+    permissions = role_permissions(role_name)
+    return ALL_PERMISSIONS in permissions or permission in permissions
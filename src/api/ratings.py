@@ -0,0 +1,273 @@
+"""
+Ticket satisfaction (1-3 star rating) analytics.
+
+ticket_rating_daily keeps one row per (day, assignee, branch) with the
+number of ratings, their sum and the count per star. An after_flush hook
+applies the delta of every rating written, changed or deleted through the
+ORM with an upsert on the flush connection, so the aggregate commits or
+rolls back together with the ticket. Reports only read that small table:
+
+- summary grouped by assignee, branch or period (day/week/month), in SQL
+- rolling-window CSAT: share of 3-star ratings over the trailing N days
+
+CSAT counts 3 stars as satisfied. rebuild_rating_aggregates() recomputes
+the table from the tickets (bulk loads bypass the hook).
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, inspect, insert, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from api.models import db, Ticket, TicketRatingDaily, User, Branch
+
+STARS = (1, 2, 3)
+SATISFIED_STARS = 3
+GROUPS = ('assignee', 'branch', 'period')
+PERIODS = ('day', 'week', 'month')
+COUNTERS = ('ratings', 'rating_sum', 'stars_1', 'stars_2', 'stars_3')
+
+_PERIOD_FORMATS = {
+    'sqlite': {'day': '%Y-%m-%d', 'week': '%Y-W%W', 'month': '%Y-%m'},
+    'postgresql': {'day': 'YYYY-MM-DD', 'week': 'IYYY-"W"IW', 'month': 'YYYY-MM'},
+}
+
+
+# --- Mantenimiento del agregado ---------------------------------------------------
+
+def _bucket(rating, rated_at, assigned_to, branch_id):
+    if rating not in STARS or rated_at is None:
+        return None
+    # True/2.0 se guardan como 1/2 en la columna entera: contarlos igual
+    return (rated_at.date(), assigned_to or 0, branch_id or 0), int(rating)
+
+
+def _previous(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None
+    return state.attrs[key].value
+
+
+def _add(deltas, bucket, sign):
+    if bucket is None:
+        return
+    key, rating = bucket
+    counters = deltas[key]
+    counters['ratings'] += sign
+    counters['rating_sum'] += sign * rating
+    counters[f'stars_{rating}'] += sign
+
+
+def _collect(session):
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for obj in session.new:
+        if isinstance(obj, Ticket):
+            _add(deltas, _bucket(obj.rating, obj.rated_at, obj.assigned_to, obj.branch_id), 1)
+    for obj in session.dirty:
+        if not isinstance(obj, Ticket):
+            continue
+        state = inspect(obj)
+        keys = ('rating', 'rated_at', 'assigned_to', 'branch_id')
+        if not any(state.attrs[key].history.has_changes() for key in keys):
+            continue
+        before = _bucket(*[_previous(state, key) for key in keys])
+        after = _bucket(obj.rating, obj.rated_at, obj.assigned_to, obj.branch_id)
+        if before != after:
+            _add(deltas, before, -1)
+            _add(deltas, after, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Ticket):
+            _add(deltas, _bucket(obj.rating, obj.rated_at, obj.assigned_to, obj.branch_id), -1)
+    return {key: counters for key, counters in deltas.items() if any(counters.values())}
+
+
+def _upsert(connection, key, counters):
+    day, assigned_to, branch_id = key
+    values = dict(day=day, assigned_to=assigned_to, branch_id=branch_id, **counters)
+    table = TicketRatingDaily.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        statement = dialect_insert(table).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=['day', 'assigned_to', 'branch_id'],
+            set_={name: table.c[name] + statement.excluded[name] for name in COUNTERS})
+        connection.execute(statement)
+        return
+    result = connection.execute(
+        update(table)
+        .where(table.c.day == day, table.c.assigned_to == assigned_to,
+               table.c.branch_id == branch_id)
+        .values({name: table.c[name] + value for name, value in counters.items()}))
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(**values))
+
+
+def _write(session, deltas):
+    if not deltas:
+        return
+    connection = session.connection()
+    for key, counters in deltas.items():
+        _upsert(connection, key, counters)
+
+
+def _apply_rating_deltas(session, flush_context):
+    _write(session, _collect(session))
+
+
+def record_rating_moves(session, moves):
+    """Changes made outside the ORM unit of work (bulk UPDATEs):
+    [((rating, rated_at, assigned_to, branch_id) before, (...) after)]"""
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for before, after in moves:
+        before, after = _bucket(*before), _bucket(*after)
+        if before != after:
+            _add(deltas, before, -1)
+            _add(deltas, after, 1)
+    _write(session, {key: counters for key, counters in deltas.items() if any(counters.values())})
+
+
+def _track_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+def setup_ratings(app):
+    """Register the aggregate hook once per process"""
+    if event.contains(Session, 'after_flush', _apply_rating_deltas):
+        return
+    # active_history: hace falta el valor anterior para restar la calificación vieja
+    for attribute in (Ticket.rating, Ticket.rated_at, Ticket.assigned_to, Ticket.branch_id):
+        event.listen(attribute, 'set', _track_old_value,
+                     active_history=True, retval=True)
+    event.listen(Session, 'after_flush', _apply_rating_deltas)
+
+
+def rebuild_rating_aggregates():
+    """Recompute ticket_rating_daily from the tickets; returns the rows written"""
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    rows = db.session.execute(
+        select(Ticket.rating, Ticket.rated_at, Ticket.assigned_to, Ticket.branch_id)
+        .where(Ticket.rating.isnot(None), Ticket.rated_at.isnot(None))
+        .execution_options(skip_branch_scope=True))
+    for row in rows:
+        _add(totals, _bucket(*row), 1)
+    db.session.execute(delete(TicketRatingDaily))
+    if totals:
+        db.session.execute(insert(TicketRatingDaily), [
+            dict(day=day, assigned_to=assigned_to, branch_id=branch_id, **counters)
+            for (day, assigned_to, branch_id), counters in totals.items()])
+    db.session.commit()
+    return len(totals)
+
+
+# --- Reportes ------------------------------------------------------------------------
+
+def _scores(ratings, rating_sum, stars):
+    return {
+        "ratings": ratings,
+        "average": round(rating_sum / ratings, 2) if ratings else None,
+        "csat_pct": round(100.0 * stars[SATISFIED_STARS - 1] / ratings, 1) if ratings else None,
+        "stars": dict(zip((str(star) for star in STARS), stars)),
+    }
+
+
+def _scope(statement, branch_id):
+    if branch_id is None:
+        return statement
+    return statement.where(TicketRatingDaily.branch_id.in_((branch_id, 0)))
+
+
+def _period_column(period):
+    formats = _PERIOD_FORMATS.get(db.engine.dialect.name)
+    if formats is None:
+        raise ValueError(f"period grouping is not supported on {db.engine.dialect.name}")
+    if db.engine.dialect.name == 'sqlite':
+        return func.strftime(formats[period], TicketRatingDaily.day)
+    return func.to_char(TicketRatingDaily.day, formats[period])
+
+
+def rating_summary(group_by='assignee', period='month', since=None, until=None, branch_id=None):
+    """Ratings, average and CSAT per assignee, branch or period"""
+    if group_by not in GROUPS:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUPS)}")
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+
+    if group_by == 'assignee':
+        key = TicketRatingDaily.assigned_to
+    elif group_by == 'branch':
+        key = TicketRatingDaily.branch_id
+    else:
+        key = _period_column(period)
+    key = key.label('bucket')
+
+    statement = select(
+        key,
+        func.sum(TicketRatingDaily.ratings),
+        func.sum(TicketRatingDaily.rating_sum),
+        *[func.sum(getattr(TicketRatingDaily, f'stars_{star}')) for star in STARS]
+    ).group_by(literal_column('bucket')).order_by(literal_column('bucket'))
+    if since:
+        statement = statement.where(TicketRatingDaily.day >= since)
+    if until:
+        statement = statement.where(TicketRatingDaily.day <= until)
+    rows = db.session.execute(_scope(statement, branch_id)).all()
+
+    names = {}
+    ids = [row[0] for row in rows if row[0]]
+    if ids and group_by == 'assignee':
+        names = dict(db.session.execute(
+            select(User.id, User.full_name).where(User.id.in_(ids))).all())
+    elif ids and group_by == 'branch':
+        names = dict(db.session.execute(
+            select(Branch.id, Branch.name).where(Branch.id.in_(ids))).all())
+
+    result = []
+    for value, ratings, rating_sum, *stars in rows:
+        item = {group_by: (value or None) if group_by != 'period' else value}
+        if group_by != 'period':
+            item["name"] = names.get(value)
+        item.update(_scores(int(ratings or 0), int(rating_sum or 0),
+                            [int(count or 0) for count in stars]))
+        result.append(item)
+    return result
+
+
+def csat_trend(window_days=30, days=90, today=None, branch_id=None):
+    """Daily CSAT over a trailing window of window_days, for the last `days` days"""
+    today = today or datetime.utcnow().date()
+    first_day = today - timedelta(days=days - 1)
+    start = first_day - timedelta(days=window_days - 1)
+
+    statement = (
+        select(TicketRatingDaily.day,
+               func.sum(TicketRatingDaily.ratings),
+               func.sum(TicketRatingDaily.rating_sum),
+               *[func.sum(getattr(TicketRatingDaily, f'stars_{star}')) for star in STARS])
+        .where(TicketRatingDaily.day >= start, TicketRatingDaily.day <= today)
+        .group_by(TicketRatingDaily.day)
+    )
+    daily = {row[0]: [int(value or 0) for value in row[1:]]
+             for row in db.session.execute(_scope(statement, branch_id))}
+
+    # Ventana deslizante sobre los días (los días sin calificaciones suman 0)
+    window = [0] * (2 + len(STARS))
+    points = []
+    current = start
+    while current <= today:
+        for index, value in enumerate(daily.get(current, ())):
+            window[index] += value
+        leaving = current - timedelta(days=window_days)
+        for index, value in enumerate(daily.get(leaving, ())):
+            window[index] -= value
+        if current >= first_day:
+            point = {"day": current.isoformat()}
+            point.update(_scores(window[0], window[1], window[2:]))
+            points.append(point)
+        current += timedelta(days=1)
+    return {"window_days": window_days, "points": points}
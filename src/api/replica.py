@@ -0,0 +1,87 @@
+"""
+Read-replica routing.
+
+When DATABASE_REPLICA_URL is set, the `replica` bind is registered and
+endpoints decorated with @read_replica run their SELECTs against it. Writes
+always go to the primary. Once a request flushes anything it becomes sticky
+to the primary for the rest of the request, and for REPLICA_STICKY_SECONDS
+afterwards (via a short-lived cookie) so the client reads its own writes.
+"""
+import os
+import time
+from functools import wraps
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = 'replica'
+STICKY_COOKIE = 'db_primary_until'
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+
+
+def replica_uri():
+    url = os.getenv('DATABASE_REPLICA_URL')
+    if url:
+        return url.replace("postgres://", "postgresql://")
+    return None
+
+
+def _reads_from_replica():
+    if not has_request_context():
+        return False
+    return g.get('use_replica', False) and not g.get('db_primary_sticky', False)
+
+
+class RoutingSession(Session):
+    """Session that sends plain SELECTs to the replica inside @read_replica views"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and _reads_from_replica()):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(f):
+    """Run the view's reads on the replica (no-op when none is configured)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _after_flush(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+        g.db_primary_sticky = True
+
+
+def setup_replica(app):
+    """Register stickiness hooks; the bind itself comes from configure_database"""
+    if not event.contains(RoutingSession, 'after_flush', _after_flush):
+        event.listen(RoutingSession, 'after_flush', _after_flush)
+
+    if not replica_uri():
+        return
+
+    @app.before_request
+    def restore_primary_stickiness():
+        try:
+            until = float(request.cookies.get(STICKY_COOKIE, 0))
+        except ValueError:
+            until = 0
+        if until > time.time():
+            g.db_primary_sticky = True
+
+    @app.after_request
+    def remember_primary_stickiness(response):
+        if g.get('db_wrote'):
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + REPLICA_STICKY_SECONDS),
+                max_age=REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+        return response
@@ -1,14 +1,21 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
-from flask import Flask, request, jsonify, url_for, Blueprint, make_response
-from api.models import db, User, Task, Ticket, CalendarEvent, Matrix, JournalEntry, PaymentReminder, ServiceOrder, MatrixHistory, SystemNotification, SystemBackup, Branch, Role
+import logging
+from flask import Flask, request, jsonify, url_for, Blueprint, make_response, g, send_file
+from api.models import db, User, Task, Ticket, CalendarEvent, Matrix, JournalEntry, PaymentReminder, ServiceOrder, ServiceOrderMonth, MatrixHistory, SystemNotification, SystemBackup, Branch, Role, ExchangeRate
 from api.utils import generate_sitemap, APIException
+from api.permissions import has_permission, invalidate_permissions
+from api.assignment import invalidate_workload
+from api.login_guard import login_guard, retry_after_header
+from api.replica import read_replica
+from api.logging_config import SAMPLED
 from flask_cors import CORS
 from datetime import datetime
 from functools import wraps
 
 api = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
 
 # Allow CORS requests to this API
 CORS(api, origins=[
@@ -45,7 +52,22 @@ def get_current_user():
 
 
 def get_current_user():
-    """Obtiene el usuario actual desde el token"""
+    """Obtiene el usuario actual desde el token (una sola vez por request)"""
+    if 'current_user' in g:
+        return g.current_user
+
+    g.current_user = _load_current_user()
+    return g.current_user
+
+
+@api.before_request
+def load_request_identity():
+    """Resuelve la identidad (y su sucursal) antes de cualquier consulta"""
+    if request.headers.get('Authorization'):
+        get_current_user()
+
+
+def _load_current_user():
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         return None
@@ -62,13 +84,14 @@ def get_current_user():
                 "id": user.id,
                 "email": user.email,
                 "name": user.name,
-                "role": user.role
+                "role": user.role,
+                "branch_id": user.branch_id
             }
     except:
         pass
 
     # Fallback si no se encuentra en la DB
-    return {"id": 1, "role": "super_admin", "name": "Super Admin User", "email": "admin"}
+    return {"id": 1, "role": "super_admin", "name": "Super Admin User", "email": "admin", "branch_id": None}
 
 
 def auth_required(f):
@@ -84,6 +107,10 @@ def auth_required(f):
 
 def role_required(allowed_roles):
     """Decorador que permite especificar múltiples roles autorizados"""
+    if isinstance(allowed_roles, str):
+        allowed_roles = [allowed_roles]
+    allowed_roles_set = frozenset(allowed_roles)
+
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
@@ -91,12 +118,7 @@ def role_required(allowed_roles):
             if not user:
                 return jsonify({"error": "Authentication required"}), 401
 
-            if isinstance(allowed_roles, str):
-                allowed_roles_list = [allowed_roles]
-            else:
-                allowed_roles_list = allowed_roles
-
-            if user['role'] not in allowed_roles_list:
+            if user['role'] not in allowed_roles_set:
                 return jsonify({"error": "Insufficient permissions"}), 403
 
             return f(*args, **kwargs)
@@ -104,34 +126,30 @@ def role_required(allowed_roles):
     return decorator
 
 
-def super_admin_required(f):
-    """Solo super_admin puede acceder"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        user = get_current_user()
-        if not user:
-            return jsonify({"error": "Authentication required"}), 401
-
-        if user['role'] != 'super_admin':
-            return jsonify({"error": "Super admin access required"}), 403
+def permission_required(permission, error="Insufficient permissions"):
+    """Decorador que verifica un permiso por nombre (ver api.permissions)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user = get_current_user()
+            if not user:
+                return jsonify({"error": "Authentication required"}), 401
 
-        return f(*args, **kwargs)
-    return decorated_function
+            if not has_permission(user['role'], permission):
+                return jsonify({"error": error}), 403
 
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
 
-def admin_or_super_required(f):
-    """admin, admin_rh, admin_finanzas o super_admin pueden acceder"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        user = get_current_user()
-        if not user:
-            return jsonify({"error": "Authentication required"}), 401
 
-        if user['role'] not in ['super_admin', 'admin', 'admin_rh', 'admin_finanzas']:
-            return jsonify({"error": "Admin access required"}), 403
+# Solo super_admin (permiso comodín) puede acceder
+super_admin_required = permission_required(
+    'system.admin', "Super admin access required")
 
-        return f(*args, **kwargs)
-    return decorated_function
+# admin, admin_rh, admin_finanzas o super_admin pueden acceder
+admin_or_super_required = permission_required(
+    'admin.access', "Admin access required")
 
 
 # Mantener admin_required para compatibilidad con código existente
@@ -230,33 +248,81 @@ def delete_task(task_id):
 
 
 @api.route('/tickets', methods=['GET'])
+@read_replica
 def get_tickets():
+    """List tickets; see api.ticket_query for filters, sort and fields="""
     try:
-        tickets = Ticket.query.all()
+        from api.ticket_query import has_query_params, build_ticket_query, serialize_row
+
+        if not has_query_params(request.args):
+            tickets = Ticket.query.all()
+            return jsonify([ticket.serialize() for ticket in tickets]), 200
+
+        try:
+            statement, fields = build_ticket_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if fields:
+            rows = db.session.execute(statement).all()
+            return jsonify([serialize_row(row, fields) for row in rows]), 200
+        tickets = db.session.execute(statement).scalars().all()
         return jsonify([ticket.serialize() for ticket in tickets]), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _index_new_ticket(ticket, find_duplicates=True):
+    """Add a just-created ticket to the index; returns its likely duplicates
+    (found before indexing it) or None when find_duplicates is False"""
+    try:
+        from api.similarity import similar_tickets, index_ticket
+        duplicates = None
+        if find_duplicates:
+            duplicates = similar_tickets(ticket.title, ticket.description,
+                                         exclude_id=ticket.id, limit=5)
+        index_ticket(ticket)
+        return duplicates
+    except Exception:
+        # El ticket ya está guardado: el índice se pone al día en la próxima consulta
+        logger.warning("Similarity index update failed for ticket %s",
+                       ticket.id, exc_info=True)
+        return [] if find_duplicates else None
+
+
 @api.route('/tickets', methods=['POST'])
 def create_ticket():
     try:
+        from api.assignment import auto_assign, STRATEGIES
         data = request.get_json()
 
+        strategy = data.get('assignment_strategy')
+        if strategy is not None and strategy not in STRATEGIES:
+            return jsonify({"error": f"assignment_strategy must be one of: {', '.join(STRATEGIES)}"}), 400
+
         new_ticket = Ticket(
             title=data.get('title'),
             description=data.get('description', ''),
             status=data.get('status', 'open'),
             priority=data.get('priority', 'medium'),
+            category=data.get('category'),
             assigned_to=data.get('assigned_to'),
             requester_name=data.get('requester_name'),
             requester_email=data.get('requester_email')
         )
+        # Sin técnico indicado: asignar según carga/sucursal/categoría
+        auto_assign(new_ticket, strategy)
 
         db.session.add(new_ticket)
         db.session.commit()
 
-        return jsonify(new_ticket.serialize()), 201
+        result = new_ticket.serialize()
+        # POST /tickets es público: solo usuarios autenticados ven posibles
+        # duplicados, acotados a su sucursal por api.tenancy
+        duplicates = _index_new_ticket(new_ticket, find_duplicates=get_current_user() is not None)
+        if duplicates is not None:
+            result["possible_duplicates"] = duplicates
+        return jsonify(result), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -277,12 +343,22 @@ def update_ticket(ticket_id):
             ticket.status = data['status']
         if 'priority' in data:
             ticket.priority = data['priority']
+        if 'category' in data:
+            ticket.category = data['category']
         if 'assigned_to' in data:
             ticket.assigned_to = data['assigned_to']
 
         ticket.updated_at = datetime.utcnow()
         db.session.commit()
 
+        if 'title' in data or 'description' in data:
+            try:
+                from api.similarity import index_ticket
+                index_ticket(ticket)
+            except Exception:
+                logger.warning("Similarity index update failed for ticket %s",
+                               ticket.id, exc_info=True)
+
         return jsonify(ticket.serialize()), 200
     except Exception as e:
         db.session.rollback()
@@ -302,6 +378,59 @@ def delete_ticket(ticket_id):
         return jsonify({"error": str(e)}), 500
 
 
+@api.route('/tickets/bulk', methods=['POST'])
+@admin_required
+def bulk_update_tickets():
+    """Change status/priority/assignee of many tickets in one transaction.
+
+    {"ids": [..]} or {"filter": {...}}, "changes": {...}, "dry_run": false;
+    see api.ticket_bulk.
+    """
+    try:
+        from api.ticket_bulk import bulk_update_tickets as apply_bulk_update
+        data = request.get_json() or {}
+        try:
+            result = apply_bulk_update(
+                ids=data.get('ids'),
+                filters=data.get('filter'),
+                changes=data.get('changes'),
+                changed_by=get_current_user()['id'],
+                dry_run=bool(data.get('dry_run', False)))
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({"error": str(e)}), 400
+        if result['dry_run']:
+            db.session.rollback()
+        else:
+            db.session.commit()
+        return jsonify(result), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/tickets/<int:ticket_id>/similar', methods=['GET'])
+@admin_required
+@read_replica
+def get_similar_tickets(ticket_id):
+    """Likely duplicates of a ticket from the MinHash/LSH index.
+
+    ?limit=10&threshold=0.5
+    """
+    try:
+        from api.similarity import similar_tickets, SIMILARITY_THRESHOLD
+        ticket = Ticket.query.get_or_404(ticket_id)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        threshold = request.args.get('threshold', SIMILARITY_THRESHOLD, type=float)
+        if not 0 < threshold <= 1:
+            return jsonify({"error": "threshold must be in (0, 1]"}), 400
+        return jsonify(similar_tickets(ticket.title, ticket.description,
+                                       exclude_id=ticket.id, threshold=threshold,
+                                       limit=limit)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @api.route('/tickets/<int:ticket_id>/rate', methods=['POST'])
 @admin_required
 def rate_ticket(ticket_id):
@@ -322,7 +451,8 @@ def rate_ticket(ticket_id):
 
         # Validar calificación
         rating = data.get('rating')
-        if not rating or rating not in [1, 2, 3]:
+        # true y 2.0 pasan `in [1, 2, 3]`: exigir un entero que no sea bool
+        if isinstance(rating, bool) or not isinstance(rating, int) or rating not in [1, 2, 3]:
             return jsonify({"error": "La calificación debe ser 1, 2 o 3 estrellas"}), 400
 
         # Actualizar calificación
@@ -331,9 +461,8 @@ def rate_ticket(ticket_id):
         ticket.rated_at = datetime.utcnow()
         ticket.rated_by = current_user['id']
 
-        db.session.commit()
-
-        # Crear notificación para el super admin
+        # Notificación para el super admin en la misma transacción
+        # (el agregado diario se actualiza en el flush, ver api.ratings)
         notification = SystemNotification(
             user_id=1,  # Super admin
             title=f"Ticket Calificado: {ticket.title}",
@@ -353,22 +482,218 @@ def rate_ticket(ticket_id):
         return jsonify({"error": str(e)}), 500
 
 
+# SLA ROUTES
+
+@api.route('/tickets/sla/dashboard', methods=['GET'])
+@admin_or_super_required
+@read_replica
+def get_sla_dashboard():
+    """SLA compliance, breached open tickets and tickets about to breach.
+
+    ?days=30&at_risk_minutes=60
+    """
+    try:
+        from api.sla import sla_dashboard
+        days = min(max(request.args.get('days', 30, type=int), 1), 365)
+        at_risk_minutes = max(request.args.get('at_risk_minutes', 60, type=int), 1)
+        return jsonify(sla_dashboard(days=days, at_risk_minutes=at_risk_minutes)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/sla-policies', methods=['GET'])
+@admin_or_super_required
+def get_sla_policies():
+    """Configured SLA policies plus the built-in defaults"""
+    try:
+        from api.models import SLAPolicy
+        from api.sla import DEFAULT_POLICIES
+        policies = SLAPolicy.query.order_by(
+            SLAPolicy.priority, SLAPolicy.branch_id).all()
+        return jsonify({
+            "policies": [policy.serialize() for policy in policies],
+            "defaults": {priority: {"response_minutes": response, "resolution_minutes": resolution}
+                         for priority, (response, resolution) in DEFAULT_POLICIES.items()}
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/sla-policies', methods=['POST'])
+@super_admin_required
+def upsert_sla_policy():
+    """Create or update the policy for a priority (and optional branch).
+
+    Only applies to tickets created or re-prioritized afterwards.
+    """
+    try:
+        from api.models import SLAPolicy
+        from api.sla import DEFAULT_POLICIES, invalidate_policies
+        data = request.get_json() or {}
+
+        priority = data.get('priority')
+        if priority not in DEFAULT_POLICIES:
+            return jsonify({"error": f"priority must be one of: {', '.join(DEFAULT_POLICIES)}"}), 400
+        try:
+            response_minutes = int(data.get('response_minutes'))
+            resolution_minutes = int(data.get('resolution_minutes'))
+        except (TypeError, ValueError):
+            return jsonify({"error": "response_minutes and resolution_minutes are required integers"}), 400
+        if response_minutes <= 0 or resolution_minutes < response_minutes:
+            return jsonify({"error": "resolution_minutes must be >= response_minutes > 0"}), 400
+        branch_id = data.get('branch_id')
+        if branch_id is not None and not db.session.get(Branch, branch_id):
+            return jsonify({"error": "Branch not found"}), 404
+
+        # branch_id NULL no cuenta para el UNIQUE: buscar explícitamente
+        branch_filter = (SLAPolicy.branch_id.is_(None) if branch_id is None
+                         else SLAPolicy.branch_id == branch_id)
+        policy = SLAPolicy.query.filter(
+            SLAPolicy.priority == priority, branch_filter).first()
+        created = policy is None
+        if created:
+            policy = SLAPolicy(priority=priority, branch_id=branch_id)
+            db.session.add(policy)
+        policy.response_minutes = response_minutes
+        policy.resolution_minutes = resolution_minutes
+        policy.is_active = bool(data.get('is_active', True))
+        db.session.commit()
+        invalidate_policies()
+
+        return jsonify(policy.serialize()), 201 if created else 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/sla-policies/<int:policy_id>', methods=['DELETE'])
+@super_admin_required
+def delete_sla_policy(policy_id):
+    """Delete a policy; its priority falls back to the branch-wide or default one"""
+    try:
+        from api.models import SLAPolicy
+        from api.sla import invalidate_policies
+        policy = SLAPolicy.query.get_or_404(policy_id)
+        db.session.delete(policy)
+        db.session.commit()
+        invalidate_policies()
+        return jsonify({"message": "SLA policy deleted successfully"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+# TICKET HISTORY ROUTES
+
+@api.route('/tickets/<int:ticket_id>/history', methods=['GET'])
+@admin_required
+@read_replica
+def get_ticket_history(ticket_id):
+    """Status, priority and assignment events of a ticket, oldest first"""
+    try:
+        from api.ticket_history import ticket_history
+        Ticket.query.get_or_404(ticket_id)
+        return jsonify(ticket_history(ticket_id)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/tickets/analytics', methods=['GET'])
+@admin_or_super_required
+@read_replica
+def get_ticket_analytics():
+    """Time to first response / resolve and time in state, cached per day.
+
+    ?months=12&refresh=1
+    """
+    try:
+        from api.ticket_history import ticket_analytics
+        from api.tenancy import current_branch_id
+        months = min(max(request.args.get('months', 12, type=int), 1), 36)
+        refresh = request.args.get('refresh') == '1'
+        return jsonify(ticket_analytics(months, current_branch_id(), refresh)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# TICKET ASSIGNMENT ROUTES
+
+@api.route('/tickets/workload', methods=['GET'])
+@admin_or_super_required
+def get_ticket_workload():
+    """Open tickets and priority-weighted load per technician (in memory).
+
+    ?rebuild=1 reloads it from the database first.
+    """
+    try:
+        from api.assignment import workload, PRIORITY_WEIGHTS, ASSIGNMENT_STRATEGY
+        if request.args.get('rebuild') == '1':
+            workload.rebuild()
+        return jsonify({
+            "strategy": ASSIGNMENT_STRATEGY,
+            "priority_weights": PRIORITY_WEIGHTS,
+            "technicians": workload.snapshot()
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# TICKET RATING ANALYTICS ROUTES
+
+@api.route('/tickets/ratings/summary', methods=['GET'])
+@admin_or_super_required
+@read_replica
+def get_rating_summary():
+    """Ratings, average stars and CSAT from the daily aggregate.
+
+    ?group_by=assignee|branch|period&period=day|week|month&from=2025-01-01&to=2025-03-31
+    """
+    try:
+        from api.ratings import rating_summary
+        from api.tenancy import current_branch_id
+        try:
+            since = datetime.fromisoformat(request.args['from']).date() if request.args.get('from') else None
+            until = datetime.fromisoformat(request.args['to']).date() if request.args.get('to') else None
+            rows = rating_summary(request.args.get('group_by', 'assignee'),
+                                  request.args.get('period', 'month'),
+                                  since, until, current_branch_id())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(rows), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/tickets/ratings/csat', methods=['GET'])
+@admin_or_super_required
+@read_replica
+def get_csat_trend():
+    """Rolling-window CSAT (share of 3-star ratings) per day.
+
+    ?window=30&days=90
+    """
+    try:
+        from api.ratings import csat_trend
+        from api.tenancy import current_branch_id
+        window = min(max(request.args.get('window', 30, type=int), 1), 365)
+        days = min(max(request.args.get('days', 90, type=int), 1), 730)
+        return jsonify(csat_trend(window, days, branch_id=current_branch_id())), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # CALENDAR EVENT ROUTES
 
 
 @api.route('/calendar-events', methods=['GET'])
 def get_calendar_events():
     try:
-        print("🔍 Getting calendar events...")
         events = CalendarEvent.query.all()
-        print(f"🔍 Found {len(events)} events")
+        logger.debug("Found %d calendar events", len(events), extra=SAMPLED)
         result = [event.serialize() for event in events]
-        print(f"🔍 Serialized events: {result}")
         return jsonify(result), 200
     except Exception as e:
-        print(f"❌ Error in get_calendar_events: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_calendar_events: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -430,9 +755,7 @@ def create_calendar_event():
         return jsonify(new_event.serialize()), 201
     except Exception as e:
         db.session.rollback()
-        print(f"Error creating calendar event: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creating calendar event: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -852,12 +1175,26 @@ def admin_login():
         if not username or not password:
             return jsonify({"error": "Nombre de usuario y contraseña requeridos"}), 400
 
+        # Limitar intentos antes de calcular cualquier hash
+        wait = login_guard.check(username, login_guard.client_ip(request))
+        if wait:
+            response = jsonify(
+                {"error": "Demasiados intentos, intenta más tarde"})
+            response.headers['Retry-After'] = retry_after_header(wait)
+            return response, 429
+
         # Check if user exists in database by username
         user = User.query.filter_by(username=username).first()
 
         if user and user.is_active:
             # Check password using hash
             if user.check_password(password):
+                login_guard.record_success(username)
+
+                # Actualizar el hash si cambiaron los parámetros configurados
+                if user.password_needs_rehash():
+                    user.set_password(password)
+
                 # Update last login
                 user.last_login = datetime.utcnow()
                 db.session.commit()
@@ -879,6 +1216,7 @@ def admin_login():
 
         # Fallback to hardcoded credentials for super admin
         if username == "admin" and password == "admin123":
+            login_guard.record_success(username)
             # Verificar si existe en la base de datos
             db_user = User.query.filter_by(email="admin").first()
             if db_user:
@@ -908,6 +1246,7 @@ def admin_login():
                     "expires_in": 3600
                 }), 200
 
+        login_guard.record_failure(username)
         return jsonify({"error": "Invalid credentials"}), 401
 
     except Exception as e:
@@ -1085,10 +1424,50 @@ def get_storage_info():
         }), 200
 
 
+@api.route('/system/db-pool', methods=['GET'])
+@super_admin_required
+def get_db_pool_metrics():
+    """Connection pool checkout wait times and exhaustion counters"""
+    try:
+        from api.db_config import pool_metrics
+        return jsonify(pool_metrics.snapshot(db.engine)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/system/slow-queries', methods=['GET'])
+@super_admin_required
+def get_slow_queries():
+    """Most recent slow statements with their route, caller and query plan"""
+    try:
+        from api.slow_queries import slow_query_log, SLOW_QUERY_MS
+        limit = request.args.get('limit', type=int)
+        return jsonify({
+            "threshold_ms": SLOW_QUERY_MS,
+            "recorded": slow_query_log.recorded,
+            "queries": slow_query_log.entries(limit)
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/system/slow-queries', methods=['DELETE'])
+@super_admin_required
+def clear_slow_queries():
+    """Empty the slow query buffer and plan cache"""
+    try:
+        from api.slow_queries import slow_query_log
+        slow_query_log.clear()
+        return jsonify({"message": "Slow query log cleared"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # JOURNAL/LOGBOOK ROUTES
 
 @api.route('/journal', methods=['GET'])
 @admin_required
+@read_replica
 def get_journal_entries():
     """Get all journal entries for the authenticated user"""
     try:
@@ -1231,6 +1610,7 @@ def delete_journal_entry(entry_id):
 
 @api.route('/journal/stats', methods=['GET'])
 @admin_required
+@read_replica
 def get_journal_stats():
     """Get journal statistics"""
     try:
@@ -1278,28 +1658,26 @@ def get_journal_stats():
 
 @api.route('/tickets/export/pdf', methods=['GET'])
 @admin_required
+@read_replica
 def export_tickets_pdf():
     """Export tickets to PDF"""
     try:
-        from api.export_utils import export_manager
-
-        tickets = Ticket.query.all()
-        tickets_data = [ticket.serialize() for ticket in tickets]
+        from api.export_utils import export_manager, ticket_export_source
 
-        pdf_buffer = export_manager.export_tickets_pdf(tickets_data)
+        # Filas leídas por lotes; el PDF se arma en un archivo temporal
+        rows, summary = ticket_export_source(Ticket.query)
+        pdf_file = export_manager.export_tickets_pdf(rows, summary=summary)
 
-        response = make_response(pdf_buffer.getvalue())
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers[
-            'Content-Disposition'] = f'attachment; filename=tickets_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-
-        return response
+        return send_file(
+            pdf_file, mimetype='application/pdf', as_attachment=True,
+            download_name=f'tickets_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @api.route('/tickets/export/excel', methods=['GET'])
 @admin_required
+@read_replica
 def export_tickets_excel():
     """Export tickets to Excel"""
     try:
@@ -1322,6 +1700,7 @@ def export_tickets_excel():
 
 @api.route('/matrices/export/pdf', methods=['GET'])
 @admin_required
+@read_replica
 def export_matrices_pdf():
     """Export matrices to PDF"""
     try:
@@ -1337,23 +1716,13 @@ def export_matrices_pdf():
         if not matrices_data:
             return jsonify({"error": "No matrices found to export"}), 404
 
-        pdf_buffer = export_manager.export_matrices_pdf(matrices_data)
-
-        response = make_response(pdf_buffer.getvalue())
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers[
-            'Content-Disposition'] = f'attachment; filename=matrices_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+        pdf_file = export_manager.export_matrices_pdf(matrices_data)
 
-        return response
+        return send_file(
+            pdf_file, mimetype='application/pdf', as_attachment=True,
+            download_name=f'matrices_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf')
     except Exception as e:
-        # Better error logging
-        import traceback
-        error_details = {
-            "error": str(e),
-            "type": type(e).__name__,
-            "traceback": traceback.format_exc()
-        }
-        print(f"PDF Export Error: {error_details}")  # For server logs
+        logger.exception("PDF export failed: %s", e)
         return jsonify({"error": f"Export failed: {str(e)}"}), 500
 
 
@@ -1389,6 +1758,7 @@ def export_health_check():
 
 @api.route('/matrices/export/excel', methods=['GET'])
 @admin_required
+@read_replica
 def export_matrices_excel():
     """Export matrices to Excel"""
     try:
@@ -1413,88 +1783,58 @@ def export_matrices_excel():
 
         return response
     except Exception as e:
-        # Better error logging
-        import traceback
-        error_details = {
-            "error": str(e),
-            "type": type(e).__name__,
-            "traceback": traceback.format_exc()
-        }
-        print(f"Excel Export Error: {error_details}")  # For server logs
+        logger.exception("Excel export failed: %s", e)
         return jsonify({"error": f"Export failed: {str(e)}"}), 500
 
 
+def _journal_export_query():
+    """JournalEntry query filtered by date_from, date_to, category and status"""
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    category = request.args.get('category')
+    status = request.args.get('status')
+
+    query = JournalEntry.query
+    if date_from:
+        query = query.filter(JournalEntry.entry_date >=
+                             datetime.fromisoformat(date_from))
+    if date_to:
+        query = query.filter(JournalEntry.entry_date <=
+                             datetime.fromisoformat(date_to))
+    if category:
+        query = query.filter(JournalEntry.category == category)
+    if status:
+        query = query.filter(JournalEntry.status == status)
+    return query
+
+
 @api.route('/journal/export/pdf', methods=['GET'])
 @admin_required
+@read_replica
 def export_journal_pdf():
     """Export journal entries to PDF"""
     try:
-        from api.export_utils import export_manager
-
-        # Get query parameters for filtering
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-        category = request.args.get('category')
-        status = request.args.get('status')
-
-        # Base query
-        query = JournalEntry.query
-
-        # Apply filters
-        if date_from:
-            query = query.filter(JournalEntry.entry_date >=
-                                 datetime.fromisoformat(date_from))
-        if date_to:
-            query = query.filter(JournalEntry.entry_date <=
-                                 datetime.fromisoformat(date_to))
-        if category:
-            query = query.filter(JournalEntry.category == category)
-        if status:
-            query = query.filter(JournalEntry.status == status)
+        from api.export_utils import export_manager, journal_export_source
 
-        journal_entries = query.order_by(JournalEntry.entry_date.desc()).all()
-        journal_data = [entry.serialize() for entry in journal_entries]
+        rows, summary = journal_export_source(_journal_export_query())
+        pdf_file = export_manager.export_journal_pdf(rows, summary=summary)
 
-        pdf_buffer = export_manager.export_journal_pdf(journal_data)
-
-        response = make_response(pdf_buffer.getvalue())
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers[
-            'Content-Disposition'] = f'attachment; filename=journal_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-
-        return response
+        return send_file(
+            pdf_file, mimetype='application/pdf', as_attachment=True,
+            download_name=f'journal_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @api.route('/journal/export/excel', methods=['GET'])
 @admin_required
+@read_replica
 def export_journal_excel():
     """Export journal entries to Excel"""
     try:
         from api.export_utils import export_manager
 
-        # Get query parameters for filtering
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-        category = request.args.get('category')
-        status = request.args.get('status')
-
-        # Base query
-        query = JournalEntry.query
-
-        # Apply filters
-        if date_from:
-            query = query.filter(JournalEntry.entry_date >=
-                                 datetime.fromisoformat(date_from))
-        if date_to:
-            query = query.filter(JournalEntry.entry_date <=
-                                 datetime.fromisoformat(date_to))
-        if category:
-            query = query.filter(JournalEntry.category == category)
-        if status:
-            query = query.filter(JournalEntry.status == status)
-
+        query = _journal_export_query()
         journal_entries = query.order_by(JournalEntry.entry_date.desc()).all()
         journal_data = [entry.serialize() for entry in journal_entries]
 
@@ -1598,6 +1938,10 @@ def create_user():
         if role not in valid_roles:
             return jsonify({"error": f"Rol inválido. Roles disponibles: {', '.join(valid_roles)}"}), 400
 
+        skills = data.get('skills')
+        if skills is not None and not isinstance(skills, list):
+            return jsonify({"error": "skills debe ser una lista"}), 400
+
         # Create new user with password hashing
         user = User(
             username=data['username'],
@@ -1605,12 +1949,14 @@ def create_user():
             email=email,  # Ya será None si estaba vacío
             name=data.get('full_name', ''),  # Campo legacy
             role=role,
-            is_active=data.get('is_active', True)
+            is_active=data.get('is_active', True),
+            skills=[str(skill) for skill in skills] if skills else None
         )
         user.set_password(data['password'])
 
         db.session.add(user)
         db.session.commit()
+        invalidate_workload()
 
         return jsonify({
             "message": "Usuario creado exitosamente",
@@ -1642,10 +1988,15 @@ def update_user(user_id):
             user.role = data['role']
         if 'is_active' in data:
             user.is_active = data['is_active']
+        if 'skills' in data:
+            if not isinstance(data['skills'], list):
+                return jsonify({"error": "skills debe ser una lista"}), 400
+            user.skills = [str(skill) for skill in data['skills']]
         if 'password' in data and data['password']:
             user.set_password(data['password'])
 
         db.session.commit()
+        invalidate_workload()
 
         return jsonify({
             "message": "Usuario actualizado exitosamente",
@@ -1669,6 +2020,7 @@ def delete_user(user_id):
 
         db.session.delete(user)
         db.session.commit()
+        invalidate_workload()
 
         return jsonify({"message": "Usuario eliminado exitosamente"}), 200
     except Exception as e:
@@ -1869,6 +2221,85 @@ def get_upcoming_payments():
         return jsonify({"error": str(e)}), 500
 
 
+# FINANCE ROUTES
+
+@api.route('/finance/summary', methods=['GET'])
+@admin_required
+def get_finance_summary():
+    """Totals per currency, month and status plus projected liabilities"""
+    try:
+        from api.finance import finance_summary
+
+        current_user = get_current_user()
+        base = request.args.get('base')
+        months = min(max(request.args.get('months', 12, type=int), 1), 60)
+
+        # Finanzas y administradores ven todo, el resto solo lo suyo
+        user_id = None
+        if current_user['role'] not in ['super_admin', 'admin', 'admin_finanzas']:
+            user_id = current_user['id']
+
+        return jsonify(finance_summary(base=base, months=months, user_id=user_id)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/finance/exchange-rates', methods=['GET'])
+@admin_required
+def get_exchange_rates():
+    """List locally stored exchange rates"""
+    try:
+        rates = ExchangeRate.query.order_by(ExchangeRate.currency).all()
+        return jsonify([rate.serialize() for rate in rates]), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/finance/exchange-rates', methods=['PUT'])
+@permission_required('finance.manage')
+def upsert_exchange_rates():
+    """Create or update exchange rates: {"rates": {"MXN": 0.055, ...}}"""
+    try:
+        from api.finance import invalidate_exchange_rates
+
+        data = request.get_json()
+        rates = data.get('rates') if data else None
+        if not rates or not isinstance(rates, dict):
+            return jsonify({"error": "rates es requerido"}), 400
+
+        existing = {
+            rate.currency: rate
+            for rate in ExchangeRate.query.filter(
+                ExchangeRate.currency.in_([c.upper() for c in rates])).all()
+        }
+        parsed = {}
+        for currency, value in rates.items():
+            currency = currency.upper()
+            try:
+                rate = None if isinstance(value, bool) else float(value)
+            except (TypeError, ValueError):
+                rate = None
+            # Rechaza texto, booleanos, <= 0, NaN e infinito
+            if rate is None or not 0 < rate < float('inf'):
+                return jsonify({"error": f"Tipo de cambio inválido para {currency}"}), 400
+            parsed[currency] = rate
+
+        for currency, value in parsed.items():
+            if currency in existing:
+                existing[currency].rate = value
+            else:
+                db.session.add(ExchangeRate(currency=currency, rate=value))
+
+        db.session.commit()
+        invalidate_exchange_rates()
+
+        updated = ExchangeRate.query.order_by(ExchangeRate.currency).all()
+        return jsonify([rate.serialize() for rate in updated]), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
 # SERVICE ORDER ROUTES
 
 @api.route('/service-orders', methods=['GET'])
@@ -1961,23 +2392,207 @@ def update_monthly_status(order_id):
         if not month_year:
             return jsonify({"error": "month_year es requerido"}), 400
 
-        monthly_status = order.monthly_status or {}
-        monthly_status[month_year] = {
-            'completed': completed,
-            'completed_date': datetime.utcnow().isoformat() if completed else None,
-            'updated_by': current_user['id']
-        }
+        try:
+            datetime.strptime(month_year, '%Y-%m')
+        except ValueError:
+            return jsonify({"error": "month_year debe tener formato YYYY-MM"}), 400
 
-        order.monthly_status = monthly_status
+        # Upsert de una sola fila: no pisa los cambios concurrentes de otros meses
+        ServiceOrderMonth.upsert(
+            order.id, month_year, bool(completed), current_user['id'])
         order.updated_at = datetime.utcnow()
         db.session.commit()
 
+        db.session.expire(order, ['months'])
         return jsonify(order.serialize()), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 
+@api.route('/service-orders/incomplete', methods=['GET'])
+@admin_required
+def get_incomplete_service_orders():
+    """Service orders not completed for a month (?month=2024-05)"""
+    try:
+        month_year = request.args.get('month')
+        if not month_year:
+            return jsonify({"error": "month es requerido"}), 400
+
+        try:
+            datetime.strptime(month_year, '%Y-%m')
+        except ValueError:
+            return jsonify({"error": "month debe tener formato YYYY-MM"}), 400
+
+        orders = ServiceOrder.query.outerjoin(
+            ServiceOrderMonth,
+            db.and_(
+                ServiceOrderMonth.order_id == ServiceOrder.id,
+                ServiceOrderMonth.month == month_year
+            )
+        ).filter(
+            ServiceOrder.status.notin_(['completed', 'cancelled']),
+            db.or_(
+                ServiceOrderMonth.id.is_(None),
+                ServiceOrderMonth.completed.is_(False)
+            )
+        ).all()
+
+        return jsonify([order.serialize() for order in orders]), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route('/service-orders/compliance', methods=['GET'])
+@admin_required
+def get_service_order_compliance():
+    """Orders x months completion grid encoded as bitmasks.
+
+    Query params: from / to (YYYY-MM, max 48 months), branch_id, assigned_to.
+    Bit i of completed[n] is set when order_ids[n] was completed in months[i].
+    """
+    try:
+        current_user = get_current_user()
+        today = datetime.utcnow()
+        month_from = request.args.get('from', f"{today.year:04d}-01")
+        month_to = request.args.get('to', f"{today.year:04d}-12")
+
+        try:
+            start = datetime.strptime(month_from, '%Y-%m')
+            end = datetime.strptime(month_to, '%Y-%m')
+        except ValueError:
+            return jsonify({"error": "from y to deben tener formato YYYY-MM"}), 400
+
+        span = (end.year - start.year) * 12 + end.month - start.month + 1
+        if span < 1 or span > 48:
+            return jsonify({"error": "El rango debe ser de 1 a 48 meses"}), 400
+
+        months = []
+        year, month = start.year, start.month
+        for _ in range(span):
+            months.append(f"{year:04d}-{month:02d}")
+            month += 1
+            if month > 12:
+                year, month = year + 1, 1
+
+        # Una fila por orden: la máscara se suma en SQL (order_id, month es único)
+        month_bit = db.case(
+            {key: 1 << i for i, key in enumerate(months)},
+            value=ServiceOrderMonth.month, else_=0)
+        query = db.session.query(
+            ServiceOrder.id,
+            ServiceOrder.title,
+            ServiceOrder.client_name,
+            ServiceOrder.assigned_to,
+            db.func.coalesce(db.func.sum(month_bit), 0)
+        ).outerjoin(
+            ServiceOrderMonth,
+            db.and_(
+                ServiceOrderMonth.order_id == ServiceOrder.id,
+                ServiceOrderMonth.completed.is_(True),
+                ServiceOrderMonth.month >= months[0],
+                ServiceOrderMonth.month <= months[-1]
+            )
+        )
+
+        assigned_to = request.args.get('assigned_to', type=int)
+        if assigned_to:
+            query = query.filter(ServiceOrder.assigned_to == assigned_to)
+
+        branch_id = request.args.get('branch_id', type=int)
+        if branch_id:
+            query = query.join(User, User.id == ServiceOrder.assigned_to)\
+                .filter(User.branch_id == branch_id)
+
+        # Usuario normal solo ve las órdenes asignadas a él o creadas por él
+        if current_user['role'] not in ['super_admin', 'admin']:
+            query = query.filter(
+                db.or_(
+                    ServiceOrder.assigned_to == current_user['id'],
+                    ServiceOrder.created_by == current_user['id']
+                )
+            )
+
+        query = query.group_by(
+            ServiceOrder.id, ServiceOrder.title, ServiceOrder.client_name,
+            ServiceOrder.assigned_to).order_by(ServiceOrder.id)
+
+        order_ids = []
+        titles = []
+        clients = []
+        assignees = []
+        completed = []
+        for order_id, title, client_name, assignee, bits in query:
+            order_ids.append(order_id)
+            titles.append(title)
+            clients.append(client_name)
+            assignees.append(assignee)
+            completed.append(int(bits))
+
+        month_totals = [
+            sum(1 for bits in completed if bits >> i & 1)
+            for i in range(span)
+        ]
+
+        return jsonify({
+            "months": months,
+            "order_ids": order_ids,
+            "titles": titles,
+            "client_names": clients,
+            "assigned_to": assignees,
+            "completed": completed,
+            "month_totals": month_totals
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# SEARCH ROUTES
+
+@api.route('/search', methods=['GET'])
+@admin_required
+@read_replica
+def search_records():
+    """Full-text search over tickets, journal entries and service orders.
+
+    ?q=texto&types=tickets,journal,service_orders&limit=20
+    """
+    try:
+        from api.search import search, SEARCH_TARGETS
+        import time
+
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"error": "q is required"}), 400
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        types = [t for t in request.args.get(
+            'types', ','.join(SEARCH_TARGETS)).split(',') if t]
+        unknown = [t for t in types if t not in SEARCH_TARGETS]
+        if unknown:
+            return jsonify({"error": f"Unknown types: {', '.join(unknown)}"}), 400
+
+        current_user = get_current_user()
+        started = time.perf_counter()
+        results = {}
+        for kind in types:
+            extra_filter = None
+            if kind == 'service_orders' and current_user['role'] not in ('super_admin', 'admin'):
+                # Misma visibilidad que get_service_orders
+                extra_filter = db.or_(
+                    ServiceOrder.assigned_to == current_user['id'],
+                    ServiceOrder.created_by == current_user['id']
+                )
+            results[kind] = search(kind, query, limit, extra_filter)
+
+        return jsonify({
+            "query": query,
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2)
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # NOTIFICATION ROUTES
 
 @api.route('/notifications', methods=['GET'])
@@ -2469,6 +3084,7 @@ def create_role():
 
         db.session.add(role)
         db.session.commit()
+        invalidate_permissions()
 
         return jsonify(role.serialize()), 201
     except Exception as e:
@@ -2490,6 +3106,7 @@ def update_role(role_id):
         role.permissions = data.get('permissions', role.permissions)
 
         db.session.commit()
+        invalidate_permissions()
         return jsonify(role.serialize()), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -2509,6 +3126,7 @@ def delete_role(role_id):
 
         role.is_active = False
         db.session.commit()
+        invalidate_permissions()
 
         return jsonify({"message": "Rol eliminado"}), 200
     except Exception as e:
@@ -2524,14 +3142,12 @@ def get_hr_employees():
 
         # Si es admin_rh, solo puede ver empleados de su sucursal
         if current_user['role'] == 'admin_rh':
-            # Obtener la sucursal del usuario RH
-            user_obj = User.query.get(current_user['id'])
-            if not user_obj or not user_obj.branch_id:
+            if not current_user.get('branch_id'):
                 return jsonify({"error": "Usuario RH sin sucursal asignada"}), 400
 
             employees = User.query.filter_by(
                 is_operativo=True,
-                branch_id=user_obj.branch_id,
+                branch_id=current_user['branch_id'],
                 is_active=True
             ).all()
         else:
@@ -2560,8 +3176,7 @@ def create_hr_employee():
         # Si es admin_rh, asignar a su sucursal automáticamente
         branch_id = data.get('branch_id')
         if current_user['role'] == 'admin_rh':
-            user_obj = User.query.get(current_user['id'])
-            branch_id = user_obj.branch_id if user_obj else None
+            branch_id = current_user.get('branch_id')
 
         from datetime import datetime
 
@@ -2609,12 +3224,11 @@ def get_users_with_filter():
 
         # Si es admin_rh, solo puede ver personal operativo de su sucursal y otros admin_rh
         if current_user['role'] == 'admin_rh':
-            user_obj = User.query.get(current_user['id'])
-            if user_obj and user_obj.branch_id:
+            if current_user.get('branch_id'):
                 query = query.filter(
                     db.or_(
                         db.and_(User.is_operativo == True,
-                                User.branch_id == user_obj.branch_id),
+                                User.branch_id == current_user['branch_id']),
                         User.role == 'admin_rh'
                     )
                 )
@@ -0,0 +1,186 @@
+"""
+Scheduler for recurring payment reminders.
+
+Rolls paid recurring reminders forward to their next due date, marks
+reminders past their due date as overdue and creates SystemNotification
+entries for reminders entering their reminder window. Every step is a
+set-based UPDATE / INSERT ... SELECT, and the whole cycle is idempotent so
+it can run from several gunicorn workers or from cron at the same time:
+
+- roll-forward and overdue UPDATEs re-check their WHERE on rows another
+  worker updated first, so a row moves only once
+- notifications are claimed first: an UPDATE ... RETURNING marks the
+  reminders as notified and only the ids it returned get a notification,
+  so two workers never notify the same due date twice
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, insert, literal, literal_column, or_, select, update, func
+
+from api.models import db, PaymentReminder, SystemNotification
+
+logger = logging.getLogger(__name__)
+
+# Meses que avanza cada tipo de recurrencia
+RECURRENCE_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'annually': 12,
+    'yearly': 12,
+}
+
+
+def _shift_months(column, months):
+    """SQL expression that adds `months` months to a DateTime column"""
+    if db.engine.dialect.name == 'sqlite':
+        return func.datetime(column, f'+{months} months')
+    return column + literal_column(f"interval '{months} months'")
+
+
+def roll_forward_recurring(now=None):
+    """Move paid recurring reminders to their next period and reset them to pending"""
+    now = now or datetime.utcnow()
+    rolled = 0
+    for recurrence, months in RECURRENCE_MONTHS.items():
+        result = db.session.execute(
+            update(PaymentReminder)
+            .where(
+                PaymentReminder.status == 'paid',
+                PaymentReminder.recurrence == recurrence
+            )
+            .values(
+                due_date=_shift_months(PaymentReminder.due_date, months),
+                status='pending',
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        rolled += result.rowcount
+    return rolled
+
+
+def mark_overdue(now=None):
+    """Flag pending reminders whose due date has passed"""
+    now = now or datetime.utcnow()
+    result = db.session.execute(
+        update(PaymentReminder)
+        .where(
+            PaymentReminder.status == 'pending',
+            PaymentReminder.due_date < now
+        )
+        .values(status='overdue', updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def notify_upcoming(now=None):
+    """Create one notification per reminder entering its window.
+
+    reminder_days varies per row, so the window is evaluated once per distinct
+    value; there are only a handful of them (7, 15, 30...).
+    """
+    now = now or datetime.utcnow()
+    not_notified = or_(
+        PaymentReminder.notified_due_date.is_(None),
+        PaymentReminder.notified_due_date != PaymentReminder.due_date
+    )
+    reminder_days = func.coalesce(PaymentReminder.reminder_days, 7)
+    distinct_days = db.session.execute(
+        select(reminder_days)
+        .where(PaymentReminder.status == 'pending')
+        .distinct()
+    ).scalars().all()
+
+    created = 0
+    for days in distinct_days:
+        in_window = and_(
+            PaymentReminder.status == 'pending',
+            reminder_days == days,
+            PaymentReminder.due_date >= now,
+            PaymentReminder.due_date <= now + timedelta(days=days),
+            not_notified
+        )
+
+        # Reclamar primero: la fila bloqueada por otro worker se re-evalúa al
+        # liberarse y ya no cumple not_notified
+        claimed = db.session.execute(
+            update(PaymentReminder)
+            .where(in_window)
+            .values(notified_due_date=PaymentReminder.due_date)
+            .returning(PaymentReminder.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if not claimed:
+            continue
+
+        result = db.session.execute(
+            insert(SystemNotification).from_select(
+                ['user_id', 'title', 'message', 'notification_type',
+                 'is_read', 'created_at', 'expires_at'],
+                select(
+                    PaymentReminder.user_id,
+                    literal('Pago próximo: ') + PaymentReminder.title,
+                    literal(f'Vence en {days} días o menos: ') +
+                    PaymentReminder.title,
+                    literal('warning'),
+                    literal(False),
+                    literal(now),
+                    PaymentReminder.due_date
+                ).where(PaymentReminder.id.in_(claimed))
+            )
+        )
+        created += result.rowcount
+    return created
+
+
+def run_reminder_cycle(now=None):
+    """Run a full scheduler pass in a single transaction"""
+    now = now or datetime.utcnow()
+    try:
+        rolled = roll_forward_recurring(now)
+        overdue = mark_overdue(now)
+        notified = notify_upcoming(now)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {"rolled_forward": rolled, "overdue": overdue, "notified": notified}
+
+
+def start_reminder_scheduler(app, interval=None):
+    """Run the reminder cycle periodically in a daemon thread.
+
+    Enabled through REMINDER_SCHEDULER_INTERVAL (seconds); 0 or unset disables it.
+    """
+    if interval is None:
+        interval = int(os.getenv('REMINDER_SCHEDULER_INTERVAL', '0') or 0)
+    if interval <= 0:
+        return None
+
+    stop_event = threading.Event()
+
+    def loop():
+        while not stop_event.wait(interval):
+            with app.app_context():
+                try:
+                    try:
+                        run_reminder_cycle()
+                    except Exception as e:
+                        logger.exception("Error in reminder scheduler: %s", e)
+                        db.session.rollback()
+                    try:
+                        from api.sla import run_sla_scan
+                        run_sla_scan()
+                    except Exception as e:
+                        logger.exception("Error in SLA scan: %s", e)
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(
+        target=loop, name='reminder-scheduler', daemon=True)
+    thread.start()
+    return stop_event
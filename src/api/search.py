@@ -0,0 +1,193 @@
+"""
+Full-text search over tickets, journal entries and service orders.
+
+PostgreSQL: expression GIN indexes on to_tsvector(SEARCH_TS_CONFIG, ...),
+so the index is maintained by the database on every write; ranking with
+ts_rank and highlighting with ts_headline.
+SQLite: external-content FTS5 tables kept in sync by triggers on insert,
+update of the indexed columns and delete; ranking with bm25() and
+highlighting with snippet().
+Other backends (or SQLite without FTS5) fall back to LIKE.
+
+Every search term is matched as a prefix ("impre" finds "impresora").
+Queries go through the ORM, so branch scoping (api.tenancy) still applies.
+"""
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import and_, bindparam, column, func, literal_column, or_, select, table, text
+
+from api.models import db, Ticket, JournalEntry, ServiceOrder
+
+SEARCH_TS_CONFIG = 'simple'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+MAX_TERMS = 8
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+@dataclass(frozen=True)
+class SearchTarget:
+    model: type
+    table: str
+    columns: tuple
+    extra: tuple = ()
+
+    @property
+    def fts_table(self):
+        return f"{self.table}_fts"
+
+    @property
+    def document_sql(self):
+        """Same expression in the GIN index and in the queries (must match)"""
+        parts = " || ' ' || ".join(f"coalesce({col}, '')" for col in self.columns)
+        return f"to_tsvector('{SEARCH_TS_CONFIG}', {parts})"
+
+
+SEARCH_TARGETS = {
+    "tickets": SearchTarget(Ticket, 'ticket', ('title', 'description'),
+                            ('status', 'priority', 'created_at')),
+    "journal": SearchTarget(JournalEntry, 'journal_entry', ('title', 'content', 'tags'),
+                            ('category', 'status', 'entry_date')),
+    "service_orders": SearchTarget(ServiceOrder, 'service_order',
+                                   ('title', 'description', 'client_name'),
+                                   ('status', 'client_name', 'created_at')),
+}
+
+
+def search_terms(query):
+    return [token.lower() for token in _TOKEN.findall(query or '')][:MAX_TERMS]
+
+
+# --- Esquema -----------------------------------------------------------------
+
+def sqlite_schema_statements(target):
+    cols = ', '.join(target.columns)
+    new_cols = ', '.join(f"new.{col}" for col in target.columns)
+    old_cols = ', '.join(f"old.{col}" for col in target.columns)
+    fts = target.fts_table
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='{target.table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {target.table}_fts_ai AFTER INSERT ON {target.table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {target.table}_fts_ad AFTER DELETE ON {target.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {target.table}_fts_au AFTER UPDATE OF {cols} ON {target.table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+    ]
+
+
+def postgres_schema_statements(target):
+    return [f"CREATE INDEX IF NOT EXISTS ix_{target.table}_search "
+            f"ON {target.table} USING gin (({target.document_sql}))"]
+
+
+def ensure_search_schema(engine):
+    """Create the FTS tables/triggers (SQLite) or GIN indexes (PostgreSQL)"""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        for target in SEARCH_TARGETS.values():
+            if dialect == 'sqlite':
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                    {"name": target.fts_table}).first()
+                for statement in sqlite_schema_statements(target):
+                    conn.execute(text(statement))
+                if not exists:
+                    # Indexar las filas que ya existían
+                    conn.execute(text(
+                        f"INSERT INTO {target.fts_table}({target.fts_table}) VALUES ('rebuild')"))
+            elif dialect == 'postgresql':
+                for statement in postgres_schema_statements(target):
+                    conn.execute(text(statement))
+
+
+def _fts_available(target):
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return True
+    if dialect == 'sqlite':
+        return db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+            {"name": target.fts_table}).first() is not None
+    return False
+
+
+# --- Consultas -----------------------------------------------------------------
+
+def _base_columns(target):
+    model = target.model
+    return [model.id, model.title] + [getattr(model, name) for name in target.extra]
+
+
+def _sqlite_statement(target, terms, limit):
+    fts = table(target.fts_table, column('rowid'))
+    fts_ref = literal_column(target.fts_table)
+    rank = func.bm25(fts_ref).label('rank')
+    highlight = func.snippet(fts_ref, -1, HIGHLIGHT_START, HIGHLIGHT_STOP,
+                             '…', 16).label('highlight')
+    match = ' '.join(f'"{term}"*' for term in terms)
+    return (select(*_base_columns(target), rank, highlight)
+            .select_from(target.model)
+            .join(fts, fts.c.rowid == target.model.id)
+            .where(fts_ref.op('MATCH')(bindparam('match', match)))
+            .order_by(rank)
+            .limit(limit))
+
+
+def _postgres_statement(target, terms, limit):
+    config = literal_column(f"'{SEARCH_TS_CONFIG}'")
+    document = literal_column(target.document_sql)
+    tsquery = func.to_tsquery(config, bindparam(
+        'tsquery', ' & '.join(f"{term}:*" for term in terms)))
+    rank = func.ts_rank(document, tsquery).label('rank')
+    raw_text = literal_column(
+        " || ' ' || ".join(f"coalesce({col}, '')" for col in target.columns))
+    highlight = func.ts_headline(
+        config, raw_text, tsquery,
+        f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxWords=30, MinWords=10'
+    ).label('highlight')
+    return (select(*_base_columns(target), rank, highlight)
+            .where(document.op('@@')(tsquery))
+            .order_by(rank.desc())
+            .limit(limit))
+
+
+def _like_statement(target, terms, limit):
+    model = target.model
+    conditions = [or_(*[getattr(model, col).ilike(f"%{term}%") for col in target.columns])
+                  for term in terms]
+    return (select(*_base_columns(target))
+            .where(and_(*conditions))
+            .order_by(model.id.desc())
+            .limit(limit))
+
+
+def search(kind, query, limit=20, extra_filter=None):
+    """Ranked matches for one target: [{id, title, ..., rank, highlight}]"""
+    target = SEARCH_TARGETS[kind]
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    dialect = db.engine.dialect.name
+    if _fts_available(target):
+        build = _postgres_statement if dialect == 'postgresql' else _sqlite_statement
+    else:
+        build = _like_statement
+    statement = build(target, terms, limit)
+    if extra_filter is not None:
+        statement = statement.where(extra_filter)
+
+    results = []
+    for row in db.session.execute(statement).mappings():
+        item = {key: (value.isoformat() if hasattr(value, 'isoformat') else value)
+                for key, value in row.items()}
+        item.setdefault('rank', None)
+        item.setdefault('highlight', None)
+        results.append(item)
+    return results
@@ -0,0 +1,358 @@
+"""
+Synthetic data generator.
+
+Bulk-loads realistic volumes (branches, users, tickets and their event
+log, journal entries, recurring calendar events, service orders and large
+matrices) with executemany INSERTs in batches of SEED_BATCH_SIZE rows, one
+commit per batch. Tickets get the SLA deadlines and breach flags api.sla
+would have stamped. With the same seed and `now`, an empty database always
+gets the same data, so benchmark runs are comparable; loading again into a
+non-empty database changes only the run tag in usernames and branch names
+(see run_tag). Used by `flask insert-test-data` / `flask insert-test-users`
+and by benchmarks/endpoints.py.
+"""
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from api.models import (db, Branch, User, Ticket, TicketEvent, JournalEntry, CalendarEvent,
+                        Matrix, ServiceOrder, ServiceOrderMonth)
+from api.sla import DONE_STATUSES, OPEN_STATUS, policy_for
+
+SEED_BATCH_SIZE = int(os.getenv('SEED_BATCH_SIZE', '5000'))
+
+# Volúmenes por defecto (escala "producción grande")
+DEFAULT_SCALE = {
+    "branches": 25,
+    "users": 3000,
+    "tickets": 100_000,
+    "journal_entries": 500_000,
+    "events": 50_000,
+    "service_orders": 5_000,
+    "matrices": 200,
+    "matrix_rows": 50,
+    "matrix_columns": 20,
+}
+
+SMALL_SCALE = {
+    "branches": 5,
+    "users": 100,
+    "tickets": 2_000,
+    "journal_entries": 10_000,
+    "events": 1_000,
+    "service_orders": 200,
+    "matrices": 20,
+    "matrix_rows": 10,
+    "matrix_columns": 10,
+}
+
+TICKET_STATUSES = ['open', 'in_progress', 'resolved', 'closed']
+PRIORITIES = ['low', 'medium', 'high', 'urgent']
+JOURNAL_CATEGORIES = ['work', 'personal', 'meeting',
+                      'maintenance', 'issue', 'achievement', 'note']
+JOURNAL_STATUSES = ['pending', 'completed', 'cancelled']
+EVENT_TYPES = ['maintenance', 'meeting', 'reminder', 'other']
+RECURRENCE_PATTERNS = {'weekly': 7, 'biweekly': 14, 'monthly': 30}
+SERVICE_TYPES = ['soporte', 'mantenimiento', 'redes', 'instalacion']
+ROLES = ['usuario'] * 8 + ['admin', 'admin_rh']
+
+WORDS = ("impresora red servidor correo acceso usuario equipo laptop monitor "
+         "teclado licencia respaldo firewall vpn wifi telefono sistema error "
+         "falla lento configuracion actualizacion instalacion contraseña "
+         "bloqueo carpeta compartida base datos reporte factura").split()
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _bulk_insert(model, rows):
+    """executemany INSERT in batches; returns the number of rows written"""
+    written = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= SEED_BATCH_SIZE:
+            db.session.execute(insert(model), batch)
+            db.session.commit()
+            written += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+        written += len(batch)
+    return written
+
+
+def _ids(model, tag_column=None, prefix=None):
+    query = select(model.id)
+    if tag_column is not None:
+        # '_' y '%' del prefijo son literales, no comodines de LIKE
+        query = query.where(tag_column.startswith(prefix, autoescape=True))
+    return list(db.session.execute(query.order_by(model.id)).scalars())
+
+
+def seed_branches(rng, count, tag):
+    rows = ({"name": f"Sucursal {tag} {i}", "code": f"B{tag}{i}"[:10],
+             "location": f"Zona {rng.randint(1, 20)}", "is_active": True}
+            for i in range(1, count + 1))
+    _bulk_insert(Branch, rows)
+    return _ids(Branch, Branch.name, f"Sucursal {tag} ")
+
+
+def seed_users(rng, count, tag, branch_ids=None, password='123456'):
+    """Users spread over branches; the password is hashed once for all rows"""
+    probe = User()
+    probe.set_password(password)
+    rows = ({
+        "username": f"user_{tag}_{i}",
+        "full_name": f"Usuario {tag} {i}",
+        "name": f"Usuario {tag} {i}",
+        "email": f"user_{tag}_{i}@test.com",
+        "password": probe.password_hash,
+        "password_hash": probe.password_hash,
+        "is_active": True,
+        "is_suspended": False,
+        "role": rng.choice(ROLES),
+        "branch_id": rng.choice(branch_ids) if branch_ids else None,
+    } for i in range(1, count + 1))
+    _bulk_insert(User, rows)
+    return _ids(User, User.username, f"user_{tag}_")
+
+
+def _sla_fields(rng, ticket, now):
+    """Deadlines and met/breached state as api.sla would leave them at `now`;
+    first response within 0.1-1.5x the response window, resolution at the last update"""
+    response_min, resolution_min = policy_for(ticket["priority"], ticket["branch_id"])
+    created, updated, status = ticket["created_at"], ticket["updated_at"], ticket["status"]
+    response_due = created + timedelta(minutes=response_min)
+    resolution_due = created + timedelta(minutes=resolution_min)
+    first_response = None
+    if status != OPEN_STATUS:
+        first_response = min(created + timedelta(minutes=response_min * rng.uniform(0.1, 1.5)),
+                             updated)
+    resolved = updated if status in DONE_STATUSES else None
+    response_breached = (first_response or now) > response_due
+    resolution_breached = (resolved or now) > resolution_due
+    pending = [due for due, met, breached in (
+        (response_due, first_response, response_breached),
+        (resolution_due, resolved, resolution_breached)) if met is None and not breached]
+    return {
+        "response_due_at": response_due,
+        "resolution_due_at": resolution_due,
+        "first_response_at": first_response,
+        "resolved_at": resolved,
+        "sla_response_breached": response_breached,
+        "sla_resolution_breached": resolution_breached,
+        "sla_next_check_at": min(pending, default=None),
+    }
+
+
+def seed_tickets(rng, count, user_ids, branch_ids, now):
+    def rows():
+        for _ in range(count):
+            created = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            status = rng.choice(TICKET_STATUSES)
+            rated = status in ('resolved', 'closed') and rng.random() < 0.4
+            ticket = {
+                "title": _text(rng, 4).capitalize(),
+                "description": _text(rng, 30),
+                "status": status,
+                "priority": rng.choice(PRIORITIES),
+                "created_at": created,
+                "updated_at": created + timedelta(hours=rng.randint(0, 240)),
+                "assigned_to": rng.choice(user_ids) if rng.random() < 0.8 else None,
+                "requester_name": f"Solicitante {rng.randint(1, 5000)}",
+                "requester_email": f"solicitante{rng.randint(1, 5000)}@test.com",
+                "rating": rng.randint(1, 3) if rated else None,
+                "rated_at": created + timedelta(days=rng.randint(1, 10)) if rated else None,
+                "branch_id": rng.choice(branch_ids),
+            }
+            ticket.update(_sla_fields(rng, ticket, now))
+            yield ticket
+    return _bulk_insert(Ticket, rows())
+
+
+def seed_ticket_events(rng, after_id):
+    """Plausible event chains (created -> in_progress -> resolved -> closed)
+    for tickets with id > after_id, ending in each ticket's current status"""
+    tickets = db.session.execute(
+        select(Ticket.id, Ticket.status, Ticket.priority, Ticket.assigned_to,
+               Ticket.created_at, Ticket.updated_at)
+        .where(Ticket.id > after_id).order_by(Ticket.id)
+        .execution_options(skip_branch_scope=True)).all()
+
+    def rows():
+        for ticket_id, status, priority, assigned_to, created, updated in tickets:
+            path = TICKET_STATUSES[:TICKET_STATUSES.index(status) + 1]
+            span = max((updated - created).total_seconds(), 60.0)
+            at = created
+            previous = None
+            for step, to_status in enumerate(path):
+                if step:
+                    at = at + timedelta(seconds=rng.uniform(0, span / len(path)))
+                yield {
+                    "ticket_id": ticket_id,
+                    "event_type": 'status' if step else 'created',
+                    "from_status": previous,
+                    "to_status": to_status,
+                    "priority": priority,
+                    "assigned_to": assigned_to,
+                    "created_at": at,
+                }
+                previous = to_status
+    return _bulk_insert(TicketEvent, rows())
+
+
+def seed_journal_entries(rng, count, user_ids, branch_ids, now):
+    def rows():
+        for _ in range(count):
+            entry_date = now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60))
+            yield {
+                "title": _text(rng, 5).capitalize(),
+                "content": _text(rng, 60),
+                "entry_date": entry_date,
+                "category": rng.choice(JOURNAL_CATEGORIES),
+                "priority": rng.choice(PRIORITIES),
+                "status": rng.choice(JOURNAL_STATUSES),
+                "created_at": entry_date,
+                "updated_at": entry_date,
+                "user_id": rng.choice(user_ids),
+                "hours_worked": round(rng.uniform(0.5, 8), 1),
+                "location": f"Oficina {rng.randint(1, 30)}",
+                "tags": ','.join(rng.sample(WORDS, 3)),
+                "branch_id": rng.choice(branch_ids),
+            }
+    return _bulk_insert(JournalEntry, rows())
+
+
+def seed_events(rng, count, user_ids, branch_ids, now):
+    """About a third of the events belong to recurrence series of 4-12 items"""
+    def rows():
+        produced = 0
+        while produced < count:
+            start = now + timedelta(days=rng.randint(-180, 180),
+                                    hours=rng.randint(7, 18))
+            base = {
+                "title": _text(rng, 3).capitalize(),
+                "description": _text(rng, 15),
+                "event_type": rng.choice(EVENT_TYPES),
+                "all_day": False,
+                "location": f"Sala {rng.randint(1, 10)}",
+                "user_id": rng.choice(user_ids),
+                "equipment": f"Equipo {rng.randint(1, 500)}",
+                "branch": f"Sucursal {rng.randint(1, 25)}",
+                "maintenance_type": rng.choice(['preventivo', 'correctivo']),
+                "branch_id": rng.choice(branch_ids),
+            }
+            if rng.random() < 0.33:
+                pattern = rng.choice(list(RECURRENCE_PATTERNS))
+                series = min(rng.randint(4, 12), count - produced)
+                recurrence_id = uuid.UUID(int=rng.getrandbits(128)).hex
+                for n in range(series):
+                    occurrence = start + timedelta(days=RECURRENCE_PATTERNS[pattern] * n)
+                    yield dict(base, start_date=occurrence,
+                               end_date=occurrence + timedelta(hours=1),
+                               recurrence_id=recurrence_id, is_recurring=True,
+                               recurrence_pattern=pattern)
+                produced += series
+            else:
+                yield dict(base, start_date=start, end_date=start + timedelta(hours=1),
+                           is_recurring=False)
+                produced += 1
+    return _bulk_insert(CalendarEvent, rows())
+
+
+def seed_service_orders(rng, count, user_ids, branch_ids, now):
+    written = _bulk_insert(ServiceOrder, ({
+        "title": f"Servicio {_text(rng, 2)}",
+        "description": _text(rng, 20),
+        "client_name": f"Cliente {rng.randint(1, 800)}",
+        "service_type": rng.choice(SERVICE_TYPES),
+        "status": rng.choice(['pending', 'in_progress', 'completed']),
+        "priority": rng.choice(PRIORITIES),
+        "estimated_hours": rng.randint(1, 40),
+        "hourly_rate": rng.choice([25.0, 40.0, 60.0]),
+        "assigned_to": rng.choice(user_ids),
+        "created_by": rng.choice(user_ids),
+        "branch_id": rng.choice(branch_ids),
+    } for _ in range(count)))
+
+    order_ids = list(db.session.execute(
+        select(ServiceOrder.id).order_by(ServiceOrder.id.desc()).limit(count)).scalars())
+    months = []
+    year, month = now.year, now.month
+    for _ in range(12):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    _bulk_insert(ServiceOrderMonth, ({
+        "order_id": order_id,
+        "month": month,
+        "completed": True,
+        "completed_date": now,
+    } for order_id in order_ids for month in months if rng.random() < 0.7))
+    return written
+
+
+def seed_matrices(rng, count, rows, columns, user_ids):
+    def matrix_rows():
+        for i in range(count):
+            yield {
+                "name": f"Matriz {i}",
+                "description": _text(rng, 10),
+                "matrix_type": rng.choice(['custom', 'risk', 'swot']),
+                "rows": rows,
+                "columns": columns,
+                "data": {f"{r}-{c}": _text(rng, 2)
+                         for r in range(rows) for c in range(columns)},
+                "headers": {"rows": [f"Fila {r}" for r in range(rows)],
+                            "columns": [f"Columna {c}" for c in range(columns)]},
+                "user_id": rng.choice(user_ids),
+            }
+    return _bulk_insert(Matrix, matrix_rows())
+
+
+def run_tag(seed):
+    """Short tag for usernames/branch names, so repeated loads do not hit UNIQUE
+    columns. Derived from the seed and the number of users already loaded: the
+    same for every load into an empty database, different on each reload."""
+    run = db.session.execute(select(func.count(User.id))).scalar() or 0
+    return random.Random(f"{seed}-{run}").getrandbits(16).to_bytes(2, 'big').hex()
+
+
+def generate(scale=None, seed=42, now=None, progress=None):
+    """Load a full synthetic dataset; returns {table: rows_written}"""
+    scale = dict(DEFAULT_SCALE, **(scale or {}))
+    rng = random.Random(seed)
+    now = now or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    tag = run_tag(seed)
+
+    def step(name, value):
+        if progress:
+            progress(name, value)
+        return value
+
+    counts = {}
+    branch_ids = seed_branches(rng, scale["branches"], tag)
+    counts["branches"] = step("branches", len(branch_ids))
+    user_ids = seed_users(rng, scale["users"], tag, branch_ids)
+    counts["users"] = step("users", len(user_ids))
+    last_ticket_id = db.session.execute(select(func.max(Ticket.id))).scalar() or 0
+    counts["tickets"] = step("tickets", seed_tickets(
+        rng, scale["tickets"], user_ids, branch_ids, now))
+    counts["ticket_events"] = step("ticket_events", seed_ticket_events(rng, last_ticket_id))
+    # Los INSERT masivos no pasan por el hook de api.ratings
+    from api.ratings import rebuild_rating_aggregates
+    counts["rating_aggregates"] = step("rating_aggregates", rebuild_rating_aggregates())
+    counts["journal_entries"] = step("journal_entries", seed_journal_entries(
+        rng, scale["journal_entries"], user_ids, branch_ids, now))
+    counts["events"] = step("events", seed_events(
+        rng, scale["events"], user_ids, branch_ids, now))
+    counts["service_orders"] = step("service_orders", seed_service_orders(
+        rng, scale["service_orders"], user_ids, branch_ids, now))
+    counts["matrices"] = step("matrices", seed_matrices(
+        rng, scale["matrices"], scale["matrix_rows"], scale["matrix_columns"], user_ids))
+    return counts
@@ -0,0 +1,354 @@
+"""
+Duplicate ticket detection.
+
+Each ticket's title + description is reduced to a MinHash signature
+(SIMILARITY_PERMUTATIONS 32-bit hashes of its word unigrams and bigrams,
+computed with NumPy) and indexed with LSH: the signature is cut into
+SIMILARITY_BANDS bands and each band is a key into a bucket table. A lookup
+only compares the tickets that share at least one bucket, so finding
+duplicates does not scan the table; candidates are ranked by the estimated
+Jaccard similarity (share of equal signature positions).
+
+The index lives in memory per process and is updated incrementally when a
+ticket is created or its text changes. It is saved to SIMILARITY_INDEX_PATH
+(signatures and ids in one .npz, replaced atomically) every
+SIMILARITY_SAVE_EVERY changes, so a new worker loads it and only indexes
+the tickets created since. Tickets created by other workers are picked up
+the same way (id > last indexed id) before each lookup and before adding a
+ticket. Ids can commit out of order (PostgreSQL sequences across workers),
+so the ids skipped just before a recently created ticket are kept as gaps
+and re-checked on every catch-up for SIMILARITY_GAP_SECONDS; after that
+they are taken as rolled back or deleted. A ticket whose transaction takes longer than that
+is only indexed on the next rebuild.
+
+Limitation: text edits are only re-indexed in the worker that made them.
+Other workers keep the old signature until they restart, and since every
+worker saves its own copy the last .npz written wins, so an edit can be
+lost from the file too. After bulk text edits run `flask similarity-rebuild`
+and restart the workers.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select
+
+from api.models import db, Ticket
+
+SIMILARITY_INDEX_PATH = os.getenv('SIMILARITY_INDEX_PATH', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ticket_similarity.npz'))
+SIMILARITY_PERMUTATIONS = int(os.getenv('SIMILARITY_PERMUTATIONS', '64'))
+SIMILARITY_BANDS = int(os.getenv('SIMILARITY_BANDS', '16'))
+SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', '0.5'))
+SIMILARITY_SAVE_EVERY = int(os.getenv('SIMILARITY_SAVE_EVERY', '200'))
+SIMILARITY_SYNC_SECONDS = float(os.getenv('SIMILARITY_SYNC_SECONDS', '5'))
+SIMILARITY_GAP_SECONDS = float(os.getenv('SIMILARITY_GAP_SECONDS', '600'))
+SIMILARITY_BATCH = 2000
+# Huecos registrados por salto de ids (rebuild sobre una tabla con muchos borrados)
+SIMILARITY_MAX_GAP = 1000
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def shingles(title, description):
+    """Normalized word unigrams and bigrams (accents and case removed)"""
+    text = unicodedata.normalize('NFKD', f"{title or ''} {description or ''}".lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    words = [word for word in _TOKEN.findall(text) if len(word) > 1]
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+class SimilarityIndex:
+    """MinHash signatures in a NumPy array plus LSH bucket tables"""
+
+    def __init__(self, permutations=SIMILARITY_PERMUTATIONS, bands=SIMILARITY_BANDS, seed=1):
+        if permutations % bands:
+            raise ValueError("SIMILARITY_PERMUTATIONS must be a multiple of SIMILARITY_BANDS")
+        self.permutations = permutations
+        self.bands = bands
+        self.rows_per_band = permutations // bands
+        rng = np.random.default_rng(seed)
+        # h(x) = (a*x + b) mod p: x < 2^32 y a, b < 2^29, sin desbordar uint64
+        self._a = rng.integers(1, 1 << 29, size=permutations, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 29, size=permutations, dtype=np.uint64)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.signatures = np.zeros((0, self.permutations), dtype=np.uint32)
+        self.size = 0
+        self.positions = {}
+        self.buckets = [defaultdict(list) for _ in range(self.bands)]
+        self.last_ticket_id = 0
+        self.gaps = {}              # id saltado -> time.monotonic() al verlo faltar
+        self.fingerprint = None
+        self.unsaved = 0
+        self.synced_at = 0.0
+        self.loaded = False
+
+    # --- Firmas -----------------------------------------------------------------
+
+    def signature(self, title, description):
+        tokens = shingles(title, description)
+        if not tokens:
+            return None
+        hashes = np.fromiter((zlib.crc32(token.encode()) for token in tokens),
+                             dtype=np.uint64, count=len(tokens))
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME
+        return (permuted & _MAX_HASH).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        rows = self.rows_per_band
+        return [signature[band * rows:(band + 1) * rows].tobytes()
+                for band in range(self.bands)]
+
+    # --- Mantenimiento ----------------------------------------------------------
+
+    def _grow(self, needed):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        ids = np.zeros(capacity, dtype=np.int64)
+        signatures = np.zeros((capacity, self.permutations), dtype=np.uint32)
+        ids[:self.size] = self.ids[:self.size]
+        signatures[:self.size] = self.signatures[:self.size]
+        self.ids, self.signatures = ids, signatures
+
+    def _unlink(self, position):
+        for band, key in enumerate(self._band_keys(self.signatures[position])):
+            bucket = self.buckets[band].get(key)
+            if bucket and position in bucket:
+                bucket.remove(position)
+
+    def _put(self, ticket_id, signature):
+        position = self.positions.get(ticket_id)
+        if position is not None:
+            self._unlink(position)
+        if signature is None:
+            if position is not None:
+                self.ids[position] = 0
+            return
+        if position is None:
+            self._grow(self.size + 1)
+            position = self.size
+            self.size += 1
+            self.positions[ticket_id] = position
+        self.ids[position] = ticket_id
+        self.signatures[position] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self.buckets[band][key].append(position)
+
+    def add(self, ticket_id, title, description):
+        """Index (or re-index) one ticket; saves every SIMILARITY_SAVE_EVERY changes"""
+        signature = self.signature(title, description)
+        with self._lock:
+            if ticket_id > self.last_ticket_id:
+                # La marca solo avanza en _catch_up: los ids intermedios pueden
+                # ser de otros workers y todavía no estar indexados aquí
+                self._catch_up()
+            self._put(ticket_id, signature)
+            self.gaps.pop(ticket_id, None)
+            self.unsaved += 1
+            if self.unsaved >= SIMILARITY_SAVE_EVERY:
+                self.save()
+
+    def _index_rows(self, rows):
+        recent = datetime.utcnow() - timedelta(seconds=SIMILARITY_GAP_SECONDS)
+        for ticket_id, title, description, created_at in rows:
+            # Un salto antes de un ticket reciente puede ser una transacción en curso;
+            # antes de uno viejo son borrados/rollbacks (rebuild): no se registran
+            if ticket_id > self.last_ticket_id + 1 and (created_at is None or created_at >= recent):
+                seen = time.monotonic()
+                for missing in range(max(self.last_ticket_id + 1, ticket_id - SIMILARITY_MAX_GAP),
+                                     ticket_id):
+                    self.gaps[missing] = seen
+            self.gaps.pop(ticket_id, None)
+            self._put(ticket_id, self.signature(title, description))
+            self.last_ticket_id = max(self.last_ticket_id, ticket_id)
+            self.unsaved += 1
+
+    def _recheck_gaps(self):
+        """Index skipped ids that have committed since; forget the old ones"""
+        expired = time.monotonic() - SIMILARITY_GAP_SECONDS
+        self.gaps = {ticket_id: seen for ticket_id, seen in self.gaps.items() if seen >= expired}
+        pending = sorted(self.gaps)
+        for start in range(0, len(pending), SIMILARITY_BATCH):
+            rows = db.session.execute(
+                select(Ticket.id, Ticket.title, Ticket.description)
+                .where(Ticket.id.in_(pending[start:start + SIMILARITY_BATCH]))
+                .execution_options(skip_branch_scope=True)
+            ).all()
+            for ticket_id, title, description in rows:
+                del self.gaps[ticket_id]
+                self._put(ticket_id, self.signature(title, description))
+                self.unsaved += 1
+
+    def _catch_up(self):
+        """Index tickets created after the last indexed id (other workers, restarts)
+        and the skipped ids that committed late"""
+        self._recheck_gaps()
+        while True:
+            rows = db.session.execute(
+                select(Ticket.id, Ticket.title, Ticket.description, Ticket.created_at)
+                .where(Ticket.id > self.last_ticket_id)
+                .order_by(Ticket.id)
+                .limit(SIMILARITY_BATCH)
+                .execution_options(skip_branch_scope=True)
+            ).all()
+            if not rows:
+                break
+            self._index_rows(rows)
+        self.synced_at = time.monotonic()
+
+    def rebuild(self):
+        with self._lock:
+            self._reset()
+            self.fingerprint = _database_fingerprint()
+            self.loaded = True
+            self._catch_up()
+            self.save()
+            return self.size
+
+    def ensure_ready(self):
+        with self._lock:
+            if not self.loaded:
+                self.load()
+            elif time.monotonic() - self.synced_at > SIMILARITY_SYNC_SECONDS:
+                self._catch_up()
+            if self.unsaved >= SIMILARITY_SAVE_EVERY:
+                self.save()
+
+    # --- Persistencia ------------------------------------------------------------
+
+    def save(self, path=None):
+        path = path or SIMILARITY_INDEX_PATH
+        with self._lock:
+            directory = os.path.dirname(path) or '.'
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npz')
+            try:
+                with os.fdopen(fd, 'wb') as fh:
+                    np.savez(fh, ids=self.ids[:self.size],
+                             signatures=self.signatures[:self.size],
+                             meta=np.array([self.permutations, self.bands,
+                                            self.last_ticket_id], dtype=np.int64),
+                             gaps=np.array(sorted(self.gaps), dtype=np.int64),
+                             fingerprint=np.array(self.fingerprint or ''))
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            self.unsaved = 0
+
+    def load(self, path=None):
+        """Load the saved index, or rebuild it when missing or not matching"""
+        path = path or SIMILARITY_INDEX_PATH
+        with self._lock:
+            self._reset()
+            fingerprint = _database_fingerprint()
+            try:
+                with np.load(path) as data:
+                    permutations, bands, last_ticket_id = (int(v) for v in data['meta'])
+                    stored_fingerprint = str(data['fingerprint'])
+                    ids = data['ids']
+                    signatures = data['signatures']
+                    gaps = data['gaps']
+            except (OSError, KeyError, ValueError):
+                return self.rebuild()
+            if (permutations, bands) != (self.permutations, self.bands) or \
+                    stored_fingerprint != fingerprint:
+                return self.rebuild()
+
+            self.fingerprint = fingerprint
+            self._grow(len(ids))
+            for ticket_id, signature in zip(ids.tolist(), signatures):
+                if ticket_id:
+                    self._put(ticket_id, signature)
+            self.last_ticket_id = last_ticket_id
+            # Huecos de quien guardó el fichero: se revisan desde ahora
+            seen = time.monotonic()
+            self.gaps = {ticket_id: seen for ticket_id in gaps.tolist()}
+            self.loaded = True
+            # Base recreada con ids más bajos: el índice guardado ya no sirve
+            max_id = db.session.execute(
+                select(db.func.max(Ticket.id)).execution_options(skip_branch_scope=True)
+            ).scalar() or 0
+            if max_id < last_ticket_id:
+                return self.rebuild()
+            self._catch_up()
+            return self.size
+
+    # --- Consultas ---------------------------------------------------------------
+
+    def candidates(self, signature, exclude_id=None, threshold=SIMILARITY_THRESHOLD, limit=10):
+        """[(ticket_id, estimated_jaccard)] from the LSH buckets, best first"""
+        with self._lock:
+            positions = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                positions.update(self.buckets[band].get(key, ()))
+            if not positions:
+                return []
+            positions = np.fromiter(positions, dtype=np.int64, count=len(positions))
+            scores = (self.signatures[positions] == signature).mean(axis=1)
+            ids = self.ids[positions]
+        order = np.argsort(-scores, kind='stable')
+        result = []
+        for index in order:
+            ticket_id = int(ids[index])
+            if ticket_id == exclude_id or not ticket_id or scores[index] < threshold:
+                continue
+            result.append((ticket_id, round(float(scores[index]), 3)))
+            if len(result) >= limit:
+                break
+        return result
+
+
+def _database_fingerprint():
+    return hashlib.sha1(str(db.engine.url).encode()).hexdigest()
+
+
+similarity_index = SimilarityIndex()
+
+
+def index_ticket(ticket):
+    """Add or refresh a ticket in the index (call after commit)"""
+    similarity_index.ensure_ready()
+    similarity_index.add(ticket.id, ticket.title, ticket.description)
+
+
+def similar_tickets(title, description, exclude_id=None, threshold=SIMILARITY_THRESHOLD, limit=10):
+    """Likely duplicates: [{id, title, status, created_at, similarity}]"""
+    similarity_index.ensure_ready()
+    signature = similarity_index.signature(title, description)
+    if signature is None:
+        return []
+    # Pedir de más: algunos pueden estar borrados o fuera de la sucursal
+    matches = similarity_index.candidates(signature, exclude_id, threshold, limit * 2)
+    if not matches:
+        return []
+    scores = dict(matches)
+    rows = db.session.execute(
+        select(Ticket.id, Ticket.title, Ticket.status, Ticket.created_at)
+        .where(Ticket.id.in_(list(scores)))
+    ).all()
+    result = [{
+        "id": ticket_id,
+        "title": title,
+        "status": status,
+        "created_at": created_at.isoformat() if created_at else None,
+        "similarity": scores[ticket_id],
+    } for ticket_id, title, status, created_at in rows]
+    result.sort(key=lambda item: (-item["similarity"], -item["id"]))
+    return result[:limit]
@@ -0,0 +1,319 @@
+"""
+Ticket SLA engine.
+
+Response and resolution deadlines come from SLAPolicy rows (per priority,
+optionally per branch) with built-in defaults. They are stamped on the
+ticket in a before_flush hook when it is created and whenever its status or
+priority changes, so no request ever has to recompute them:
+
+- response: met on the first transition out of 'open'
+- resolution: met when the ticket reaches resolved/closed; reopening
+  restarts the resolution clock
+
+A deadline met late is flagged as breached when it is met; one still
+pending is flagged by the breach scan once it passes.
+
+`sla_next_check_at` holds the earliest deadline still pending (NULL once
+both are met or breached). The breach scan is an indexed range query on
+that column, so each run only touches tickets that just breached.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from api.models import db, Ticket, SLAPolicy, SystemNotification
+
+SLA_CACHE_TTL = int(os.getenv('SLA_CACHE_TTL', '300'))
+SLA_SCAN_BATCH = int(os.getenv('SLA_SCAN_BATCH', '500'))
+# Destinatario de las alertas además del técnico asignado (super admin)
+SLA_ALERT_USER_ID = int(os.getenv('SLA_ALERT_USER_ID', '1'))
+
+# (respuesta, resolución) en minutos cuando no hay política configurada
+DEFAULT_POLICIES = {
+    'urgent': (15, 4 * 60),
+    'high': (60, 8 * 60),
+    'medium': (4 * 60, 24 * 60),
+    'low': (8 * 60, 72 * 60),
+}
+
+OPEN_STATUS = 'open'
+DONE_STATUSES = frozenset({'resolved', 'closed'})
+
+_lock = threading.Lock()
+_policies = {"table": None, "loaded_at": 0.0}
+
+
+# --- Políticas -------------------------------------------------------------------
+
+def _load_policies():
+    table = {(priority, None): minutes for priority,
+             minutes in DEFAULT_POLICIES.items()}
+    # Corre dentro de before_flush: comprobar la tabla en vez de dejar fallar la
+    # consulta, que en PostgreSQL abortaría la transacción del INSERT
+    if not inspect(db.session.connection()).has_table(SLAPolicy.__tablename__):
+        # DB sin migrar: solo los valores por defecto
+        return table
+    rows = db.session.execute(
+        select(SLAPolicy.priority, SLAPolicy.branch_id,
+               SLAPolicy.response_minutes, SLAPolicy.resolution_minutes)
+        .where(SLAPolicy.is_active.is_(True))
+    ).all()
+    for priority, branch_id, response, resolution in rows:
+        table[(priority, branch_id)] = (response, resolution)
+    return table
+
+
+def get_policy_table():
+    """{(priority, branch_id or None): (response_min, resolution_min)}"""
+    table = _policies["table"]
+    if table is not None and time.monotonic() - _policies["loaded_at"] <= SLA_CACHE_TTL:
+        return table
+    with _lock:
+        table = _policies["table"]
+        if table is None or time.monotonic() - _policies["loaded_at"] > SLA_CACHE_TTL:
+            table = _load_policies()
+            _policies["table"] = table
+            _policies["loaded_at"] = time.monotonic()
+        return table
+
+
+def invalidate_policies():
+    with _lock:
+        _policies["table"] = None
+
+
+def policy_for(priority, branch_id):
+    table = get_policy_table()
+    priority = priority or 'medium'
+    return (table.get((priority, branch_id)) or table.get((priority, None))
+            or DEFAULT_POLICIES['medium'])
+
+
+# --- Cálculo de plazos ------------------------------------------------------------
+
+def next_check(ticket):
+    pending = []
+    if ticket.first_response_at is None and not ticket.sla_response_breached \
+            and ticket.response_due_at is not None:
+        pending.append(ticket.response_due_at)
+    if ticket.resolved_at is None and not ticket.sla_resolution_breached \
+            and ticket.resolution_due_at is not None:
+        pending.append(ticket.resolution_due_at)
+    return min(pending) if pending else None
+
+
+def apply_sla(ticket, now=None, previous_status=None, created=False, priority_changed=False):
+    """Update deadlines and met/breached state of one ticket in memory"""
+    now = now or datetime.utcnow()
+    status = ticket.status or OPEN_STATUS
+    response_min, resolution_min = policy_for(ticket.priority, ticket.branch_id)
+    if created and ticket.created_at is None:
+        # El default de la columna llega recién en el INSERT
+        ticket.created_at = now
+    started = ticket.created_at or now
+
+    if created or priority_changed:
+        if ticket.first_response_at is None and not ticket.sla_response_breached:
+            ticket.response_due_at = started + timedelta(minutes=response_min)
+        if ticket.resolved_at is None and not ticket.sla_resolution_breached:
+            ticket.resolution_due_at = started + timedelta(minutes=resolution_min)
+
+    if status != OPEN_STATUS and ticket.first_response_at is None:
+        ticket.first_response_at = now
+        if ticket.response_due_at is not None and now > ticket.response_due_at:
+            ticket.sla_response_breached = True
+    if status in DONE_STATUSES and ticket.resolved_at is None:
+        ticket.resolved_at = now
+        if ticket.resolution_due_at is not None and now > ticket.resolution_due_at:
+            ticket.sla_resolution_breached = True
+    elif status not in DONE_STATUSES and previous_status in DONE_STATUSES:
+        # Reabierto: nuevo plazo de resolución desde ahora
+        ticket.resolved_at = None
+        ticket.sla_resolution_breached = False
+        ticket.resolution_due_at = now + timedelta(minutes=resolution_min)
+
+    ticket.sla_next_check_at = next_check(ticket)
+
+
+def _history_value(state, key):
+    history = state.attrs[key].history
+    if not history.has_changes():
+        return None, False
+    return (history.deleted[0] if history.deleted else None), True
+
+
+def _stamp_sla(session, flush_context, instances):
+    now = datetime.utcnow()
+    for obj in session.new:
+        if isinstance(obj, Ticket):
+            apply_sla(obj, now, created=True)
+    for obj in session.dirty:
+        if not isinstance(obj, Ticket):
+            continue
+        state = inspect(obj)
+        previous_status, status_changed = _history_value(state, 'status')
+        _, priority_changed = _history_value(state, 'priority')
+        if status_changed or priority_changed:
+            apply_sla(obj, now, previous_status=previous_status,
+                      priority_changed=priority_changed)
+
+
+def setup_sla(app):
+    """Register the deadline hook once per process (after api.tenancy)"""
+    if not event.contains(Session, 'before_flush', _stamp_sla):
+        event.listen(Session, 'before_flush', _stamp_sla)
+
+
+# --- Escaneo de incumplimientos ------------------------------------------------
+
+def _flag_overdue(ticket, now):
+    """Flag the pending deadlines already past `now`; returns the breached ones"""
+    breaches = []
+    if (ticket.first_response_at is None and not ticket.sla_response_breached
+            and ticket.response_due_at and ticket.response_due_at <= now):
+        ticket.sla_response_breached = True
+        breaches.append("respuesta")
+    if (ticket.resolved_at is None and not ticket.sla_resolution_breached
+            and ticket.resolution_due_at and ticket.resolution_due_at <= now):
+        ticket.sla_resolution_breached = True
+        breaches.append("resolución")
+    ticket.sla_next_check_at = next_check(ticket)
+    return breaches
+
+
+def run_sla_scan(now=None):
+    """Flag tickets whose pending deadline passed and notify; returns counts.
+
+    Each batch is locked (FOR UPDATE SKIP LOCKED on PostgreSQL) and its flags
+    and notifications are committed together, so concurrent workers never
+    alert twice on the same breach and a failure loses no alert.
+    """
+    now = now or datetime.utcnow()
+    result = {"response_breaches": 0, "resolution_breaches": 0, "notified": 0}
+    while True:
+        tickets = db.session.execute(
+            select(Ticket)
+            .where(Ticket.sla_next_check_at <= now)
+            .order_by(Ticket.sla_next_check_at)
+            .limit(SLA_SCAN_BATCH)
+            .with_for_update(skip_locked=True)
+            .execution_options(skip_branch_scope=True)
+        ).scalars().all()
+        if not tickets:
+            break
+        notifications = []
+        for ticket in tickets:
+            breaches = _flag_overdue(ticket, now)
+            result["response_breaches"] += "respuesta" in breaches
+            result["resolution_breaches"] += "resolución" in breaches
+            if breaches:
+                message = (f"El ticket #{ticket.id} ({ticket.priority}) superó el plazo de "
+                           f"{' y '.join(breaches)}")
+                recipients = {SLA_ALERT_USER_ID}
+                if ticket.assigned_to:
+                    recipients.add(ticket.assigned_to)
+                notifications.extend({
+                    "user_id": user_id,
+                    "title": f"SLA incumplido: {ticket.title}"[:200],
+                    "message": message,
+                    "notification_type": 'warning',
+                    "is_read": False,
+                    "created_at": now,
+                } for user_id in recipients)
+        if notifications:
+            db.session.execute(insert(SystemNotification), notifications)
+            result["notified"] += len(notifications)
+        db.session.commit()
+    return result
+
+
+def backfill_sla(batch_size=SLA_SCAN_BATCH, now=None):
+    """Stamp deadlines on tickets that never got them (bulk loads, old rows).
+
+    Met/breached state comes from the historical timestamps (first response
+    and resolution at the ticket's last update). Deadlines already past
+    `now` are flagged here without alerts, so the next scan does not flood.
+    """
+    now = now or datetime.utcnow()
+    updated = 0
+    last_id = 0
+    while True:
+        tickets = db.session.execute(
+            select(Ticket)
+            .where(Ticket.id > last_id, Ticket.response_due_at.is_(None))
+            .order_by(Ticket.id)
+            .limit(batch_size)
+            .execution_options(skip_branch_scope=True)
+        ).scalars().all()
+        if not tickets:
+            return updated
+        for ticket in tickets:
+            apply_sla(ticket, now=ticket.updated_at or ticket.created_at, created=True)
+            _flag_overdue(ticket, now)
+        last_id = tickets[-1].id
+        updated += len(tickets)
+        db.session.commit()
+
+
+# --- Tablero -----------------------------------------------------------------------
+
+def sla_dashboard(now=None, days=30, at_risk_minutes=60):
+    now = now or datetime.utcnow()
+    since = now - timedelta(days=days)
+    open_filter = Ticket.status.notin_(DONE_STATUSES)
+    breached = db.or_(Ticket.sla_response_breached.is_(True),
+                      Ticket.sla_resolution_breached.is_(True))
+
+    at_risk = db.session.execute(
+        select(func.count(Ticket.id)).where(
+            Ticket.sla_next_check_at > now,
+            Ticket.sla_next_check_at <= now + timedelta(minutes=at_risk_minutes))
+    ).scalar()
+
+    by_priority = {}
+    rows = db.session.execute(
+        select(Ticket.priority,
+               func.count(Ticket.id),
+               func.sum(case((breached, 1), else_=0)))
+        .where(open_filter)
+        .group_by(Ticket.priority)
+    ).all()
+    for priority, total, breached_count in rows:
+        by_priority[priority or 'medium'] = {
+            "open": total, "breached": int(breached_count or 0)}
+
+    resolved_total, resolved_in_sla = db.session.execute(
+        select(func.count(Ticket.id),
+               func.sum(case((Ticket.sla_resolution_breached.is_(False), 1), else_=0)))
+        .where(Ticket.resolved_at >= since)
+    ).one()
+
+    breached_open = db.session.execute(
+        select(Ticket.id, Ticket.title, Ticket.priority, Ticket.status,
+               Ticket.assigned_to, Ticket.branch_id, Ticket.response_due_at,
+               Ticket.resolution_due_at, Ticket.sla_response_breached,
+               Ticket.sla_resolution_breached)
+        .where(open_filter, breached)
+        .order_by(Ticket.resolution_due_at)
+        .limit(50)
+    ).mappings().all()
+
+    return {
+        "generated_at": now.isoformat(),
+        "at_risk_next_minutes": at_risk_minutes,
+        "at_risk": at_risk,
+        "open_by_priority": by_priority,
+        "resolved_last_days": days,
+        "resolved": resolved_total or 0,
+        "resolved_within_sla": int(resolved_in_sla or 0),
+        "compliance_pct": round(100.0 * (resolved_in_sla or 0) / resolved_total, 1) if resolved_total else None,
+        "breached_open": [
+            {key: (value.isoformat() if isinstance(value, datetime) else value)
+             for key, value in row.items()}
+            for row in breached_open
+        ],
+    }
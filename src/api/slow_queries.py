@@ -0,0 +1,174 @@
+"""
+Slow query log.
+
+Statements slower than SLOW_QUERY_MS are recorded with their (truncated)
+bound parameters, the route that issued them and the first application
+frame in the call stack. SELECTs are also EXPLAINed on the same connection
+(EXPLAIN QUERY PLAN on SQLite) so missing indexes show up directly; on
+PostgreSQL inside a savepoint, so a failed EXPLAIN does not abort the
+request's transaction. The
+last SLOW_QUERY_BUFFER entries are kept in memory per process and exposed
+to super admins at /api/system/slow-queries.
+"""
+import logging
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_BUFFER = int(os.getenv('SLOW_QUERY_BUFFER', '100'))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', '1') == '1'
+MAX_PARAM_CHARS = 500
+
+logger = logging.getLogger('api.slow_queries')
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SlowQueryLog:
+    """Bounded ring buffer of slow statements plus a small plan cache"""
+
+    def __init__(self, maxlen=SLOW_QUERY_BUFFER, plan_cache_size=256):
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=maxlen)
+        self._plans = OrderedDict()
+        self.plan_cache_size = plan_cache_size
+        self.recorded = 0
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+
+    def entries(self, limit=None):
+        with self._lock:
+            items = list(self._entries)
+        items.reverse()
+        return items[:limit] if limit else items
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+
+    def cached_plan(self, statement):
+        with self._lock:
+            plan = self._plans.get(statement)
+            if plan is not None:
+                self._plans.move_to_end(statement)
+            return plan
+
+    def store_plan(self, statement, plan):
+        with self._lock:
+            self._plans[statement] = plan
+            self._plans.move_to_end(statement)
+            while len(self._plans) > self.plan_cache_size:
+                self._plans.popitem(last=False)
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _caller_frame():
+    """First frame in application code outside this module and SQLAlchemy"""
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(APP_ROOT) and filename != os.path.abspath(__file__):
+            return f"{os.path.relpath(filename, APP_ROOT)}:{frame.lineno} in {frame.name}"
+    return None
+
+
+def _explain(conn, statement, parameters):
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+    # En PostgreSQL un error aborta la transacción entera: aislarlo en un savepoint
+    savepoint = dialect == 'postgresql'
+    # Cursor DBAPI directo: no dispara los eventos del engine (sin recursión)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(prefix + statement, parameters or ())
+            rows = cursor.fetchall()
+        except Exception:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            raise
+        finally:
+            if savepoint:
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    finally:
+        cursor.close()
+    if dialect == 'sqlite':
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('slow_query_start')
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+
+    plan = None
+    is_select = statement.lstrip()[:6].upper() in ('SELECT', 'WITH')
+    if SLOW_QUERY_EXPLAIN and is_select and not executemany:
+        plan = slow_query_log.cached_plan(statement)
+        if plan is None:
+            try:
+                plan = _explain(conn, statement, parameters)
+                if plan is not None:
+                    slow_query_log.store_plan(statement, plan)
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {e}"]
+
+    entry = {
+        "recorded_at": datetime.utcnow().isoformat(),
+        "duration_ms": round(elapsed_ms, 3),
+        "statement": statement,
+        "parameters": repr(parameters)[:MAX_PARAM_CHARS],
+        "executemany": executemany,
+        "endpoint": request.endpoint if has_request_context() else None,
+        "path": request.path if has_request_context() else None,
+        "caller": _caller_frame(),
+        "plan": plan,
+    }
+    slow_query_log.add(entry)
+    logger.warning("Slow query (%.1f ms) at %s: %s", elapsed_ms,
+                   entry["caller"] or entry["endpoint"], statement[:200])
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute no se dispara si la sentencia falla: desapilar aquí
+    conn = exception_context.connection
+    started = conn.info.get('slow_query_start') if conn is not None else None
+    if started:
+        started.pop()
+
+
+def setup_slow_query_log(engine):
+    """Watch every statement run on `engine` (SLOW_QUERY_MS <= 0 disables it)"""
+    if SLOW_QUERY_MS <= 0:
+        return
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
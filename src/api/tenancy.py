@@ -0,0 +1,65 @@
+"""
+Branch-scoped (multi-tenant) query layer.
+
+The branch of the authenticated user travels in the request identity
+(g.current_user, set by get_current_user). For every ORM statement issued
+during that request, models using BranchScopedMixin get a
+`branch_id = :branch OR branch_id IS NULL` criterion injected automatically,
+and new rows inherit the caller's branch. super_admin and admin are not
+scoped. Pass execution_options(skip_branch_scope=True) to opt out.
+"""
+from flask import g, has_request_context
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from api.models import BranchScopedMixin
+
+# Roles que ven todas las sucursales
+UNSCOPED_ROLES = frozenset({'super_admin', 'admin'})
+
+
+def current_branch_id():
+    """Branch of the caller, or None when the request is not branch-scoped"""
+    if not has_request_context():
+        return None
+    user = g.get('current_user')
+    if not user or user.get('role') in UNSCOPED_ROLES:
+        return None
+    return user.get('branch_id')
+
+
+def _apply_branch_scope(orm_execute_state):
+    if not (orm_execute_state.is_select or orm_execute_state.is_update or
+            orm_execute_state.is_delete):
+        return
+    if orm_execute_state.execution_options.get('skip_branch_scope', False):
+        return
+
+    branch_id = current_branch_id()
+    if branch_id is None:
+        return
+
+    orm_execute_state.statement = orm_execute_state.statement.options(
+        with_loader_criteria(
+            BranchScopedMixin,
+            lambda cls: or_(cls.branch_id == branch_id,
+                            cls.branch_id.is_(None)),
+            include_aliases=True
+        )
+    )
+
+
+def _assign_branch(session, flush_context, instances):
+    branch_id = current_branch_id()
+    if branch_id is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, BranchScopedMixin) and obj.branch_id is None:
+            obj.branch_id = branch_id
+
+
+def setup_tenancy(app):
+    """Register the session hooks once per process"""
+    if not event.contains(Session, 'do_orm_execute', _apply_branch_scope):
+        event.listen(Session, 'do_orm_execute', _apply_branch_scope)
+        event.listen(Session, 'before_flush', _assign_branch)
@@ -0,0 +1,175 @@
+"""
+Bulk ticket operations.
+
+    POST /api/tickets/bulk
+    {"ids": [1, 2, 3]}  or  {"filter": {"status": "open", "priority": ["low"]}}
+    "changes": {"status": "closed", "priority": "high", "assigned_to": 5}
+
+The target tickets are read once (one SELECT ... FOR UPDATE, branch scoped
+like any ORM query), the requested columns are written with a single
+set-based UPDATE ... WHERE id IN (...), and the derived state that the ORM
+hooks maintain for single updates is written in the same transaction:
+
+- SLA columns (api.sla.apply_sla), one executemany for the tickets whose
+  deadlines or milestones change
+- one TicketEvent per changed ticket (api.ticket_history)
+- workload deltas (api.assignment), applied on commit
+- rating aggregate moves for rated tickets that change assignee (api.ratings)
+
+`filter` takes the same keys as GET /tickets (lists or comma-separated
+strings). Invalid input raises ValueError.
+"""
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import bindparam, select, update
+
+from api.models import db, Ticket, User
+from api.ticket_query import build_ticket_query, PRIORITY_RANK
+
+BULK_MAX_TICKETS = int(os.getenv('BULK_MAX_TICKETS', '5000'))
+
+STATUSES = ('open', 'in_progress', 'resolved', 'closed')
+CHANGE_FIELDS = ('status', 'priority', 'assigned_to')
+FILTER_KEYS = ('status', 'priority', 'assigned_to', 'requester_email',
+               'created_from', 'created_to', 'rating', 'rating_min', 'rating_max')
+SLA_COLUMNS = ('response_due_at', 'resolution_due_at', 'first_response_at',
+               'resolved_at', 'sla_response_breached', 'sla_resolution_breached',
+               'sla_next_check_at')
+STATE_COLUMNS = ('id', 'status', 'priority', 'assigned_to', 'branch_id',
+                 'created_at', 'rating', 'rated_at') + SLA_COLUMNS
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate_changes(changes):
+    if not isinstance(changes, dict) or not changes:
+        raise ValueError("changes is required")
+    unknown = [name for name in changes if name not in CHANGE_FIELDS]
+    if unknown:
+        raise ValueError(f"Cannot change: {', '.join(unknown)}")
+    if 'status' in changes and changes['status'] not in STATUSES:
+        raise ValueError(f"status must be one of: {', '.join(STATUSES)}")
+    if 'priority' in changes and changes['priority'] not in PRIORITY_RANK:
+        raise ValueError(f"priority must be one of: {', '.join(PRIORITY_RANK)}")
+    if changes.get('assigned_to') is not None:
+        # bool es subclase de int: True no es el usuario 1
+        if not _is_id(changes['assigned_to']) or \
+                db.session.get(User, changes['assigned_to']) is None:
+            raise ValueError("assigned_to must be an existing user id")
+    return changes
+
+
+def _target_statement(ids, filters):
+    columns = [getattr(Ticket, name) for name in STATE_COLUMNS]
+    if ids is not None:
+        if filters:
+            raise ValueError("Use either ids or filter, not both")
+        if not isinstance(ids, list) or not all(_is_id(i) for i in ids):
+            raise ValueError("ids must be a list of integers")
+        if len(ids) > BULK_MAX_TICKETS:
+            raise ValueError(f"At most {BULK_MAX_TICKETS} tickets per request")
+        return select(*columns).where(Ticket.id.in_(ids)).order_by(Ticket.id)
+
+    if not isinstance(filters, dict) or not filters:
+        raise ValueError("ids or a non-empty filter is required")
+    unknown = [name for name in filters if name not in FILTER_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown filter keys: {', '.join(unknown)}")
+    args = {name: ','.join(str(v) for v in value) if isinstance(value, list) else str(value)
+            for name, value in filters.items()}
+    args['fields'] = ','.join(STATE_COLUMNS)
+    statement, _ = build_ticket_query(args)
+    return statement.limit(BULK_MAX_TICKETS + 1)
+
+
+def bulk_update_tickets(ids=None, filters=None, changes=None, changed_by=None, dry_run=False):
+    """Apply changes to many tickets in the current transaction (caller commits)"""
+    from api.sla import apply_sla
+    from api.ticket_history import record_events
+    from api.assignment import queue_workload_deltas
+    from api.ratings import record_rating_moves
+
+    changes = _validate_changes(changes)
+    rows = db.session.execute(
+        _target_statement(ids, filters).with_for_update()).mappings().all()
+    if len(rows) > BULK_MAX_TICKETS:
+        raise ValueError(f"Filter matches more than {BULK_MAX_TICKETS} tickets")
+
+    now = datetime.utcnow()
+    found = {row['id']: row for row in rows}
+    results = {ticket_id: 'not_found' for ticket_id in (ids or [])}
+    changed = []
+    for ticket_id, row in found.items():
+        new = {name: changes.get(name, row[name]) for name in CHANGE_FIELDS}
+        if all(new[name] == row[name] for name in CHANGE_FIELDS):
+            results[ticket_id] = 'unchanged'
+            continue
+        results[ticket_id] = 'updated'
+        changed.append((row, new))
+
+    if changed and not dry_run:
+        # 1) Cambio pedido: un único UPDATE por conjunto
+        db.session.execute(
+            update(Ticket)
+            .where(Ticket.id.in_([row['id'] for row, _ in changed]))
+            .values(**changes, updated_at=now)
+            .execution_options(synchronize_session=False))
+
+        sla_rows, events, transitions, rating_moves = [], [], [], []
+        for row, new in changed:
+            status_changed = new['status'] != row['status']
+            priority_changed = new['priority'] != row['priority']
+
+            # 2) Plazos SLA recalculados igual que en el hook de api.sla
+            ticket = SimpleNamespace(**dict(row, **new))
+            if status_changed or priority_changed:
+                apply_sla(ticket, now, previous_status=row['status'],
+                          priority_changed=priority_changed)
+            sla = {name: getattr(ticket, name) for name in SLA_COLUMNS}
+            if any(sla[name] != row[name] for name in SLA_COLUMNS):
+                sla_rows.append(dict({f"b_{name}": value for name, value in sla.items()},
+                                     b_id=row['id']))
+
+            # 3) Historial: mismo criterio que el hook de api.ticket_history
+            if status_changed:
+                event_type, from_status = 'status', row['status']
+            elif priority_changed:
+                event_type, from_status = 'priority', new['status']
+            else:
+                event_type, from_status = 'assignment', new['status']
+            events.append({
+                "ticket_id": row['id'], "event_type": event_type,
+                "from_status": from_status, "to_status": new['status'] or 'open',
+                "priority": new['priority'], "assigned_to": new['assigned_to'],
+                "changed_by": changed_by, "created_at": now,
+            })
+
+            transitions.append(((row['assigned_to'], row['priority'], row['status']),
+                                (new['assigned_to'], new['priority'], new['status'])))
+            if row['rating'] is not None and new['assigned_to'] != row['assigned_to']:
+                rating_moves.append(
+                    ((row['rating'], row['rated_at'], row['assigned_to'], row['branch_id']),
+                     (row['rating'], row['rated_at'], new['assigned_to'], row['branch_id'])))
+
+        if sla_rows:
+            table = Ticket.__table__
+            db.session.execute(
+                table.update()
+                .where(table.c.id == bindparam('b_id'))
+                .values(updated_at=now,
+                        **{name: bindparam(f"b_{name}") for name in SLA_COLUMNS})
+                .execution_options(skip_branch_scope=True),
+                sla_rows)
+        record_events(events)
+        queue_workload_deltas(db.session, transitions)
+        record_rating_moves(db.session, rating_moves)
+
+    counts = {"updated": 0, "unchanged": 0, "not_found": 0}
+    for result in results.values():
+        counts[result] += 1
+    return dict(counts, dry_run=bool(dry_run), changes=changes, results=[
+        {"id": ticket_id, "result": result} for ticket_id, result in sorted(results.items())])
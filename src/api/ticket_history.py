@@ -0,0 +1,247 @@
+"""
+Ticket event log and lifecycle analytics.
+
+Every ticket insert and every change of status, priority or assignee adds a
+TicketEvent row from a before_flush hook, so the event is written in the
+same transaction (and the same flush) as the change itself. Rows are never
+updated or deleted.
+
+Analytics are computed from the log:
+
+- time to first response: creation -> first event leaving 'open'
+- time to resolve: creation -> first event reaching resolved/closed
+- time in state: LEAD() window over each ticket's events gives the
+  interval spent in every status
+
+grouped by assignee, priority and creation month (mean, p50, p90, p95 in
+minutes). The result is cached per day (and per branch scope).
+"""
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import g, has_request_context
+from sqlalchemy import case, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from api.models import db, Ticket, TicketEvent, User
+
+OPEN_STATUS = 'open'
+DONE_STATUSES = ('resolved', 'closed')
+PERCENTILES = (50, 90, 95)
+
+_lock = threading.Lock()
+_cache = {}
+
+
+# --- Registro ---------------------------------------------------------------------
+
+def _current_user_id():
+    if not has_request_context():
+        return None
+    user = g.get('current_user')
+    return user.get('id') if user else None
+
+
+def _new_event(ticket, event_type, from_status, now, user_id):
+    return TicketEvent(
+        ticket=ticket,
+        event_type=event_type,
+        from_status=from_status,
+        to_status=ticket.status or OPEN_STATUS,
+        priority=ticket.priority,
+        assigned_to=ticket.assigned_to,
+        changed_by=user_id,
+        created_at=now,
+    )
+
+
+def _changed(state, key):
+    history = state.attrs[key].history
+    if not history.has_changes():
+        return False, None
+    previous = history.deleted[0] if history.deleted else None
+    current = history.added[0] if history.added else None
+    return previous != current, previous
+
+
+def _record_ticket_events(session, flush_context, instances):
+    now = datetime.utcnow()
+    user_id = _current_user_id()
+    events = []
+    for obj in session.new:
+        if isinstance(obj, Ticket):
+            events.append(_new_event(obj, 'created', None, obj.created_at or now, user_id))
+    for obj in session.dirty:
+        if not isinstance(obj, Ticket):
+            continue
+        state = inspect(obj)
+        status_changed, previous_status = _changed(state, 'status')
+        if status_changed:
+            events.append(_new_event(obj, 'status', previous_status, now, user_id))
+            continue
+        current = obj.status or OPEN_STATUS
+        if _changed(state, 'priority')[0]:
+            events.append(_new_event(obj, 'priority', current, now, user_id))
+        elif _changed(state, 'assigned_to')[0]:
+            events.append(_new_event(obj, 'assignment', current, now, user_id))
+    for item in events:
+        session.add(item)
+
+
+def record_events(rows):
+    """Append events for changes made outside the ORM unit of work (bulk
+    UPDATEs); rows are TicketEvent column dicts, written in the caller's
+    transaction"""
+    if rows:
+        db.session.execute(insert(TicketEvent), rows)
+
+
+def setup_ticket_history(app):
+    """Register the event-log hook once per process"""
+    if not event.contains(Session, 'before_flush', _record_ticket_events):
+        event.listen(Session, 'before_flush', _record_ticket_events)
+
+
+def ticket_history(ticket_id):
+    events = db.session.execute(
+        select(TicketEvent)
+        .where(TicketEvent.ticket_id == ticket_id)
+        .order_by(TicketEvent.created_at, TicketEvent.id)
+    ).scalars().all()
+    return [item.serialize() for item in events]
+
+
+# --- Analítica ----------------------------------------------------------------------
+
+def _summary(values):
+    """count, mean and nearest-rank percentiles (minutes) of a list of minutes"""
+    if not values:
+        return {"count": 0, "mean": None, **{f"p{pct}": None for pct in PERCENTILES}}
+    # numpy se importa aquí para no cargarlo al arrancar la app (benchmarks/startup.py)
+    import numpy as np
+    minutes = np.asarray(values, dtype=float)
+    # inverted_cdf = nearest-rank: siempre un valor observado, sin interpolar
+    percentiles = np.percentile(minutes, PERCENTILES, method='inverted_cdf')
+    result = {"count": len(minutes), "mean": round(float(minutes.mean()), 1)}
+    for pct, value in zip(PERCENTILES, percentiles):
+        result[f"p{pct}"] = round(float(value), 1)
+    return result
+
+
+def _minutes(start, end):
+    return (end - start).total_seconds() / 60
+
+
+def _milestones(since):
+    """Per ticket: assignee, priority, created_at, first response and resolution"""
+    left_open = case((TicketEvent.to_status != OPEN_STATUS, TicketEvent.created_at))
+    reached_done = case((TicketEvent.to_status.in_(DONE_STATUSES), TicketEvent.created_at))
+    return db.session.execute(
+        select(Ticket.id, Ticket.assigned_to, Ticket.priority, Ticket.created_at,
+               func.min(left_open, type_=db.DateTime),
+               func.min(reached_done, type_=db.DateTime))
+        .join(TicketEvent, TicketEvent.ticket_id == Ticket.id)
+        .where(Ticket.created_at >= since)
+        .group_by(Ticket.id, Ticket.assigned_to, Ticket.priority, Ticket.created_at)
+    ).all()
+
+
+def _state_intervals(since):
+    """(ticket_id, status, entered_at, left_at) from a LEAD() window over the log"""
+    left_at = func.lead(TicketEvent.created_at, type_=db.DateTime).over(
+        partition_by=TicketEvent.ticket_id,
+        order_by=(TicketEvent.created_at, TicketEvent.id))
+    intervals = (
+        select(TicketEvent.ticket_id, TicketEvent.to_status,
+               TicketEvent.created_at.label('entered_at'), left_at.label('left_at'))
+        .join(Ticket, Ticket.id == TicketEvent.ticket_id)
+        .where(Ticket.created_at >= since)
+        .subquery()
+    )
+    return db.session.execute(select(intervals)).all()
+
+
+def compute_ticket_analytics(months=12, now=None):
+    now = now or datetime.utcnow()
+    since = now - timedelta(days=30 * months)
+
+    users = {}
+    groups = {"assignee": defaultdict(lambda: ([], [])),
+              "priority": defaultdict(lambda: ([], [])),
+              "month": defaultdict(lambda: ([], []))}
+    overall = ([], [])
+    for ticket_id, assigned_to, priority, created_at, responded, resolved in _milestones(since):
+        keys = {"assignee": assigned_to, "priority": priority or 'medium',
+                "month": created_at.strftime('%Y-%m')}
+        for index, reached in enumerate((responded, resolved)):
+            if reached is None:
+                continue
+            minutes = max(0.0, _minutes(created_at, reached))
+            overall[index].append(minutes)
+            for group, key in keys.items():
+                groups[group][key][index].append(minutes)
+        users[assigned_to] = None
+
+    # Tiempo en cada estado: suma de intervalos por ticket; el intervalo abierto
+    # del estado actual cuenta hasta ahora salvo en resolved/closed
+    per_ticket = defaultdict(float)
+    for ticket_id, status, entered_at, left_at in _state_intervals(since):
+        if left_at is None:
+            if status in DONE_STATUSES:
+                continue
+            left_at = now
+        per_ticket[(ticket_id, status)] += max(0.0, _minutes(entered_at, left_at))
+    time_in_state = defaultdict(list)
+    for (ticket_id, status), minutes in per_ticket.items():
+        time_in_state[status].append(minutes)
+
+    ids = [user_id for user_id in users if user_id is not None]
+    if ids:
+        users.update(db.session.execute(
+            select(User.id, User.name).where(User.id.in_(ids))).all())
+
+    def rows(group, label, sort_key=None):
+        result = []
+        for key, (responses, resolutions) in groups[group].items():
+            row = {label: key}
+            if group == "assignee":
+                row["name"] = users.get(key)
+            row["first_response_minutes"] = _summary(responses)
+            row["resolution_minutes"] = _summary(resolutions)
+            result.append(row)
+        return sorted(result, key=sort_key or (lambda row: str(row[label])))
+
+    return {
+        "generated_at": now.isoformat(),
+        "since": since.isoformat(),
+        "overall": {"first_response_minutes": _summary(overall[0]),
+                    "resolution_minutes": _summary(overall[1])},
+        "by_assignee": rows("assignee", "assigned_to",
+                            lambda row: -row["resolution_minutes"]["count"]),
+        "by_priority": rows("priority", "priority"),
+        "by_month": rows("month", "month"),
+        "time_in_state_minutes": {status: _summary(values)
+                                  for status, values in sorted(time_in_state.items())},
+    }
+
+
+def ticket_analytics(months=12, branch_id=None, refresh=False):
+    """Daily cached analytics; one entry per (months, branch scope)"""
+    today = datetime.utcnow().date()
+    key = (today, months, branch_id)
+    with _lock:
+        if not refresh and key in _cache:
+            return _cache[key]
+    result = compute_ticket_analytics(months)
+    with _lock:
+        # Descartar los días anteriores
+        for stale in [k for k in _cache if k[0] != today]:
+            del _cache[stale]
+        _cache[key] = result
+    return result
+
+
+def invalidate_ticket_analytics():
+    with _lock:
+        _cache.clear()
@@ -1,4 +1,5 @@
 from flask import jsonify, url_for
+from sqlalchemy import func
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +16,12 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def month_key(column, dialect_name):
+    """SQL expression that buckets a DateTime column into a 'YYYY-MM' string"""
+    if dialect_name == 'sqlite':
+        return func.strftime('%Y-%m', column)
+    return func.to_char(column, 'YYYY-MM')
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -1,69 +1,152 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
+import logging
 import os
+import weakref
 from flask import Flask, request, jsonify, url_for, send_from_directory
 from flask_migrate import Migrate
 from flask_swagger import swagger
 from flask_cors import CORS
 from api.utils import APIException, generate_sitemap
 from api.models import db
+from api.logging_config import configure_logging
+from api.db_config import configure_database, setup_engine_events
+from api.replica import setup_replica
+from api.observability import instrument_engine, setup_observability
+from api.slow_queries import setup_slow_query_log
 from api.routes import api
 from api.admin import setup_admin
 from api.commands import setup_commands
+from api.scheduler import start_reminder_scheduler
+from api.tenancy import setup_tenancy
+from api.sla import setup_sla
+from api.ticket_history import setup_ticket_history
+from api.assignment import setup_assignment
+from api.ratings import setup_ratings
 
 # from models import Person
 
 ENV = "development" if os.getenv("FLASK_DEBUG") == "1" else "production"
 static_file_dir = os.path.join(os.path.dirname(
     os.path.realpath(__file__)), '../dist/')
-app = Flask(__name__)
-app.url_map.strict_slashes = False
-
-# Configure CORS
-CORS(app, origins=[
-    "http://localhost:3000",
-    "https://localhost:3000",
-    "http://127.0.0.1:3000",
-    "https://informaticait.up.railway.app"
-],
-    allow_headers=["Content-Type", "Authorization"],
-    methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
-
-# database condiguration
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
-        "postgres://", "postgresql://")
-else:
-    # Use absolute path for SQLite database compatible with Windows
-    db_path = os.path.join(os.path.dirname(__file__), 'database.db')
-    # Convert Windows path to forward slashes for SQLite
-    db_path = db_path.replace('\\', '/')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
-    print(f"🔍 Database path: {db_path}")
-    print(f"🔍 Database URI: {app.config['SQLALCHEMY_DATABASE_URI']}")
-    print(f"🔍 Database file exists: {os.path.exists(db_path)}")
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-print("🔍 Initializing Flask-Migrate...")
-MIGRATE = Migrate(app, db, compare_type=True)
-print("🔍 Initializing database...")
-db.init_app(app)
-print("🔍 Database initialized successfully")
-
-# add the admin
-print("🔍 Setting up admin...")
-setup_admin(app)
-
-# add the admin
-print("🔍 Setting up commands...")
-setup_commands(app)
+
+MIGRATE = Migrate()
+
+logger = logging.getLogger('app')
+
+# Apps creadas en este proceso; sus pools se descartan en el hijo tras un fork
+_apps = weakref.WeakSet()
+
+
+def _dispose_engines_after_fork():
+    """Drop pooled connections inherited from the parent process.
+
+    close=False leaves the parent's sockets alone; the child simply opens
+    its own connections on first use.
+    """
+    for flask_app in list(_apps):
+        with flask_app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+
+
+def create_app(config=None):
+    """Build and configure a Flask app.
+
+    `config` overrides Flask config keys (e.g. SQLALCHEMY_DATABASE_URI,
+    SCHEMA_MANAGEMENT, REMINDER_SCHEDULER_AUTOSTART), so tests can build an
+    isolated app against their own database.
+    """
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    app.config['SCHEMA_MANAGEMENT'] = os.getenv('SCHEMA_MANAGEMENT', 'auto')
+    app.config['REMINDER_SCHEDULER_AUTOSTART'] = os.getenv(
+        'REMINDER_SCHEDULER_AUTOSTART', '1') == '1'
+    if config:
+        app.config.update(config)
+
+    # Leveled logging with request-id correlation (LOG_LEVEL / LOG_FORMAT)
+    configure_logging(app)
+
+    # Configure CORS
+    CORS(app, origins=[
+        "http://localhost:3000",
+        "https://localhost:3000",
+        "http://127.0.0.1:3000",
+        "https://informaticait.up.railway.app"
+    ],
+        allow_headers=["Content-Type", "Authorization"],
+        methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+
+    # database configuration (pool, timeouts and pragmas from environment variables)
+    db_uri = configure_database(app)
+    if db_uri.startswith('sqlite'):
+        logger.debug("Database URI: %s", db_uri)
+
+    MIGRATE.init_app(app, db, compare_type=True)
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            setup_engine_events(engine)
+            instrument_engine(engine)
+            setup_slow_query_log(engine)
+    setup_replica(app)
+    _apps.add(app)
+    logger.debug("Database initialized")
+
+    # add the admin
+    setup_admin(app)
+
+    # add the admin
+    setup_commands(app)
+
+    # Branch scoping for tickets, events, service orders and journal entries
+    setup_tenancy(app)
+
+    # Ticket SLA deadlines, stamped on create and status/priority changes
+    setup_sla(app)
+
+    # Append-only ticket event log, written in the same flush as the change
+    setup_ticket_history(app)
+
+    # In-memory technician workload for ticket auto-assignment
+    setup_assignment(app)
+
+    # Daily rating aggregates, updated in the same transaction as the rating
+    setup_ratings(app)
+
+    # Request latency / SQL metrics (/metrics) and per-request log lines
+    setup_observability(app)
+
+    # Initialize database on startup. With SCHEMA_MANAGEMENT=migrations the schema
+    # is left to `flask db upgrade` and creating the app does no database I/O.
+    # Only for databases whose migrations cover the whole schema: src/migrations
+    # does not (yet), so the deploys keep the default 'auto'.
+    if app.config['SCHEMA_MANAGEMENT'] != 'migrations':
+        init_database(app)
+
+    # Add all endpoints form the API with a "api" prefix
+    app.register_blueprint(api, url_prefix='/api')
+
+    # Periodic payment reminder roll-forward (REMINDER_SCHEDULER_INTERVAL seconds).
+    # Under gunicorn --preload each worker starts its own thread in post_fork
+    # (see gunicorn.conf.py); threads do not survive a fork.
+    if app.config['REMINDER_SCHEDULER_AUTOSTART']:
+        start_reminder_scheduler(app)
+
+    register_handlers(app)
+    return app
+
 
 # Initialize database tables automatically
 
 
-def init_database():
+def init_database(app):
     """Initialize database tables if they don't exist"""
     try:
         with app.app_context():
@@ -71,26 +154,28 @@ def init_database():
             inspector = inspect(db.engine)
             tables = inspector.get_table_names()
 
-            print(f"🔍 Existing tables: {tables}")
+            logger.debug("Existing tables: %s", tables)
 
             if not tables or 'calendar_event' not in tables:
-                print("🚀 Creating database tables...")
-                db.create_all()
-                print("✅ Database tables created successfully")
+                logger.info("Creating database tables")
+                # Solo la base principal: la réplica (bind 'replica') no se crea desde aquí
+                db.create_all(bind_key=None)
 
                 # Verify tables were created
                 inspector = inspect(db.engine)
                 new_tables = inspector.get_table_names()
-                print(f"📊 Tables after creation: {new_tables}")
+                logger.info("Tables after creation: %s", new_tables)
             else:
-                print(f"✅ Database already has {len(tables)} tables")
+                logger.debug("Database already has %d tables", len(tables))
                 # Check if we need to add new columns
                 update_database_schema()
 
+            # Full-text search tables/triggers (SQLite) or GIN indexes (PostgreSQL)
+            from api.search import ensure_search_schema
+            ensure_search_schema(db.engine)
+
     except Exception as e:
-        print(f"❌ Error initializing database: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error initializing database: %s", e)
 
 
 def update_database_schema():
@@ -103,7 +188,7 @@ def update_database_schema():
         if 'calendar_event' in inspector.get_table_names():
             columns = [col['name']
                        for col in inspector.get_columns('calendar_event')]
-            print(f"🔍 Calendar event columns: {columns}")
+            logger.debug("Calendar event columns: %s", columns)
 
             # List of new columns to add
             new_columns = [
@@ -123,55 +208,43 @@ def update_database_schema():
                             conn.execute(
                                 text(f'ALTER TABLE calendar_event ADD COLUMN {column_name} {column_type}'))
                             conn.commit()
-                        print(
-                            f"✅ Added column {column_name} to calendar_event table")
+                        logger.info(
+                            "Added column %s to calendar_event table", column_name)
                     except Exception as e:
-                        print(f"⚠️ Could not add column {column_name}: {e}")
+                        logger.warning("Could not add column %s: %s", column_name, e)
 
     except Exception as e:
-        print(f"❌ Error updating database schema: {e}")
-        import traceback
-        traceback.print_exc()
-
-
-# Initialize database on startup
-print("🗄️ Initializing database tables...")
-init_database()
-
-# Add all endpoints form the API with a "api" prefix
-print("🔍 Registering API blueprint...")
-app.register_blueprint(api, url_prefix='/api')
-print("🔍 API blueprint registered successfully")
-
-# Handle/serialize errors like a JSON object
-
-
-@app.errorhandler(APIException)
-def handle_invalid_usage(error):
-    return jsonify(error.to_dict()), error.status_code
+        logger.exception("Error updating database schema: %s", e)
 
-# generate sitemap with all your endpoints
 
+def register_handlers(app):
+    """Error handler, sitemap and static file serving for the SPA"""
 
-@app.route('/')
-def sitemap():
-    if ENV == "development":
-        return generate_sitemap(app)
-    return send_from_directory(static_file_dir, 'index.html')
+    # Handle/serialize errors like a JSON object
+    @app.errorhandler(APIException)
+    def handle_invalid_usage(error):
+        return jsonify(error.to_dict()), error.status_code
 
-# any other endpoint will try to serve it like a static file
+    # generate sitemap with all your endpoints
+    @app.route('/')
+    def sitemap():
+        if ENV == "development":
+            return generate_sitemap(app)
+        return send_from_directory(static_file_dir, 'index.html')
 
+    # any other endpoint will try to serve it like a static file
+    @app.route('/<path:path>', methods=['GET'])
+    def serve_any_other_file(path):
+        if not os.path.isfile(os.path.join(static_file_dir, path)):
+            path = 'index.html'
+        response = send_from_directory(static_file_dir, path)
+        response.cache_control.max_age = 0  # avoid cache memory
+        return response
 
-@app.route('/<path:path>', methods=['GET'])
-def serve_any_other_file(path):
-    if not os.path.isfile(os.path.join(static_file_dir, path)):
-        path = 'index.html'
-    response = send_from_directory(static_file_dir, path)
-    response.cache_control.max_age = 0  # avoid cache memory
-    return response
 
+# La instancia se construye en wsgi.py; `flask --app src/app.py` usa create_app
 
 # this only runs if `$ python src/main.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3001))
-    app.run(host='0.0.0.0', port=PORT, debug=True)
+    create_app().run(host='0.0.0.0', port=PORT, debug=True)
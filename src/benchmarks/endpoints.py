@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark: p50/p95 latency, SQL queries per request and peak memory.
+
+Loads a reproducible synthetic dataset (api.seed) into a throwaway SQLite
+database, unless --database-url points at an existing one, and then drives
+the Flask test client against the key list endpoints:
+
+    $ cd src && python benchmarks/endpoints.py --scale small --output bench.json
+    $ python benchmarks/endpoints.py --scale small --baseline bench.json
+
+With --baseline the run exits with status 1 when an endpoint's p95 grows by
+more than --tolerance, or when it issues more queries than the baseline did.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ENDPOINTS = [
+    "/api/tickets",
+    "/api/journal",
+    "/api/journal/stats",
+    "/api/calendar-events",
+    "/api/service-orders",
+    "/api/service-orders/compliance",
+    "/api/matrices",
+    "/api/users",
+    "/api/payment-reminders",
+    "/api/notifications",
+]
+HEADERS = {"Authorization": "Bearer admin_authenticated"}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def prepare_environment(database_url):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SCHEMA_MANAGEMENT", "auto")
+    os.environ.setdefault("REMINDER_SCHEDULER_AUTOSTART", "0")
+    os.environ.setdefault("REQUEST_LOG", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("SLOW_QUERY_MS", "0")
+    sys.path.insert(0, SRC_DIR)
+
+
+def load_dataset(app, scale_name, seed):
+    from api.models import db, Ticket
+    from api.seed import generate, DEFAULT_SCALE, SMALL_SCALE
+    with app.app_context():
+        if db.session.query(Ticket.id).first() is not None:
+            return None
+        scale = SMALL_SCALE if scale_name == "small" else DEFAULT_SCALE
+        start = time.perf_counter()
+        counts = generate(scale, seed=seed)
+        counts["seconds"] = round(time.perf_counter() - start, 2)
+        return counts
+
+
+def measure(app, path, iterations, warmup):
+    from sqlalchemy import event
+    from api.models import db
+
+    client = app.test_client()
+    queries = {"count": 0}
+
+    def count_query(*args):
+        queries["count"] += 1
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "after_cursor_execute", count_query)
+    try:
+        for _ in range(warmup):
+            client.get(path, headers=HEADERS)
+
+        latencies, query_counts, status = [], [], None
+        for _ in range(iterations):
+            queries["count"] = 0
+            start = time.perf_counter()
+            response = client.get(path, headers=HEADERS)
+            latencies.append((time.perf_counter() - start) * 1000)
+            query_counts.append(queries["count"])
+            status = response.status_code
+            size = len(response.get_data())
+
+        # Pasada aparte con tracemalloc: su overhead no contamina las latencias
+        tracemalloc.start()
+        baseline_bytes = tracemalloc.get_traced_memory()[0]
+        client.get(path, headers=HEADERS)
+        peak_bytes = tracemalloc.get_traced_memory()[1] - baseline_bytes
+        tracemalloc.stop()
+    finally:
+        for engine in engines:
+            event.remove(engine, "after_cursor_execute", count_query)
+
+    return {
+        "status": status,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "max_ms": round(max(latencies), 2),
+        "queries_per_request": max(query_counts),
+        "peak_memory_kb": round(peak_bytes / 1024, 1),
+        "response_bytes": size,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against a previous run: [(path, message), ...]"""
+    regressions = []
+    for path, current in results.items():
+        previous = baseline.get("endpoints", {}).get(path)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                (path, f"p95 {previous['p95_ms']} -> {current['p95_ms']} ms"))
+        if current["queries_per_request"] > previous["queries_per_request"]:
+            regressions.append(
+                (path, f"queries {previous['queries_per_request']} -> {current['queries_per_request']}"))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url",
+                        help="existing database (default: temporary SQLite file)")
+    parser.add_argument("--scale", choices=["small", "full"], default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--endpoints", nargs="*", default=DEFAULT_ENDPOINTS)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="previous --output file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative p95 growth (default 0.25)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepare_environment(args.database_url or f"sqlite:///{tmp}/bench.db")
+        from app import create_app
+        app = create_app()
+
+        dataset = load_dataset(app, args.scale, args.seed)
+        results = {}
+        for path in args.endpoints:
+            results[path] = measure(app, path, args.iterations, args.warmup)
+            print(f"{path}: {json.dumps(results[path])}", file=sys.stderr)
+
+        with app.app_context():
+            from api.models import db
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    report = {"scale": args.scale, "seed": args.seed, "iterations": args.iterations,
+              "dataset": dataset, "endpoints": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for path, message in regressions:
+            print(f"REGRESSION {path}: {message}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: import and create_app time of app.py and latency of the first requests.
+
+Each run starts a fresh interpreter so nothing is cached between runs:
+
+    $ cd src && python benchmarks/startup.py --runs 5
+    $ SCHEMA_MANAGEMENT=migrations python benchmarks/startup.py --output startup.json
+
+By default every run uses a throwaway SQLite database; pass --database-url to
+measure against a real one.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+client = app.test_client()
+timings = {"import_s": t1 - t0, "create_app_s": t2 - t1}
+for path in sys.argv[1:]:
+    start = time.perf_counter()
+    client.get(path)
+    timings[path] = time.perf_counter() - start
+heavy = [m for m in ("reportlab", "pandas", "numpy", "openpyxl") if m in sys.modules]
+print("BENCH" + json.dumps({"timings": timings, "heavy_modules": heavy}))
+"""
+
+
+def run_once(paths, database_url, env_overrides):
+    env = dict(os.environ, **env_overrides)
+    with tempfile.TemporaryDirectory() as tmp:
+        env["DATABASE_URL"] = database_url or f"sqlite:///{tmp}/bench.db"
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE, *paths],
+            cwd=SRC_DIR, env=env, capture_output=True, text=True, check=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("BENCH"):
+            return json.loads(line[len("BENCH"):])
+    raise RuntimeError(f"Benchmark probe produced no result:\n{result.stderr}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--paths", nargs="*",
+                        default=["/api/hello", "/api/tickets"])
+    parser.add_argument("--database-url")
+    parser.add_argument("--output", help="write the summary as JSON")
+    args = parser.parse_args()
+
+    runs = [run_once(args.paths, args.database_url, {})
+            for _ in range(args.runs)]
+
+    summary = {"runs": args.runs,
+               "schema_management": os.getenv("SCHEMA_MANAGEMENT", "auto"),
+               "heavy_modules_at_startup": runs[-1]["heavy_modules"]}
+    for key in runs[0]["timings"]:
+        values = [run["timings"][key] * 1000 for run in runs]
+        summary[key] = {
+            "median_ms": round(statistics.median(values), 2),
+            "min_ms": round(min(values), 2),
+            "max_ms": round(max(values), 2),
+        }
+
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(summary, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,8 @@ from flask_migrate import Migrate, upgrade
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from app import app, db
+    from app import create_app, db
+    app = create_app()
     print("✅ App y db importados correctamente")
 except ImportError as e:
     print(f"❌ Error importando app: {e}")
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Los tests importan `app` y `api` igual que wsgi.py (desde src/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Leídas al importar los módulos: nada de logs por request ni ficheros fuera de /tmp
+os.environ.setdefault('REQUEST_LOG', '0')
+os.environ.setdefault('SLOW_QUERY_MS', '0')
+os.environ.setdefault('SIMILARITY_INDEX_PATH', os.path.join(
+    tempfile.mkdtemp(prefix='similarity-'), 'index.npz'))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App on an empty SQLite database of its own"""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.delenv('DATABASE_REPLICA_URL', raising=False)
+    from app import create_app
+    from api.models import db
+    app = create_app({'TESTING': True, 'SCHEMA_MANAGEMENT': 'auto',
+                      'REMINDER_SCHEDULER_AUTOSTART': False})
+    with app.app_context():
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
@@ -0,0 +1,48 @@
+"""Star ratings: request validation and the daily aggregate"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from api.models import db, Ticket, TicketRatingDaily
+
+ADMIN = {'Authorization': 'Bearer admin_authenticated'}
+
+
+def _resolved_ticket():
+    ticket = Ticket(title='rated', status='resolved')
+    db.session.add(ticket)
+    db.session.commit()
+    return ticket
+
+
+def _stars():
+    row = db.session.execute(select(
+        TicketRatingDaily.ratings, TicketRatingDaily.stars_1, TicketRatingDaily.stars_2,
+        TicketRatingDaily.stars_3)).one_or_none()
+    return tuple(row) if row else None
+
+
+@pytest.mark.parametrize('rating', [True, 2.0, '2', 0, 4, None])
+def test_rate_rejects_non_integer_stars(app, rating):
+    ticket = _resolved_ticket()
+    response = app.test_client().post(f'/api/tickets/{ticket.id}/rate',
+                                      json={'rating': rating}, headers=ADMIN)
+    assert response.status_code == 400
+    assert _stars() is None
+
+
+def test_rate_updates_daily_aggregate(app):
+    ticket = _resolved_ticket()
+    response = app.test_client().post(f'/api/tickets/{ticket.id}/rate',
+                                      json={'rating': 2}, headers=ADMIN)
+    assert response.status_code == 200
+    assert _stars() == (1, 0, 1, 0)
+
+
+def test_aggregate_counts_bool_and_float_ratings_as_stored(app):
+    first, second = _resolved_ticket(), _resolved_ticket()
+    first.rating, first.rated_at = True, datetime.utcnow()
+    second.rating, second.rated_at = 2.0, datetime.utcnow()
+    db.session.commit()
+    assert _stars() == (2, 1, 1, 0)
@@ -0,0 +1,58 @@
+"""@read_replica routing against two local SQLite databases"""
+import pytest
+
+from app import create_app
+from api.models import db, Ticket
+from api.replica import REPLICA_BIND, STICKY_COOKIE
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setenv('DATABASE_REPLICA_URL', f"sqlite:///{tmp_path / 'replica.db'}")
+    app = create_app({'TESTING': True, 'SCHEMA_MANAGEMENT': 'auto',
+                      'REMINDER_SCHEDULER_AUTOSTART': False})
+    with app.app_context():
+        # El esquema solo se crea en la primaria; la "réplica" es otra base
+        # con las mismas tablas y datos distintos para saber de dónde se leyó
+        db.metadata.create_all(db.engines[REPLICA_BIND])
+        db.session.add(Ticket(title='primary ticket'))
+        db.session.commit()
+        with db.engines[REPLICA_BIND].begin() as conn:
+            conn.execute(Ticket.__table__.insert().values(
+                title='replica ticket', status='open', priority='medium',
+                sla_response_breached=False, sla_resolution_breached=False))
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _titles(client):
+    response = client.get('/api/tickets')
+    assert response.status_code == 200
+    return [ticket['title'] for ticket in response.get_json()]
+
+
+def test_read_replica_view_reads_from_replica(app):
+    assert _titles(app.test_client()) == ['replica ticket']
+
+
+def test_writes_go_to_primary_and_stick(app):
+    client = app.test_client()
+    response = client.post('/api/tickets', json={'title': 'new ticket'})
+    assert response.status_code == 201
+    assert STICKY_COOKIE in response.headers.get('Set-Cookie', '')
+
+    with app.app_context():
+        primary = db.session.execute(db.select(Ticket.title).order_by(Ticket.id)).scalars().all()
+        with db.engines[REPLICA_BIND].connect() as conn:
+            replica = conn.execute(db.select(Ticket.title)).scalars().all()
+    assert primary == ['primary ticket', 'new ticket']
+    assert replica == ['replica ticket']
+
+    # La cookie mantiene al cliente en la primaria para leer lo que escribió
+    assert _titles(client) == ['primary ticket', 'new ticket']
+    # Un cliente sin cookie sigue leyendo de la réplica
+    assert _titles(app.test_client()) == ['replica ticket']
@@ -0,0 +1,46 @@
+"""Similarity index catch-up with ids that commit out of order"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from api.models import db, Ticket
+from api.similarity import similarity_index
+
+
+def _insert(ticket_id, title, created_at=None):
+    # Id explícito: simula otro worker cuya transacción confirma más tarde
+    db.session.execute(insert(Ticket), [{
+        "id": ticket_id, "title": title, "description": "",
+        "created_at": created_at or datetime.utcnow()}])
+    db.session.commit()
+
+
+def test_skipped_id_is_indexed_when_it_commits(app):
+    _insert(1, 'impresora sin toner en la oficina')
+    _insert(3, 'servidor de correo caido')
+    similarity_index.rebuild()
+    assert similarity_index.last_ticket_id == 3
+    assert set(similarity_index.gaps) == {2}
+
+    _insert(2, 'vpn no conecta desde casa')
+    similarity_index.synced_at = 0
+    similarity_index.ensure_ready()
+
+    assert 2 in similarity_index.positions
+    assert similarity_index.gaps == {}
+
+
+def test_gaps_survive_save_and_load(app):
+    _insert(1, 'impresora sin toner en la oficina')
+    _insert(3, 'servidor de correo caido')
+    similarity_index.rebuild()
+    similarity_index.load()
+    assert set(similarity_index.gaps) == {2}
+
+
+def test_gaps_before_old_tickets_are_not_tracked(app):
+    old = datetime.utcnow() - timedelta(days=30)
+    _insert(1, 'impresora sin toner en la oficina', old)
+    _insert(5, 'servidor de correo caido', old)
+    similarity_index.rebuild()
+    assert similarity_index.gaps == {}
@@ -0,0 +1,74 @@
+"""Breach flags of deadlines met late, and the backfill of old tickets"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from api.models import db, Ticket, SystemNotification
+from api.sla import backfill_sla, run_sla_scan
+
+
+def _ticket(priority, created_at, status='open'):
+    ticket = Ticket(title='sla', priority=priority, status=status, created_at=created_at)
+    db.session.add(ticket)
+    db.session.commit()
+    return ticket
+
+
+def test_late_resolution_is_breached(app):
+    ticket = _ticket('urgent', datetime.utcnow() - timedelta(days=2))
+    ticket.status = 'resolved'
+    db.session.commit()
+
+    assert ticket.sla_response_breached
+    assert ticket.sla_resolution_breached
+    assert ticket.sla_next_check_at is None
+
+
+def test_late_first_response_is_breached(app):
+    # low: 8 h para responder, 72 h para resolver
+    ticket = _ticket('low', datetime.utcnow() - timedelta(days=1))
+    ticket.status = 'in_progress'
+    db.session.commit()
+
+    assert ticket.sla_response_breached
+    assert not ticket.sla_resolution_breached
+    assert ticket.sla_next_check_at == ticket.resolution_due_at
+
+
+def test_deadlines_met_in_time_are_not_breached(app):
+    ticket = _ticket('low', datetime.utcnow())
+    ticket.status = 'closed'
+    db.session.commit()
+
+    assert not ticket.sla_response_breached
+    assert not ticket.sla_resolution_breached
+
+
+def test_backfill_uses_history_and_does_not_alert(app):
+    now = datetime.utcnow()
+    old = now - timedelta(days=10)
+    # INSERT directo: sin el hook de plazos, como una carga masiva antigua
+    db.session.execute(insert(Ticket), [
+        {"title": "late", "priority": "urgent", "status": "resolved",
+         "created_at": old, "updated_at": old + timedelta(days=1)},
+        {"title": "in time", "priority": "low", "status": "closed",
+         "created_at": old, "updated_at": old + timedelta(hours=2)},
+        {"title": "overdue", "priority": "low", "status": "open",
+         "created_at": old, "updated_at": old},
+        {"title": "pending", "priority": "low", "status": "open",
+         "created_at": now, "updated_at": now},
+    ])
+    db.session.commit()
+
+    assert backfill_sla(now=now) == 4
+    flags = {title: (response, resolution, next_check) for title, response, resolution, next_check
+             in db.session.execute(select(Ticket.title, Ticket.sla_response_breached,
+                                          Ticket.sla_resolution_breached,
+                                          Ticket.sla_next_check_at))}
+    assert flags["late"][:2] == (True, True)
+    assert flags["in time"][:2] == (False, False)
+    assert flags["overdue"] == (True, True, None)
+    assert flags["pending"][:2] == (False, False) and flags["pending"][2] > now
+
+    assert run_sla_scan(now=now)["notified"] == 0
+    assert db.session.execute(select(func.count(SystemNotification.id))).scalar() == 0